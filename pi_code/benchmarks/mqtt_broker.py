@@ -0,0 +1,139 @@
+# Description: Minimal MQTT 3.1.1 broker used as a local stand-in for the public EMQX broker in the
+#   benchmarks. Supports what run_mqtt.py and the ESP32-S2 use: CONNECT, SUBSCRIBE/UNSUBSCRIBE with the
+#   + and # wildcards, PUBLISH (delivered to subscribers at QoS 0), PINGREQ and DISCONNECT. Runs its own
+#   asyncio event loop in a background thread. Uses only the standard library.
+# Date: Oct 17 2026
+
+import asyncio
+import threading
+
+# Return True if a topic matches a subscription filter. Parameters:
+#      -topic_filter - the filter, ex. esp32/# or esp32/+
+#      -topic - the topic of a published message
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split('/')
+    levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(levels) or (level != '+' and level != levels[i]):
+            return False
+    return len(filter_levels) == len(levels)
+
+# Return a length-prefixed UTF-8 string as used in MQTT packets
+def encode_string(text):
+    data = text.encode()
+    return len(data).to_bytes(2, 'big')+data
+
+# Return a packet with its fixed header. Parameters:
+#      -header - the first byte, packet type and flags
+#      -body - the rest of the packet
+def packet(header, body=b''):
+    length, encoded = len(body), bytearray()
+    while True:
+        byte, length = length % 128, length//128
+        encoded.append(byte | (128 if length else 0))
+        if not length:
+            break
+    return bytes([header])+bytes(encoded)+body
+
+# MQTT broker listening on localhost. Parameters:
+#      -host - address to listen on
+#      -port - port to listen on, or 0 to pick a free port
+class LocalBroker:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.subscriptions = {} # Topic filters of each connected client's writer
+        self.started = threading.Event()
+        self.stats = {'connections': 0, 'published': 0, 'delivered': 0}
+
+    # Start the broker in a background thread. Returns the port it listens on.
+    def start(self):
+        threading.Thread(target=self.run, name='mqtt_broker', daemon=True).start()
+        self.started.wait()
+        return self.port
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle_client, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.started.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    # Return the number of clients subscribed to a topic
+    def subscribers(self, topic):
+        return sum(any(topic_matches(f, topic) for f in filters) for filters in self.subscriptions.values())
+
+    # Read one packet. Returns its first byte and body.
+    async def read_packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 127)*multiplier
+            multiplier *= 128
+            if not byte & 128:
+                break
+        return header, await reader.readexactly(length)
+
+    # Serve one client connection
+    async def handle_client(self, reader, writer):
+        self.stats['connections'] += 1
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                header, body = await self.read_packet(reader)
+                kind = header >> 4
+                if kind == 1: # CONNECT
+                    writer.write(packet(0x20, b'\x00\x00'))
+                elif kind == 3: # PUBLISH
+                    qos = (header >> 1) & 3
+                    length = int.from_bytes(body[:2], 'big')
+                    topic = body[2:2+length].decode()
+                    offset = 2+length
+                    if qos:
+                        packet_id = body[offset:offset+2]
+                        offset += 2
+                        writer.write(packet(0x40, packet_id)) # PUBACK
+                    self.publish(topic, body[offset:])
+                elif kind == 8: # SUBSCRIBE
+                    packet_id, offset, granted = body[:2], 2, b''
+                    while offset < len(body):
+                        length = int.from_bytes(body[offset:offset+2], 'big')
+                        self.subscriptions[writer].add(body[offset+2:offset+2+length].decode())
+                        offset += 2+length+1
+                        granted += b'\x00'
+                    writer.write(packet(0x90, packet_id+granted))
+                elif kind == 10: # UNSUBSCRIBE
+                    packet_id, offset = body[:2], 2
+                    while offset < len(body):
+                        length = int.from_bytes(body[offset:offset+2], 'big')
+                        self.subscriptions[writer].discard(body[offset+2:offset+2+length].decode())
+                        offset += 2+length
+                    writer.write(packet(0xB0, packet_id))
+                elif kind == 12: # PINGREQ
+                    writer.write(packet(0xD0))
+                elif kind == 14: # DISCONNECT
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.subscriptions[writer]
+            writer.close()
+
+    # Send a message to every client subscribed to its topic, at QoS 0
+    def publish(self, topic, payload):
+        self.stats['published'] += 1
+        data = packet(0x30, encode_string(topic)+payload)
+        for writer, filters in self.subscriptions.items():
+            if any(topic_matches(f, topic) for f in filters):
+                writer.write(data)
+                self.stats['delivered'] += 1
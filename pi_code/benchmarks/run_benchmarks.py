@@ -0,0 +1,287 @@
+# Description: End-to-end benchmarks that run on a plain Linux machine, without the cat, the Raspberry Pi
+#   or the public broker. Each scenario drives the real code paths with recorded or synthetic input, and
+#   Telegram is replaced by a local endpoint (telegram_endpoint.py) that records when notifications arrive:
+#     -mqtt - IN/OUT messages published on a local broker (mqtt_broker.py), received by run_mqtt.py's
+#        callbacks and pipeline, logged to the event store and notified
+#     -radar - synthetic radar edges replayed through yolov5/radar.py, measuring edge to action latency
+#        and how edges are coalesced
+#     -vision - radar edges that each run detect.py on a recorded clip, through cat_detection.py to the
+#        notification. Needs PyTorch, the YOLOv5 code, --weights and --clip, and is skipped otherwise.
+#   Reports throughput, p50/p99 trigger to notification latency and peak memory as JSON. Everything is
+#   written to a temporary directory, not to the real logs. With --baseline, compares against a previous
+#   report and exits with status 1 if any result got worse by more than the tolerance, ex:
+#     python3 benchmarks/run_benchmarks.py --output report.json
+#     python3 benchmarks/run_benchmarks.py --baseline report.json
+# Date: Oct 17 2026
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import paho.mqtt.client as mqtt
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.append(str(BENCH_DIR.parent)) # pi_code, for run_mqtt.py
+sys.path.append(str(BENCH_DIR.parent / 'yolov5'))
+from mqtt_broker import LocalBroker
+from telegram_endpoint import TelegramEndpoint
+
+# The repository modules set their data paths from the working directory when they are imported, so they
+# are only imported once the benchmarks have changed to a temporary directory, see main().
+
+# Wait until a condition is true. Returns False if it was not true within the timeout. Parameters:
+#      -condition - function returning True when done
+#      -timeout - seconds to wait
+def wait_for(condition, timeout):
+    deadline = time.monotonic()+timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+# Return the latency of each notification from the latest trigger with the same key before it, in
+# seconds. Parameters:
+#      -triggers - list of (monotonic time, key) of the triggers, in order
+#      -notifications - list of (monotonic time, key) of the notifications
+def match_latencies(triggers, notifications):
+    latencies = []
+    for received, key in notifications:
+        sent = [t for t, k in triggers if k == key and t <= received]
+        if sent:
+            latencies.append(received-sent[-1])
+    return latencies
+
+# Publish IN/OUT messages on the local broker to run_mqtt.py's callbacks and measure them up to the
+# notification. Parameters:
+#      -opt - the benchmark arguments
+#      -broker - the LocalBroker
+#      -telegram - the TelegramEndpoint
+def bench_mqtt(opt, broker, telegram):
+    import run_mqtt
+    from metrics import percentiles
+    from notifier import get_notifier
+
+    run_mqtt.pipeline.start()
+    listener = mqtt.Client(client_id="paho-pi")
+    listener.on_connect = run_mqtt.on_connect
+    listener.on_message = run_mqtt.on_message
+    listener.connect('127.0.0.1', broker.port, 60)
+    listener.loop_start()
+    if not wait_for(lambda: broker.subscribers(run_mqtt.topic_name) > 0, 10):
+        raise RuntimeError('run_mqtt did not subscribe to the local broker')
+    publisher = mqtt.Client(client_id="benchmark")
+    publisher.connect('127.0.0.1', broker.port, 60)
+    publisher.loop_start()
+
+    triggers = []
+    start = time.monotonic()
+    for k in range(opt.messages):
+        location = 'OUT' if k % 2 == 0 else 'IN'
+        triggers.append((time.monotonic(), location))
+        publisher.publish(run_mqtt.topic_name, location)
+        time.sleep(1/opt.rate)
+    log_worker = run_mqtt.pipeline.workers[0]
+    # Wait for every message to be logged, or dropped or failed, and for the last notification
+    wait_for(lambda: sum(log_worker.get_stats()[k] for k in ('processed', 'failed', 'dropped')) >= opt.messages, 60)
+    get_notifier().flush()
+    elapsed = time.monotonic()-start
+
+    publisher.loop_stop()
+    listener.loop_stop()
+    run_mqtt.pipeline.stop(timeout=10)
+    notifications = [(t, 'IN' if text.endswith('inside') else 'OUT') for t, _, text, _ in telegram.take()]
+    stats = run_mqtt.pipeline.get_stats()
+    return {
+        'messages': opt.messages,
+        'notifications': len(notifications),
+        'throughput_per_s': round(stats['workers']['log']['processed']/elapsed, 1),
+        'trigger_to_notification_ms': percentiles(match_latencies(triggers, notifications)),
+        'callback_ms': stats.get('callback_ms'),
+        'workers': stats['workers'],
+    }
+
+# Replay radar edges through the Radar and measure the edge to action latency. Parameters:
+#      -opt - the benchmark arguments
+#      -action - function run for each accepted edge, or None to only record when it runs
+def replay_radar(opt, action=None):
+    from radar import Radar, ReplayPin
+
+    edges, starts = [], []
+    def run_action():
+        starts.append((time.monotonic(), 'edge'))
+        if action is not None:
+            action()
+    pin = ReplayPin([k*opt.edge_interval for k in range(opt.edges)])
+    radar = Radar(pin, run_action, cooldown=opt.cooldown)
+    # Record when each edge arrives, before the radar handles it
+    radar.on_edge = lambda: (edges.append((time.monotonic(), 'edge')), Radar.on_edge(radar))
+    radar.start()
+    pin.wait()
+    radar.close()
+    return radar, edges, starts
+
+# Replay synthetic radar edges, see replay_radar()
+def bench_radar(opt):
+    from metrics import percentiles
+
+    radar, edges, starts = replay_radar(opt)
+    return {
+        'edges': opt.edges,
+        'edge_to_action_ms': percentiles(match_latencies(edges, starts)),
+        'radar': radar.get_stats(),
+    }
+
+# Replay radar edges that each run detect.py on a recorded clip, and measure each edge up to the
+# notification with the detection's image. Parameters:
+#      -opt - the benchmark arguments
+#      -telegram - the TelegramEndpoint
+def bench_vision(opt, telegram):
+    if not opt.weights or not opt.clip:
+        return {'skipped': 'needs --weights and --clip'}
+    try:
+        import detect
+    except ImportError as e:
+        return {'skipped': 'detect.py cannot be imported: '+repr(e)}
+    import cat_detection
+    from metrics import percentiles
+    from event_store import log_event
+    from notifier import get_notifier
+
+    model, imgsz = detect.load_model(opt.weights, 'cpu', imgsz=(opt.imgsz, opt.imgsz))
+    model.warmup(imgsz=(1, 3, *imgsz))
+    inferences = [0]
+    runs = [] # (start, end, found) of each detection run
+    def on_inference():
+        inferences[0] += 1
+    def detect_clip():
+        # Log a placeholder location so that the detection counts as a new event and is notified
+        log_event(time.strftime("%Y%m%d-%H%M%S"), cat_detection.object_label, 'BENCH', 'benchmark')
+        start = time.monotonic()
+        found = detect.run(weights=opt.weights, source=opt.clip, imgsz=imgsz, conf_thres=opt.conf_thres,
+                           nosave=True, project=os.getcwd()+'/runs', model=model, on_inference=on_inference)
+        runs.append((start, time.monotonic(), bool(found)))
+
+    radar, edges, starts = replay_radar(opt, detect_clip)
+    get_notifier().flush()
+    photos = [t for t, method, _, _ in telegram.take() if method == 'sendPhoto']
+    # The latency of each run is from its edge to the first photo received after it started
+    latencies = []
+    for (edge, _), (start, _, found) in zip(match_edges(edges, starts), runs):
+        after = [t for t in photos if t >= start]
+        if found and after:
+            latencies.append(after[0]-edge)
+    detect_time = sum(end-start for start, end, _ in runs)
+    return {
+        'runs': len(runs),
+        'detections': sum(found for _, _, found in runs),
+        'inference_fps': round(inferences[0]/max(detect_time, 1E-9), 2),
+        'trigger_to_notification_ms': percentiles(latencies),
+        'radar': radar.get_stats(),
+    }
+
+# Return the edge that led to each action, i.e. the latest edge before the action started. Parameters:
+#      -edges - list of (monotonic time, key) of the edges
+#      -starts - list of (monotonic time, key) of the action starts
+def match_edges(edges, starts):
+    return [[e for e in edges if e[0] <= start][-1] for start, _ in starts]
+
+# Return the peak memory use of this process in MB
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024, 1) # ru_maxrss is in KB on Linux
+
+# Return descriptions of the results that got worse than the baseline by more than the tolerance.
+# Latencies and memory should not go up, and throughputs should not go down. Parameters:
+#      -report - the new report
+#      -baseline - the previous report
+#      -tolerance - allowed change, as a fraction of the baseline
+def compare(report, baseline, tolerance):
+    regressions = []
+    def check(name, new, old, higher_is_worse):
+        if new is None or old is None or old == 0:
+            return
+        change = (new-old)/old
+        if (change > tolerance) if higher_is_worse else (change < -tolerance):
+            regressions.append(f'{name}: {old} -> {new} ({100*change:+.0f}%)')
+    for scenario, results in report.items():
+        old = baseline.get(scenario)
+        if not isinstance(results, dict) or not isinstance(old, dict):
+            continue
+        for key in ('throughput_per_s', 'inference_fps'):
+            check(scenario+' '+key, results.get(key), old.get(key), False)
+        for key in ('trigger_to_notification_ms', 'edge_to_action_ms'):
+            for stat in ('p50', 'p99'):
+                check(f'{scenario} {key} {stat}', (results.get(key) or {}).get(stat), (old.get(key) or {}).get(stat), True)
+    check('peak_rss_mb', report.get('peak_rss_mb'), baseline.get('peak_rss_mb'), True)
+    return regressions
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', nargs='+', default=['mqtt', 'radar', 'vision'], help='scenarios to run')
+    parser.add_argument('--messages', type=int, default=100, help='MQTT messages to publish')
+    parser.add_argument('--rate', type=float, default=20, help='MQTT messages per second')
+    parser.add_argument('--edges', type=int, default=20, help='radar edges to replay')
+    parser.add_argument('--edge-interval', type=float, default=0.5, help='seconds between radar edges')
+    parser.add_argument('--cooldown', type=float, default=0.0, help='radar cooldown in seconds')
+    parser.add_argument('--weights', default='', help='model weights for the vision scenario')
+    parser.add_argument('--clip', default='', help='recorded clip for the vision scenario')
+    parser.add_argument('--imgsz', type=int, default=640, help='inference size for the vision scenario')
+    parser.add_argument('--conf-thres', type=float, default=0.8, help='confidence threshold for the vision scenario')
+    parser.add_argument('--output', default='', help='file to write the report to')
+    parser.add_argument('--baseline', default='', help='previous report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed change against the baseline')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the code being benchmarked')
+    return parser.parse_args()
+
+def main(opt):
+    # Paths given on the command line are relative to where the benchmarks were started
+    for name in ('weights', 'clip', 'output', 'baseline'):
+        if getattr(opt, name):
+            setattr(opt, name, os.path.abspath(getattr(opt, name)))
+    workdir = tempfile.mkdtemp(prefix='cat_benchmark_')
+    os.makedirs(workdir+'/data/logs')
+    os.chdir(workdir)
+
+    broker = LocalBroker()
+    broker.start()
+    telegram = TelegramEndpoint()
+    telegram.start()
+    # Share one notifier that sends straight away to the local endpoint, so the latency is not the debounce
+    import notifier
+    notifier._notifier = notifier.Notifier('123456:benchmark', 1, base_url=telegram.base_url, debounce=0.0,
+                                           min_interval=0.0, max_per_minute=10**9)
+
+    report = {}
+    scenarios = {'mqtt': lambda: bench_mqtt(opt, broker, telegram), 'radar': lambda: bench_radar(opt),
+                 'vision': lambda: bench_vision(opt, telegram)}
+    for name in opt.scenarios:
+        output = sys.stdout if opt.verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            report[name] = scenarios[name]()
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['workdir'] = workdir
+    broker.stop()
+    telegram.stop()
+
+    print(json.dumps(report, indent=2))
+    if opt.output:
+        with open(opt.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if opt.baseline:
+        with open(opt.baseline) as f:
+            regressions = compare(report, json.load(f), opt.tolerance)
+        for regression in regressions:
+            print('Regression: '+regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_opt()))
@@ -0,0 +1,68 @@
+# Description: Local stand-in for the Telegram Bot API used by the benchmarks. Answers sendMessage and
+#   sendPhoto like Telegram does, and records when each message arrived and its text, so the harness can
+#   measure the latency up to the notification. Point the notifier at it with its base_url, see
+#   yolov5/notifier.py. Uses only the standard library.
+# Date: Oct 17 2026
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Answers the Bot API requests and records the messages
+class BotHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        method = self.path.rsplit('/', 1)[-1]
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            text = json.loads(body or b'{}').get('text', '')
+        else: # multipart/form-data, as sent by sendPhoto
+            match = re.search(rb'name="caption"\r\n(?:[^\r\n]*\r\n)*?\r\n(.*?)\r\n--', body, re.S)
+            text = match.group(1).decode() if match else ''
+        self.server.endpoint.record(method, text, len(body))
+        reply = {'ok': True, 'result': {'message_id': len(self.server.endpoint.messages), 'date': int(time.time()),
+                                        'chat': {'id': 1, 'type': 'private'}, 'text': text}}
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Keep the benchmark output readable
+
+# Fake Telegram Bot API server on localhost. Parameters:
+#      -host - address to listen on
+#      -port - port to listen on, or 0 to pick a free port
+class TelegramEndpoint:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), BotHandler)
+        self.server.endpoint = self
+        self.lock = threading.Lock()
+        self.messages = [] # (monotonic time, method, text, request size) of each request
+
+    # Base URL to pass to the notifier
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://'+host+':'+str(port)+'/bot'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='telegram_endpoint', daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def record(self, method, text, size):
+        with self.lock:
+            self.messages.append((time.monotonic(), method, text, size))
+
+    # Return a copy of the recorded messages, and forget them
+    def take(self):
+        with self.lock:
+            messages, self.messages = self.messages, []
+        return messages
@@ -0,0 +1,155 @@
+# Description: Measures the startup of the web application (run_webapp.py) on synthetic aggregate data:
+#     -import - time to import run_webapp.py in a fresh interpreter, the memory used after it, and which
+#        of the heavy modules (pandas, NumPy, plotly.express) it loaded
+#     -first request - time to answer the graph callback for the default view, and the memory after it
+#     -gunicorn - with --workers, starts gunicorn with gunicorn.conf.py and reports the resident (RSS) and
+#        proportional (PSS, shared pages split between the processes) memory of the master and each worker.
+#        Skipped if gunicorn is not installed.
+#   Reports the results as JSON, ex:
+#     python3 benchmarks/webapp_startup.py --years 5 --workers 3
+# Date: Oct 17 2026
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+PI_CODE = Path(__file__).resolve().parent.parent
+
+# Body of the Dash callback request for the default view, Daily and All
+default_request = {
+    'output': 'cat-graph.figure',
+    'outputs': {'id': 'cat-graph', 'property': 'figure'},
+    'inputs': [{'id': 'graph-select', 'property': 'value', 'value': 'Daily'},
+               {'id': 'range-select', 'property': 'value', 'value': 'All'},
+               {'id': 'cat-graph', 'property': 'relayoutData', 'value': None}],
+    'changedPropIds': ['graph-select.value'],
+}
+
+# Write an aggregate_data.txt with one line per day. Parameters:
+#      -path - file to write
+#      -years - number of years of data
+def write_aggregates(path, years):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = random.Random(0)
+    day = time.mktime((2020, 1, 1, 12, 0, 0, 0, 0, -1))
+    with open(path, 'w') as f:
+        for _ in range(int(years*365)):
+            minutes = [rng.randint(5, 200) for _ in range(rng.randint(1, 4))]
+            f.write(time.strftime('%Y%m%d', time.localtime(day))+','+','.join(map(str, minutes+[sum(minutes)]))+'\n')
+            day += 86400
+
+# Return the resident memory of this process in MB
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return round(int(line.split()[1])/1024, 1)
+
+# Return the Rss and Pss of a process in MB, from /proc/<pid>/smaps_rollup. Parameters:
+#      -pid - the process id
+def memory_of(pid):
+    memory = {}
+    with open('/proc/'+str(pid)+'/smaps_rollup') as f:
+        for line in f:
+            name = line.split(':')[0]
+            if name in ('Rss', 'Pss'):
+                memory[name.lower()+'_mb'] = round(int(line.split()[1])/1024, 1)
+    return memory
+
+# Run in a fresh interpreter by measure_import(): import run_webapp.py and answer the default view
+def child():
+    start = time.perf_counter()
+    import run_webapp
+    report = {'import_s': round(time.perf_counter()-start, 3), 'import_rss_mb': rss_mb(),
+              'loaded': sorted(m for m in ('pandas', 'numpy', 'plotly.express') if m in sys.modules)}
+    client = run_webapp.server.test_client()
+    for name in ('first_request_s', 'second_request_s'):
+        start = time.perf_counter()
+        response = client.post('/_dash-update-component', json=default_request)
+        report[name] = round(time.perf_counter()-start, 3)
+        if response.status_code != 200:
+            raise RuntimeError('callback failed with status '+str(response.status_code))
+    report['response_kb'] = round(len(response.data)/1024, 1)
+    report['request_rss_mb'] = rss_mb()
+    print(json.dumps(report))
+
+# Import run_webapp.py in a fresh interpreter in the data directory and return its report. Parameters:
+#      -workdir - directory holding data/logs/aggregate_data.txt
+def measure_import(workdir):
+    env = dict(os.environ, PYTHONPATH=str(PI_CODE))
+    output = subprocess.run([sys.executable, __file__, '--child'], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+# Return the ids of the child processes of a process. Parameters:
+#      -pid - the parent process id
+def children_of(pid):
+    with open('/proc/'+str(pid)+'/task/'+str(pid)+'/children') as f:
+        return [int(child) for child in f.read().split()]
+
+# Start gunicorn with gunicorn.conf.py and return the memory of the master and of each worker after
+# they have answered requests. Parameters:
+#      -workdir - directory holding data/logs/aggregate_data.txt
+#      -workers - number of workers
+#      -port - port to listen on
+def measure_gunicorn(workdir, workers, port):
+    env = dict(os.environ, PYTHONPATH=str(PI_CODE), WEB_CONCURRENCY=str(workers))
+    command = [sys.executable, '-m', 'gunicorn', '--config', str(PI_CODE/'gunicorn.conf.py'),
+               '--bind', '127.0.0.1:'+str(port), 'run_webapp:server']
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = 'http://127.0.0.1:'+str(port)
+        ready = None
+        while ready is None:
+            if process.poll() is not None or time.perf_counter()-start > 60:
+                raise RuntimeError('gunicorn did not start')
+            try:
+                urllib.request.urlopen(url+'/', timeout=1).read()
+                ready = round(time.perf_counter()-start, 3)
+            except OSError:
+                time.sleep(0.05)
+        # Requests are spread over the workers, so send enough for each to answer some
+        body = json.dumps(default_request).encode()
+        for _ in range(workers*4):
+            request = urllib.request.Request(url+'/_dash-update-component', body, {'Content-Type': 'application/json'})
+            urllib.request.urlopen(request, timeout=30).read()
+        return {'ready_s': ready, 'master': memory_of(process.pid),
+                'workers': [memory_of(pid) for pid in children_of(process.pid)]}
+    finally:
+        process.terminate()
+        process.wait()
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=float, default=3, help='years of synthetic daily data')
+    parser.add_argument('--workers', type=int, default=0, help='gunicorn workers to measure, 0 to skip gunicorn')
+    parser.add_argument('--port', type=int, default=8765, help='port for gunicorn')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main(opt):
+    if opt.child:
+        child()
+        return
+    with tempfile.TemporaryDirectory(prefix='cat_webapp_') as workdir:
+        write_aggregates(workdir+'/data/logs/aggregate_data.txt', opt.years)
+        report = {'days': int(opt.years*365), 'import': measure_import(workdir)}
+        if opt.workers:
+            try:
+                import gunicorn
+            except ImportError:
+                report['gunicorn'] = {'skipped': 'gunicorn is not installed'}
+            else:
+                report['gunicorn'] = measure_gunicorn(workdir, opt.workers, opt.port)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main(parse_opt())
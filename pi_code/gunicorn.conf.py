@@ -0,0 +1,19 @@
+# Description: gunicorn settings for the web application, see Procfile. The application is loaded once in
+#  the master process, which also parses aggregate_data.txt and builds the default graph (see warm_up() in
+#  run_webapp.py), and the workers are then forked from it. The workers share those memory pages with the
+#  master instead of each importing and parsing everything again. The number of workers is set by the
+#  WEB_CONCURRENCY environment variable, as read by gunicorn.
+# Date: Oct 17 2026
+
+import gc
+
+preload_app = True # Load run_webapp.py in the master before forking the workers
+
+# Called in the master once the application is loaded, before the workers are forked. Parameters:
+#      -server - the gunicorn arbiter
+def when_ready(server):
+    import run_webapp
+    run_webapp.warm_up()
+    # Keep the garbage collector from touching the objects loaded so far, since writing to them in a
+    # worker would give it its own copy of the pages
+    gc.freeze()
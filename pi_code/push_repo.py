@@ -1,4 +1,15 @@
-# Description: Push the aggregate_data.txt file to the Github repository using GitPython
+# Description: Publish the aggregates to the Github repository using GitPython. Only does something when
+#  aggregate_data.txt has changed since it was last published:
+#     -writes a snapshot of the daily totals (aggregate_snapshot.npy, see webapp_data.write_snapshot()),
+#        which the web application loads without parsing aggregate_data.txt, and a small JSON summary
+#        (aggregate_summary.json) holding the hash of the aggregate_data.txt it was made from
+#     -commits only the published files that changed, leaving anything else that is staged out of the
+#        commit, and pushes only when there are commits the remote does not have yet, including those left
+#        by an earlier push that failed
+#  Apart from GitPython it only uses the standard library, so cron can run it with the system python3.
+#  Any git remote works, so it can be tried against a local bare repository, for example:
+#     git init --bare /tmp/remote.git && git -C /home/pi/myyolo remote add test /tmp/remote.git
+#     python3 push_repo.py --remote-name test
 # Date: Oct 11 2022
 # Author: Vanessa Pesch
 #
@@ -7,22 +18,145 @@
 # Date: Jul 8 2020
 # URL: https://stackoverflow.com/a/62796479
 
-from git import Repo
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from git import PushInfo, Repo
+# Import the standard library parser and snapshot writer of aggregate_data.txt from webapp_data.py
+from webapp_data import parse_totals, write_snapshot
 
 # Location of the local git directory
 full_local_path = "/home/pi/myyolo/.git/"
-# Github username 
-username = "myusername" 
+# Github username
+username = "myusername"
 # URL of the Github respository for the Cat Door App
-remote = "https://github.com/{username}/cat-door-app.git" 
-
-# Commit changes
-repo = Repo(full_local_path)
-repo.git.add(["/home/pi/myyolo/data/logs/aggregate_data.txt"])
-repo.index.commit("Updated log")
-
-# Push changes
-repo = Repo(full_local_path)
-origin = repo.remote("origin")
-origin.push("master")
-print("Pushed to repo")
+remote = "https://github.com/{username}/cat-door-app.git"
+# Branch to push
+branch = "master"
+
+# Published files, relative to the top of the repository
+aggregate_file = 'data/logs/aggregate_data.txt'
+snapshot_file = 'data/logs/aggregate_snapshot.npy'
+summary_file = 'data/logs/aggregate_summary.json'
+
+# Return the summary last written, or an empty dict if there is none. Parameters:
+#      -path - location of the summary
+def read_summary(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# Return the mean of a list of minutes rounded to one decimal, or None if the list is empty
+def mean(minutes):
+    return round(sum(minutes)/len(minutes), 1) if minutes else None
+
+# Return the summary of the daily totals. Parameters:
+#      -totals - the daily totals, as returned by parse_totals()
+#      -source_hash - hash of the aggregate_data.txt they were parsed from
+#      -source_bytes - size of that aggregate_data.txt
+def summarize(totals, source_hash, source_bytes):
+    minutes = [total for _, total in totals]
+    return {
+        'source_sha256': source_hash,
+        'source_bytes': source_bytes,
+        'days': len(totals),
+        'first': totals[0][0] if totals else None,
+        'last': totals[-1][0] if totals else None,
+        'total_minutes': sum(minutes),
+        'mean_minutes': mean(minutes),
+        'last_7_days_mean_minutes': mean(minutes[-7:]),
+        'last_30_days_mean_minutes': mean(minutes[-30:]),
+        'updated': time.strftime("%Y%m%d-%H%M%S"),
+    }
+
+# Write the snapshot and summary if aggregate_data.txt changed since they were written. Returns True if
+# they were written. Parameters:
+#      -work_tree - top directory of the repository
+#      -force - write them even if aggregate_data.txt did not change
+def update_snapshot(work_tree, force=False):
+    source = os.path.join(work_tree, aggregate_file)
+    snapshot = os.path.join(work_tree, snapshot_file)
+    summary = os.path.join(work_tree, summary_file)
+    with open(source, 'rb') as f:
+        data = f.read() # Read once, so that the hash, size and snapshot are all of the same contents
+    source_hash = hashlib.sha256(data).hexdigest()
+    if not force and os.path.exists(snapshot) and read_summary(summary).get('source_sha256') == source_hash:
+        return False
+    totals = parse_totals(data.decode())
+    write_snapshot(totals, snapshot)
+    with open(summary+'.tmp', 'w') as f:
+        json.dump(summarize(totals, source_hash, len(data)), f, indent=1, sort_keys=True)
+    os.replace(summary+'.tmp', summary)
+    return True
+
+# Commit the published files that changed since the last commit. Only these paths are committed: other
+# changes, even if they are staged, are left out of the commit and stay as they are. Returns the commit, or
+# None if nothing changed. Parameters:
+#      -repo - the Repo
+def commit_changes(repo):
+    paths = [path for path in (aggregate_file, snapshot_file, summary_file)
+             if os.path.exists(os.path.join(repo.working_tree_dir, path))]
+    repo.index.add(paths) # Files committed for the first time must be known to git
+    if repo.head.is_valid() and not repo.index.diff('HEAD', paths=paths):
+        return None
+    summary = read_summary(os.path.join(repo.working_tree_dir, summary_file))
+    repo.git.commit('-m', "Updated log" + (" to " + summary['last'] if summary.get('last') else ""), '--', *paths)
+    return repo.head.commit
+
+# Return the number of commits on the branch that the remote does not have, as far as known from the
+# last fetch or push. Parameters:
+#      -repo - the Repo
+#      -remote_name - name of the remote
+def unpushed_commits(repo, remote_name):
+    tracking = f'{remote_name}/{branch}'
+    if tracking not in [ref.name for ref in repo.remote(remote_name).refs]:
+        return sum(1 for _ in repo.iter_commits(branch)) # Never pushed
+    return sum(1 for _ in repo.iter_commits(f'{tracking}..{branch}'))
+
+# Push the branch if the remote does not have all of its commits. Returns the number of commits pushed.
+# Raises an IOError if the push was rejected. Parameters:
+#      -repo - the Repo
+#      -remote_name - name of the remote
+def push_changes(repo, remote_name):
+    pending = unpushed_commits(repo, remote_name)
+    if not pending:
+        return 0
+    for info in repo.remote(remote_name).push(f'{branch}:{branch}'):
+        if info.flags & (PushInfo.ERROR | PushInfo.REJECTED | PushInfo.REMOTE_REJECTED | PushInfo.REMOTE_FAILURE):
+            raise IOError('Push to '+remote_name+' failed: '+info.summary.strip())
+    return pending
+
+# Publish the aggregates. Returns what was done. Parameters:
+#      -git_dir - location of the local git directory
+#      -remote_name - name of the remote to push to
+#      -force - write the snapshot even if aggregate_data.txt did not change
+#      -push - push the commits, or only commit them
+def publish(git_dir=full_local_path, remote_name='origin', force=False, push=True):
+    repo = Repo(git_dir)
+    result = {'snapshot': update_snapshot(repo.working_tree_dir, force)}
+    commit = commit_changes(repo)
+    result['commit'] = commit.hexsha[:8] if commit is not None else None
+    result['pushed'] = push_changes(repo, remote_name) if push else 0
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--git-dir', default=full_local_path, help='location of the local git directory')
+    parser.add_argument('--remote-name', default='origin', help='name of the remote to push to')
+    parser.add_argument('--force', action='store_true', help='write the snapshot even if the aggregates did not change')
+    parser.add_argument('--no-push', dest='push', action='store_false', help='commit without pushing')
+    opt = parser.parse_args()
+    result = publish(opt.git_dir, opt.remote_name, opt.force, opt.push)
+    if result['pushed']:
+        print("Pushed to repo")
+    elif result['commit'] is None:
+        print("Nothing to publish")
+    else:
+        print("Committed, not pushed")
+    print(json.dumps(result))
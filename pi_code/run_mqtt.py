@@ -1,6 +1,8 @@
 # Description: Uses Paho MQTT client to connect to an MQTT public broker and subscribe to topic to
 #  receive messages from ESP32-S2 device. When message is received, send message to user via Telegram,
-#  and update the monthly log file.
+#  and add the event to the event store and the monthly log file. The MQTT callback only queues the
+#  message; logging and notification are handled by separate worker threads (see
+#  yolov5/ingest_pipeline.py) so that a slow Telegram request does not hold up the MQTT network loop.
 # Date: Oct 11 2022
 # Author: Vanessa Pesch
 #
@@ -10,14 +12,24 @@
 # URL: https://www.emqx.com/en/blog/use-mqtt-with-raspberry-pi
 
 import paho.mqtt.client as mqtt
+import argparse
 import time
-import telegram
 import os
-from pathlib import Path
+import sys
+# Add the yolov5 directory to the path so that its modules, and their sibling modules, can be imported.
+# cat_detection.py is imported through this path like everywhere else, so that a process that also runs
+# supervisor.py loads it once and shares its state, ex. event_sink.
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/yolov5')
 # Import get_prev_detection() and update_aggr_log() methods from cat_detection.py
-from yolov5.cat_detection import get_prev_detection, update_aggr_log
-# Import variables TELEGRAM_BOT and TELEGRAM_CHAT from credentials.py
-from yolov5.credentials import TELEGRAM_BOT, TELEGRAM_CHAT
+from cat_detection import get_prev_detection, update_aggr_log
+# Import log_event() from event_store.py
+from event_store import log_event
+# Import IngestPipeline and retry() from ingest_pipeline.py
+from ingest_pipeline import IngestPipeline, retry
+# Import get_notifier() from notifier.py
+from notifier import get_notifier
+# Import metrics.py to serve the metrics
+import metrics
 
 cwd = os.getcwd() # Current working directory
 
@@ -39,12 +51,14 @@ def on_connect(client, userdata, flags, rc):
         # Subscribe to topic esp32/catmessage with qos 0, meaning no acknowledgement required
         client.subscribe(topic_name,0) 
 
-# Callback function when message received from broker. Parameters:
+# Callback function when message received from broker. Only queues the message for the logging and
+# notification workers, and records how long the callback took. Parameters:
 #     -client - the client instance
 #     -userdata - users' information, typically empty
 #     -msg - the message received from the broker
 def on_message(client, userdata, msg):
     
+    start = time.perf_counter()
     timestamp = time.strftime("%Y%m%d-%H%M%S") # Current timestamp    
     print("Time now: " + timestamp) # Print timestamp to console
     
@@ -53,65 +67,94 @@ def on_message(client, userdata, msg):
     
     # Check if the location is one of the two legitimate options of IN or OUT
     if location == "IN" or location == "OUT":
-        # Call notify() to send the location to the user via the Telegram channel
-        notify(location)
-        # Call update_log() to update the log file
-        update_log(timestamp,object_label,location)
-        
-        # Call get_prev_detection() to obtain the most recent location in the logs,
-        # and return as an array of location and log interval in mins, where the interval
-        # is the time between the most recent log and the current timestamp.
-        log = get_prev_detection(timestamp) 
-        log_location = log[0] # Location from the log
-        log_interval = log[1] # Time interval from logged time to current time
-        print('log: '+str(log))
-        
-        # If interval is greater than 30 minutes or previous log location is different
-        # from current location, and the current location is "IN", then call update_aggr_log()
-        # to update the aggregate_data.txt log file.
-        if (log_location != location or log_interval >= 30) and location == "IN":
-            update_aggr_log(timestamp,log_interval)
+        pipeline.submit(timestamp, location) # Queue the message for the workers
+    pipeline.record_latency(time.perf_counter()-start)
 
-# Use the Python Telegram Bot to send message to user on specified Telegram channel.
+# Runs in the logging worker. Adds the event to the event store and the monthly log file, and updates the
+# aggregate log. Each step is retried on its own, and an event that is already in the event store is not
+# logged or added to the aggregate log again, so a failed step never writes the event twice.
+# Parameters:
+#     -timestamp - the timestamp when the message was received
+#     -location - the cat's location, either IN or OUT
+def record_location(timestamp, location):
+    
+    # Call get_prev_detection() to obtain the most recent location in the logs before this
+    # message, and return as an array of location and log interval in mins, where the interval
+    # is the time between the most recent log and the current timestamp. It is read once, before
+    # the event itself is logged.
+    log = retry(get_prev_detection, timestamp) 
+    log_location = log[0] # Location from the log
+    log_interval = log[1] # Time interval from logged time to current time
+    print('log: '+str(log))
+    
+    # Call update_log() to add the event to the event store and the monthly log file
+    if not update_log(timestamp,object_label,location):
+        print('Already logged: '+timestamp+' '+location)
+        return
+    
+    # If interval is greater than 30 minutes or previous log location is different
+    # from current location, and the current location is "IN", then call update_aggr_log()
+    # to update the aggregate_data.txt log file.
+    if (log_location != location or log_interval >= 30) and location == "IN":
+        retry(update_aggr_log, timestamp, log_interval)
+
+# Runs in the notification worker. Sends the location to the user via the Telegram channel.
+# Parameters:
+#     -timestamp - the timestamp when the message was received
+#     -location - the cat's location, either IN or OUT
+def notify_location(timestamp, location):
+    notify(location)
+
+# Send message to user on specified Telegram channel, using the shared notifier (see yolov5/notifier.py).
+# Messages sent in quick succession are coalesced, so only where the cat ended up is sent.
 # Parameters:
 #      -location - the cat's location, either IN or OUT
-#
-# Adapted from Python Telegram Bot API:
-# https://github.com/python-telegram-bot/python-telegram-bot/wiki/Introduction-to-the-API
 def notify(location):
-    bot = telegram.Bot(TELEGRAM_BOT)
     if location == 'IN':
-        bot.send_message(text=cat_name+' is inside', chat_id = TELEGRAM_CHAT)
+        get_notifier().send(cat_name+' is inside', source='door')
     elif location == 'OUT':
-        bot.send_message(text=cat_name+' is outside', chat_id = TELEGRAM_CHAT)
+        get_notifier().send(cat_name+' is outside', source='door')
     
-# Update the log file with entries in the form of YYYYMMDD-HHMMSS-label-location
-# For example: 20220729-172611-sylvester_face-IN
+# Add the event to the event store and the monthly log file, retrying each on its own. Returns False if the
+# event was already in the event store (see yolov5/event_store.py).
 # Parameters:
-#       -timestamp - the timestamp when the message was received
+#       -timestamp - the timestamp when the message was received, ex. 20220729-172611
 #       -obj_label - the object's label name, ex. sylvester_face
 #       -location - the cat's location, either IN or OUT
 def update_log(timestamp,obj_label,location):
-    # Log filename should be format of, ex., 202207_log.txt
-    filename = time.strftime('%Y%m')+'_log.txt'
-    # Get log directory
-    log_directory = cwd+'/data/logs/'
-    # Create the directory if it does not exist
-    if not os.path.exists(log_directory):
-        os.makedirs(log_directory)
-    os.chdir(log_directory)
-    
-    # Create the file if it does not exist, and append content
-    f = open(filename, 'a+') 
-    content = timestamp+'-'+obj_label+'-'+location+'\n'
-    f.write(content)
-    f.close()
+    return log_event(timestamp,obj_label,location,'button',retries=3)
+
+# Pipeline with one worker for logging and one for notifications, each with its own bounded queue.
+# The logging queue is larger since dropping a log entry loses data, while a dropped notification
+# during a burst of messages is only a missed message. record_location() retries its own steps.
+pipeline = IngestPipeline()
+pipeline.add_worker('log', record_location, maxsize=1000, retries=0)
+pipeline.add_worker('notify', notify_location, maxsize=20, retries=3, retry_delay=2.0)
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='broker.emqx.io', help='MQTT broker host')
+    parser.add_argument('--port', type=int, default=1883, help='MQTT broker port')
+    parser.add_argument('--stats-interval', type=float, default=0, help='seconds between printing pipeline counters, 0 for never')
+    metrics.add_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    metrics.enable_from(opt)
+    pipeline.start()
+    if opt.stats_interval > 0:
+        pipeline.report_every(opt.stats_interval)
 
-# Create new MQTT client instance
-client = mqtt.Client(client_id="paho-pi")
-client.on_connect = on_connect
-client.on_message = on_message
+    # Create new MQTT client instance
+    client = mqtt.Client(client_id="paho-pi")
+    client.on_connect = on_connect
+    client.on_message = on_message
 
-# Connect to EMQX broker, listening on port 1883 with keepalive set to 60 seconds
-client.connect("broker.emqx.io", 1883, 60)
-client.loop_forever()
\ No newline at end of file
+    # Connect to the broker (EMQX by default), listening on port 1883 with keepalive set to 60 seconds
+    client.connect(opt.host, opt.port, 60)
+    try:
+        client.loop_forever()
+    finally:
+        pipeline.stop(timeout=10) # Finish the queued messages before exiting
@@ -1,6 +1,9 @@
 # Optional Radar Component
-# Description: Use the RCWL-0516 radar module to detect movement, and call detect.py from YOLOv5 
-#   to run object detection when movement occurs.
+# Description: Use the RCWL-0516 radar module to detect movement, and arm the detector service
+#   (yolov5/detector_service.py) to run object detection when movement occurs. Falls back to
+#   calling detect.py from YOLOv5 if the detector service is not running. Movement is handled by
+#   yolov5/radar.py, which coalesces triggers while the detector is being armed and ignores triggers
+#   during a cooldown after each one. Use --replay to replay recorded trigger times instead of the radar.
 # Date: Oct 11 2022
 # Author: Vanessa Pesch
 #
@@ -9,21 +12,29 @@
 # Date: Oct 31 2017
 # URL: https://www.electromaker.io/tutorial/blog/using-a-doppler-radar-sensor-with-the-raspberry-pi-12
 
-from gpiozero import DigitalInputDevice
-from time import sleep
+import argparse
+import json
 import os
+import signal
 import subprocess
+import threading
+# Import arm() from detector_client.py to send commands to the detector service
+from yolov5.detector_client import arm
+# Import the radar and its input backends from radar.py
+from yolov5.radar import GpioPin, Radar, ReplayPin
 
 # Get current working directory
 cwd = os.getcwd()
 
-# Radar module using GPIO 17 pin. Pull-up set to false to set pin 'low' by default. Bounce
-# time is the number of seconds that the radar will ignore changes in state after initial change.
-radar = DigitalInputDevice(17, pull_up=False, bounce_time=30.0)
-
-# Tries to call detect.py() to run the object detection by webcam. Prints error messages to
-# console if exception occurs.
+# Arms the detector service, which already has the model loaded. If the service is not running,
+# tries to call detect.py() to run the object detection by webcam. Prints error messages to
+# console if exception occurs. Runs in the radar's worker thread, so it may block.
 def detector():
+    try:
+        print('Detector service: '+arm())
+        return
+    except OSError:
+        print('Detector service not running, starting detect.py')
     try:
         subprocess.run('libcamerify python3 '+cwd+'/yolov5/detect.py --weights '+cwd+
                        '/yolov5/best.pt --source 0 --conf-thres 0.8',shell=True, check=True)
@@ -31,7 +42,30 @@ def detector():
         print('---------------Detect code was stopped--------------')
         print('Exit code: ', c.returncode)
        
-# Call detector() function if radar is activated. Sleep for 2 seconds to free up CPU resources.
-while True:
-    radar.when_activated = detector
-    sleep(2)
\ No newline at end of file
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pin', type=int, default=17, help='GPIO pin of the radar module')
+    parser.add_argument('--cooldown', type=float, default=30.0, help='seconds to ignore the radar after a trigger')
+    parser.add_argument('--replay', default='', help='file of trigger times in seconds to replay instead of the radar')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed, ex. 60 to replay a minute per second')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    pin = ReplayPin.from_file(opt.replay, opt.speed) if opt.replay else GpioPin(opt.pin)
+    radar = Radar(pin, detector, cooldown=opt.cooldown)
+    radar.start()
+
+    # Wait for SIGTERM (from stop_scripts.sh), Ctrl-C, or the end of the replay
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        if opt.replay:
+            pin.wait()
+        else:
+            stop.wait()
+    except KeyboardInterrupt:
+        pass
+    radar.close(timeout=10)
+    print(json.dumps(radar.get_stats()))
@@ -1,58 +1,110 @@
 # Description: Web application for the Cat Door App. Pulls data from aggregate_data.txt file and 
-#  plots it on a graph using Plotly Dash.
+#  plots it on a graph using Plotly Dash. The data and graphs are refreshed when the file changes. The
+#  snapshot of the file published by push_repo.py is loaded instead when it was made from the file as it is.
+#  Graphs are built on the first request that shows them. Under gunicorn (see gunicorn.conf.py), warm_up()
+#  parses the data and builds the default graph once in the master process, and the workers share them.
 # Date: Oct 11 2022
 # Author: Vanessa Pesch
 #
 # Note: this was deployed with Heroku free tier, which Heroku has since eliminated.
 
-from dash import Dash, html, dcc, Input, Output
-import numpy as np
-import pandas as pd
-import plotly.express as px
+from dash import Dash, html, dcc, ctx, Input, Output
+import plotly.graph_objects as go
+from plotly.colors import qualitative
 import os
+import threading
+# Import AggregateCache from webapp_data.py to load the aggregate_data.txt file. pandas is only imported
+# by webapp_data.py when the file is first parsed.
+from webapp_data import AggregateCache, to_day
 
 app = Dash(__name__, title="Cat Door App") # Website title in browser title bar
 
 server = app.server # Declare server for Heroku deployment
 
-df = pd.DataFrame({'results':[]}, index=[]) # Create pandas dataframe
-
 cwd = os.getcwd() # Current working directory
 
-# Open aggregate_data.txt file. Its contents should have a data in the first column,
-# and one or many subsequent columns containing numbers (that represent time spent outside).
-with open (cwd+'/data/logs/aggregate_data.txt', 'r') as temp:
-    lines = temp.readlines() # Read lines
-    # For each line, add only the first and last column to the dataframe
-    # Source code: https://stackoverflow.com/a/52890095
-    for row in lines: 
-        df.loc[row.split(',')[0]]=[row.split(',')[-1].replace('\n','')]
-
-# Convert the index column of the dataframe to datetime format
-# Source code: https://stackoverflow.com/a/60528830
-df.index = pd.to_datetime(df.index, format='%Y%m%d')
-
-# Convert results column of the dataframe to numeric type 
-df['results'] = pd.to_numeric(df['results'])
-
-# Create a new dataframe that has two columns: 1) year and month, and 2) average results of that month
-# Source code: https://stackoverflow.com/a/67853478
-df_date = df.set_index(df.index, inplace=False)
-df_mean = df_date.resample('M').mean()
-
-# Convert the time in 'results' column from minutes to hours
-df_mean['results'] = pd.to_datetime(df_mean['results'], unit='m').dt.strftime('%-H.%-M')
-
-# Create bar graph using df_month dataframe
-fig_monthly = px.bar(df_mean, x=df_mean.index, y=df_mean.loc[:,'results'].astype(float),color='results', color_discrete_sequence=px.colors.qualitative.Plotly)
-# Display only one value on the x axis for each month
-# Source code: https://plotly.com/python/reference/#dtick
-fig_monthly.update_layout(xaxis=dict(tickformat='%b %Y',tick0=df_mean.index[0],dtick='M1'))
-
-# Convert to hours
-df['results'] = pd.to_datetime(df['results'], unit='m').dt.strftime('%-H.%-M')
-# Create bar graph using df dataframe
-fig_daily = px.bar(df, x=df.index, y=df.loc[:,'results'].astype(float),color='results', color_discrete_sequence=px.colors.qualitative.Bold)
+# Parsed contents of the aggregate_data.txt file and its weekly and monthly rollups, reparsed only
+# when the file changes
+cache = AggregateCache(cwd+'/data/logs/aggregate_data.txt', cwd+'/data/logs/aggregate_snapshot.npy',
+                       cwd+'/data/logs/aggregate_summary.json')
+figures = {} # Graphs built from the cached data, keyed on what they show
+figures_lock = threading.Lock()
+max_figures = 32 # Number of graphs to keep
+
+# Number of months shown by each of the range buttons
+range_months = {'1m': 1, '6m': 6, '1y': 12}
+# Longest range, in days, shown as daily bars. Longer ranges are shown as weekly averages so that
+# the amount of data sent to the browser stays about the same as years of data build up.
+max_daily_days = 366
+
+# Create a bar graph of a range of the cached data. Built as a single trace of bars, each coloured by its
+# value, rather than with plotly.express, which imports more and creates one trace per distinct value.
+# Parameters:
+#      -df - rows of the daily totals or of the weekly or monthly averages
+#      -granularity - one of daily, weekly or monthly
+def build_figure(df, granularity):
+    # Convert the time in 'results' column from minutes to hours, shown as H.M
+    hours = ['%d.%d' % (minutes//60 % 24, minutes % 60) for minutes in df['results'].astype(int)]
+
+    # Give each distinct value the next colour of the palette, in order of first appearance
+    palette = qualitative.Bold if granularity == 'daily' else qualitative.Plotly
+    colors = {}
+    for value in hours:
+        colors.setdefault(value, palette[len(colors) % len(palette)])
+
+    # Create bar graph using the daily totals or the weekly or monthly averages
+    fig = go.Figure(go.Bar(x=df.index, y=[float(value) for value in hours], marker_color=[colors[value] for value in hours]),
+                    layout=dict(margin=dict(t=60)))
+    if granularity == 'monthly' and len(df):
+        # Display only one value on the x axis for each month
+        # Source code: https://plotly.com/python/reference/#dtick
+        fig.update_layout(xaxis=dict(tickformat='%b %Y',tick0=df.index[0],dtick='M1'))
+
+    style_graph(fig) # Style the graph
+    return fig
+
+# Work out the date range to show. A range selected by zooming or panning the graph takes priority
+# over the range buttons. Returns the start and end dates, either of which may be None for no limit.
+# Parameters:
+#      -range_select - the range button selected by user
+#      -relayout - the graph's relayoutData after the user zoomed or panned, or None
+def get_range(range_select, relayout):
+    if relayout and 'xaxis.range[0]' in relayout:
+        return to_day(relayout['xaxis.range[0]']), to_day(relayout['xaxis.range[1]'])
+    if range_select in range_months:
+        return cache.last_months(range_months[range_select])
+    return None, None
+
+# Return the graph of the data within a date range, querying only the rows in the range from the
+# precomputed rollups. Graphs are rebuilt only if aggregate_data.txt has changed since they were built.
+# Parameters:
+#      -granularity - one of daily, weekly or monthly
+#      -start - first date to show, or None to start from the first row
+#      -end - last date to show, or None to end at the last row
+def get_figure(granularity, start, end):
+    df = cache.daily()
+    # Fall back to weekly averages if there would be too many daily bars
+    first = start if start is not None else (df.index[0] if len(df) else None)
+    last = end if end is not None else (df.index[-1] if len(df) else None)
+    if granularity == 'daily' and first is not None and (last - first).days > max_daily_days:
+        granularity = 'weekly'
+
+    key = (cache.version, granularity, start, end)
+    if key not in figures:
+        if len(figures) >= max_figures:
+            figures.clear()
+        figures[key] = build_figure(cache.window(granularity, start, end), granularity)
+    return figures[key]
+
+# Parse aggregate_data.txt and build the default graph (Daily, All). Called by gunicorn.conf.py in the
+# master process before the workers are forked, so that the workers start with the parsed data and the
+# graph in memory they share, rather than each parsing and building its own on their first request.
+def warm_up():
+    if not os.path.exists(cache.path) and not cache.snapshot_current():
+        return
+    with figures_lock:
+        cache.refresh()
+        get_figure('daily', None, None)
 
 # Change style of graph. Parameters:
 #      -fig - the figure or graph to be displayed
@@ -64,24 +116,7 @@ def style_graph(fig):
         paper_bgcolor='rgba(0,0,0,0)',
         font_color='white',
         xaxis_title_font_size=18,
-        yaxis_title_font_size=18,
-        # Change color of rangeselector.
-        # Source code: https://stackoverflow.com/a/72533537
-        xaxis=dict(
-            rangeselector = dict(activecolor='#EFC050',font_color="black")
-        )
-    )
-    # Create rangeselector buttons for '1 month', '6 months', '1 year' and 'all' views.
-    # Source code: https://plotly.com/python/time-series/#time-series-with-range-selector-buttons
-    fig.update_xaxes(
-        rangeselector=dict(
-            buttons=list([
-                dict(count=1,label='1m', step='month', stepmode='backward'),
-                dict(count=6,label='6m', step='month', stepmode='backward'),
-                dict(count=1,label='1y', step='year', stepmode='backward'),
-                dict(step='all')
-            ])
-        )
+        yaxis_title_font_size=18
     )
     # Remove side legend and colorbar
     fig.update(layout_showlegend=False)
@@ -90,11 +125,6 @@ def style_graph(fig):
     fig.update_traces(hovertemplate='Date: %{x} <br>%{y}<extra></extra> hours')
     return fig
 
-style_graph(fig_monthly) # Style the monthly averages graph
-
-style_graph(fig_daily) # Style the daily graph
-
-        
 # Create website structure
 app.layout = html.Div([
     html.Div( # Header containing website title
@@ -108,10 +138,18 @@ app.layout = html.Div([
         children=[
             html.H2('View how much time Sylvester spent outside:'),
             dcc.RadioItems(
-                ['Daily','Monthly Average'],
+                ['Daily','Weekly Average','Monthly Average'],
                 'Daily',
                 id='graph-select',
                 inline=True
+            ),
+            # Buttons for '1 month', '6 months', '1 year' and 'all' views. The range is queried on the
+            # server so only the data shown is sent to the browser.
+            dcc.RadioItems(
+                ['1m','6m','1y','All'],
+                'All',
+                id='range-select',
+                inline=True
             )
         ]
     ),
@@ -125,22 +163,34 @@ app.layout = html.Div([
     )
 ])
 
-# Callback function for the radio buttons.
-# When user selects 'Daily" or 'Monthly Average' button, calls update_graph() function.
+# Callback function for the radio buttons and for zooming or panning the graph.
+# When user selects a graph or range button, or zooms the graph, calls update_graph() function.
 @app.callback(
     Output('cat-graph', 'figure'),
-    Input('graph-select','value')
+    Input('graph-select','value'),
+    Input('range-select','value'),
+    Input('cat-graph','relayoutData')
 )
 
-# Create graph with data selected by user through parameter graph_select. 
+# Create graph with data selected by user through parameters graph_select and range_select, or by zooming.
 # Parameters:
-#     -graph-select - the radio button selected by user
-def update_graph(graph_select):
+#     -graph_select - the graph radio button selected by user
+#     -range_select - the range radio button selected by user
+#     -relayout - the graph's relayoutData, set when the user zooms or pans the graph
+def update_graph(graph_select, range_select, relayout):
     
-    if graph_select == 'Daily':
-        return fig_daily
-    else:
-        return fig_monthly
+    # A zoom only applies until the user selects a button again
+    if ctx.triggered_id != 'cat-graph':
+        relayout = None
+    with figures_lock:
+        cache.refresh() # Pick up any new data in aggregate_data.txt
+        start, end = get_range(range_select, relayout)
+        if graph_select == 'Daily':
+            return get_figure('daily', start, end)
+        elif graph_select == 'Weekly Average':
+            return get_figure('weekly', start, end)
+        else:
+            return get_figure('monthly', start, end)
 
 
 if __name__ == '__main__':
@@ -5,6 +5,13 @@
 # Date: Oct 10 2022
 # Author: Vanessa Pesch
 
+# Do nothing if the supervisor is already running, ex. when this script is run again by hand after it
+# was started at boot, so that two supervisors never share the radar, the camera and the logs
+if pgrep -f supervisor.py > /dev/null; then
+    echo "Supervisor already running"
+    exit 1
+fi
+
 # Activate virtual environment.
 # In this case, the name of the virtual environment is myyolo
 source myyolo/bin/activate
@@ -12,6 +19,9 @@ source myyolo/bin/activate
 # Navigate to virtual environment directory.
 cd myyolo
 
-# Start run_mqtt and run_radar as background processes.
-python3 /home/pi/myyolo/run_radar.py &
-python3 /home/pi/myyolo/run_mqtt.py &
\ No newline at end of file
+# Start the supervisor as a background process. It runs the radar, the MQTT listener and the detector
+# in one process, see supervisor.py. The detector loads the model once and is armed when the radar
+# detects movement. With --duty-cycle, how hard the detector looks follows when the cat is usually active
+# (see yolov5/duty_cycle.py), so the supervisor can run all the time, started once at boot, rather than
+# being started and stopped by cron.
+libcamerify python3 /home/pi/myyolo/supervisor.py --detector --weights /home/pi/myyolo/yolov5/best.pt --source 0 --conf-thres 0.8 --motion-gate --track --pipeline --duty-cycle &
\ No newline at end of file
@@ -1,6 +1,7 @@
 #!/bin/bash
 
-# Description: Shut down the run_mqtt and run_radar background processes.
+# Description: Shut down the supervisor, and the detector_service, run_mqtt and run_radar background
+#   processes if they were started separately. The supervisor finishes its queued events before exiting.
 # Date: Oct 10 2022
 # Author: Vanessa Pesch
 #
@@ -9,8 +10,10 @@
 # Date: Jan 19 2018
 # URL: https://raspberrypi.stackexchange.com/a/78015
 
+pgrep -f supervisor.py | xargs kill
 pgrep -f run_mqtt | xargs kill
 pgrep -f run_radar | xargs kill
+pgrep -f detector_service | xargs kill
 
 # Return to home directory
 cd
@@ -0,0 +1,180 @@
+# Description: Run the whole cat door system as a single process, in place of starting run_radar.py,
+#  run_mqtt.py and detector_service.py separately. Everything that happens goes through one event bus
+#  (see yolov5/event_bus.py):
+#     -producers: radar movement, IN/OUT messages from the ESP32-S2 touch pins over MQTT, and the cat
+#        detections from the detector (when run with --detector)
+#     -consumers: arming the detector on movement, logging and aggregation, and Telegram notifications
+#  SIGTERM or Ctrl-C stops the producers, lets the consumers finish the queued events and prints the
+#  counters and per-stage latencies of the bus. Any arguments not listed in parse_opt() are passed to the
+#  detector, which takes the same arguments as yolov5/detect.py. The maintenance job of yolov5/retention.py
+#  archives the logs and bounds the images in the background every --retention-interval hours. For example:
+#     libcamerify python3 supervisor.py --detector --weights yolov5/best.pt --source 0 --conf-thres 0.8
+# Date: Oct 17 2026
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+
+import paho.mqtt.client as mqtt
+# Add the yolov5 directory to the path so that its modules can import their sibling modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/yolov5')
+# Import the event bus from event_bus.py
+from event_bus import Event, EventBus
+# Import metrics.py to serve the metrics of every part of the system
+import metrics
+# Import the detection handlers from cat_detection.py
+import cat_detection
+# Import the radar and its GPIO backend from radar.py
+from radar import GpioPin, Radar
+# Import arm() from detector_client.py to arm a detector service running in another process
+from detector_client import arm
+# Import the maintenance job from retention.py
+from retention import Retention
+# Import the MQTT handlers from run_mqtt.py
+from run_mqtt import on_connect, record_location, notify_location
+
+# Publishes the IN/OUT messages received from the broker on the bus. Parameters:
+#      -bus - the EventBus
+def mqtt_producer(bus):
+    # Callback function when message received from broker. Parameters:
+    #     -client - the client instance
+    #     -userdata - users' information, typically empty
+    #     -msg - the message received from the broker
+    def on_message(client, userdata, msg):
+        location = str(msg.payload).strip('b\'\"') # Get the location contained in the msg variable
+        print("Message received: "+ location)
+        if location == "IN" or location == "OUT":
+            bus.publish(Event('location', 'button', location=location))
+    return on_message
+
+# Publishes radar movement on the bus. Returns the Radar, or None if it cannot be opened, ex. when not
+# running on the Raspberry Pi. Parameters:
+#      -bus - the EventBus
+#      -cooldown - seconds to ignore the radar after a trigger, see radar.py
+def start_radar(bus, cooldown):
+    radar = Radar(GpioPin(17), lambda: bus.publish(Event('radar', 'radar')), cooldown=cooldown)
+    try:
+        radar.start()
+    except Exception as e:
+        print('Radar not available: '+repr(e))
+        radar.close()
+        return None
+    return radar
+
+# Load the detector in this process and serve it from a background thread, sending its detections to the
+# bus instead of handling them in cat_detection.py. Returns the DetectorService. Parameters:
+#      -bus - the EventBus
+#      -args - the detect.py arguments
+def start_detector(bus, args):
+    from detect import parse_opt # Imported here as the detector needs PyTorch, which only it uses
+    from detector_service import DetectorService
+    service = DetectorService(parse_opt(args))
+    cat_detection.event_sink = lambda timestamp, location, frame, log_interval: bus.publish(
+        Event('detection', 'camera', timestamp, location=location, frame=frame, log_interval=log_interval))
+    threading.Thread(target=service.serve, name='detector', daemon=True).start()
+    return service
+
+# Returns the consumer that arms the detector when the radar detects movement. Parameters:
+#      -service - the DetectorService in this process, or None to arm the detector service by its socket
+def arm_handler(service):
+    def arm_detector(event):
+        if service is not None:
+            print('Detector: '+service.handle_command(['ARM', str(event.created)]))
+            return
+        try:
+            print('Detector service: '+arm())
+        except OSError:
+            print('Detector service not running')
+    return arm_detector
+
+# Consumer that adds the event to the event store and updates the aggregate log
+def log_handler(event):
+    if event.kind == 'location':
+        record_location(event.timestamp, event.data['location'])
+    else:
+        cat_detection.log_detection(event.timestamp, event.data['location'], event.data['log_interval'])
+
+# Consumer that notifies the user on Telegram
+def notify_handler(event):
+    if event.kind == 'location':
+        notify_location(event.timestamp, event.data['location'])
+    else:
+        cat_detection.report_detection(event.timestamp, event.data['location'], event.data['frame'])
+
+# Run the producers and consumers until SIGTERM or SIGINT. Parameters:
+#      -opt - the parsed supervisor arguments
+#      -detector_args - the arguments passed to the detector
+async def supervise(opt, detector_args):
+    bus = EventBus()
+    service = start_detector(bus, detector_args) if opt.detector else None
+    bus.subscribe(('radar',), 'arm', arm_handler(service), maxsize=10, retries=0)
+    # The logging queue is larger since dropping a log entry loses data, see run_mqtt.py. The log handlers
+    # retry each of their steps on their own, so the event is not retried as a whole
+    bus.subscribe(('location', 'detection'), 'log', log_handler, maxsize=1000, retries=0)
+    bus.subscribe(('location', 'detection'), 'notify', notify_handler, maxsize=20, retries=3, retry_delay=2.0)
+    bus.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    client = None
+    if opt.host:
+        client = mqtt.Client(client_id="paho-pi")
+        client.on_connect = on_connect
+        client.on_message = mqtt_producer(bus)
+        client.connect_async(opt.host, opt.port, 60)
+        client.loop_start() # Runs the MQTT network loop in its own thread
+    radar = start_radar(bus, opt.radar_cooldown) if opt.radar else None
+    retention = None
+    if opt.retention_interval:
+        retention = Retention(interval=opt.retention_interval*3600)
+        retention.start()
+
+    # Print the bus counters every stats_interval seconds until stopped
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), opt.stats_interval or None)
+        except asyncio.TimeoutError:
+            print(json.dumps(bus.get_stats()))
+
+    # Stop the producers first, so that no new events arrive while the queues are emptied
+    print('Stopping')
+    if radar is not None:
+        radar.close(timeout=5)
+        print(json.dumps({'radar': radar.get_stats()}))
+    if client is not None:
+        client.loop_stop()
+        client.disconnect()
+    if service is not None:
+        service.handle_command(['DISARM'])
+    if retention is not None:
+        retention.close(timeout=5)
+        print(json.dumps({'retention': retention.get_stats()}))
+    if not await loop.run_in_executor(None, bus.stop, opt.drain_timeout):
+        print('Queued events were not all handled before the timeout')
+    print(json.dumps(bus.get_stats()))
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='broker.emqx.io', help='MQTT broker host, empty to not use MQTT')
+    parser.add_argument('--port', type=int, default=1883, help='MQTT broker port')
+    parser.add_argument('--no-radar', dest='radar', action='store_false', help='do not use the radar')
+    parser.add_argument('--radar-cooldown', type=float, default=30.0, help='seconds to ignore the radar after a trigger')
+    parser.add_argument('--detector', action='store_true', help='run the detector in this process')
+    parser.add_argument('--stats-interval', type=float, default=0, help='seconds between printing bus counters, 0 for never')
+    parser.add_argument('--drain-timeout', type=float, default=10.0, help='seconds to wait for queued events on exit')
+    parser.add_argument('--retention-interval', type=float, default=6.0, help='hours between runs of the log and image maintenance, 0 for never')
+    metrics.add_arguments(parser)
+    return parser.parse_known_args()
+
+
+if __name__ == '__main__':
+    opt, detector_args = parse_opt()
+    metrics.enable_from(opt)
+    asyncio.run(supervise(opt, detector_args))
@@ -0,0 +1,230 @@
+# Description: Loads aggregate_data.txt for the web application. The file holds a date in the first column
+#  and one or many subsequent columns containing numbers (that represent time spent outside), of which
+#  the last column is the day's total.
+#     -parse_aggregates() - parse lines of the file in one vectorized pass
+#     -parse_totals() - parse lines of the file with the standard library, for push_repo.py
+#     -write_snapshot(), read_snapshot() - save and load the daily totals as a binary snapshot, written by
+#        push_repo.py next to aggregate_data.txt, so that the web application can load them without parsing
+#     -AggregateCache - keep the parsed data and its weekly and monthly rollups in memory, only parse what
+#        changed when the file changes, and return the rows within a date range
+#  pandas is only imported when the file is first parsed, so that importing this module, and the web
+#  application with it, stays fast. parse_totals() and write_snapshot() only use the standard library, so
+#  push_repo.py runs with the system Python, without pandas or NumPy.
+# Date: Oct 17 2026
+
+import array
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from datetime import date
+
+# Number of bytes just before the parsed offset that are hashed to tell whether the file was rewritten
+check_block_size = 4096
+
+# A line of aggregate_data.txt, capturing its date and its last column, the day's total
+line_pattern = r'^(\d{8}),(?:.*,)?(\d+)$'
+
+# Return the pandas module, importing it on first use
+def load_pandas():
+    import pandas
+    return pandas
+
+# Parse lines of aggregate_data.txt into a dataframe indexed by date, with the minutes spent outside in the
+# 'results' column. Empty lines are skipped. Parameters:
+#      -text - the lines to parse
+def parse_aggregates(text):
+    pd = load_pandas()
+    lines = pd.Series(text.split('\n'), dtype=object)
+    # Take the first and last columns of every line at once, rather than splitting line by line
+    parts = lines.str.strip().str.extract(line_pattern).dropna()
+    df = pd.DataFrame({'results': pd.to_numeric(parts[1]).values},
+                      index=pd.to_datetime(parts[0], format='%Y%m%d').values)
+    return df
+
+# Parse lines of aggregate_data.txt into a list of (date, minutes) tuples sorted by date, with the date in
+# the form of YYYYMMDD. Empty lines are skipped. Parameters:
+#      -text - the lines to parse
+def parse_totals(text):
+    pattern = re.compile(line_pattern)
+    matches = [pattern.match(line.strip()) for line in text.split('\n')]
+    return sorted(((m.group(1), int(m.group(2))) for m in matches if m), key=lambda total: total[0])
+
+# Write the daily totals to a snapshot file, a NumPy .npy file holding an int32 array with two rows: the
+# days since 1970-01-01 and the minutes spent outside on each. The file is written in the .npy format
+# (version 1.0) directly, so that NumPy is not needed to write it. It is written to a temporary file first
+# and renamed, so a reader never sees part of it. Parameters:
+#      -totals - the daily totals, as returned by parse_totals()
+#      -path - location of the snapshot
+def write_snapshot(totals, path):
+    epoch = date(1970, 1, 1).toordinal()
+    columns = array.array('i', [date(int(d[0:4]), int(d[4:6]), int(d[6:8])).toordinal()-epoch for d, _ in totals] +
+                               [minutes for _, minutes in totals])
+    if sys.byteorder != 'little':
+        columns.byteswap()
+    header = "{'descr': '<i4', 'fortran_order': False, 'shape': (2, %d), }" % len(totals)
+    # The header is padded with spaces and ends with a newline, so that the data starts at a multiple of 64 bytes
+    header += ' '*(-(len(header)+11) % 64)+'\n'
+    with open(path+'.tmp', 'wb') as f:
+        f.write(b'\x93NUMPY\x01\x00'+struct.pack('<H', len(header))+header.encode('latin1')+columns.tobytes())
+    os.replace(path+'.tmp', path)
+
+# Return the daily totals of a snapshot file, in the same form as parse_aggregates(). Parameters:
+#      -path - location of the snapshot
+def read_snapshot(path):
+    import numpy as np
+    pd = load_pandas()
+    columns = np.load(path)
+    return pd.DataFrame({'results': columns[1].astype(np.int64)},
+                        index=pd.to_datetime(columns[0].astype(np.int64), unit='D'))
+
+# Cache of the parsed aggregate_data.txt. refresh() checks the file's modification time and size, and when
+# the file has changed only parses the part that changed. Lines are only ever appended to the file, except
+# for the last line (the current day's total, see yolov5/aggregates.py), which is rewritten as the day goes
+# on. The last two lines are treated as still changing so a repaired line is also picked up, and the byte
+# offset of where they start is kept so the next refresh seeks there and only reads and parses from there.
+# If the file is replaced (a new inode, ex. after a git pull), is now shorter than that offset, or the
+# check_block_size bytes just before the offset changed, for example when the aggregates are rebuilt, the
+# whole file is parsed again. Nothing is parsed until the first refresh. When there is a snapshot (see
+# write_snapshot()) of the file as it is now, it is loaded instead of parsing the file. The summary written
+# with the snapshot by push_repo.py holds the size and hash of the file it was made from, which are compared
+# with the file, since the modification times of files checked out by git say nothing about which is newer.
+# Parameters:
+#      -path - location of aggregate_data.txt
+#      -snapshot - location of the snapshot of aggregate_data.txt, or None to always parse the file
+#      -summary - location of the summary of the snapshot
+class AggregateCache:
+    def __init__(self, path, snapshot=None, summary=None):
+        self.path = path
+        self.snapshot = snapshot
+        self.summary = summary
+        self.source_hash = (None, None) # Signature of the file and the hash of its contents
+        self.signature = None # Path, modification time and size of the file when it was last parsed
+        self.version = 0 # Incremented every time the data changes
+        self.offset = 0
+        self.settled = None # Set by reset() on the first refresh
+        self.inode = None # Inode of the file when it was last parsed
+        self.block_hash = None # Hash of the block of bytes just before the offset
+
+    # Forget everything parsed so far
+    def reset(self):
+        self.offset = 0 # Byte offset of the part of the file that may still change
+        self.block_hash = hashlib.sha256(b'').hexdigest()
+        self.settled = parse_aggregates('') # Lines before the offset, which no longer change
+        self.update_rollups(self.settled)
+
+    # Store the daily totals and precompute the weekly and monthly averages. Parameters:
+    #      -df - the daily totals
+    def update_rollups(self, df):
+        df = df.sort_index()
+        self.rollups = {
+            'daily': df,
+            'weekly': df.resample('W').mean().dropna(),
+            'monthly': df.resample('M').mean().dropna(),
+        }
+
+    # Return the hash of the check_block_size bytes just before the offset. Parameters:
+    #      -f - aggregate_data.txt, opened in binary mode
+    def hash_before_offset(self, f):
+        start = max(self.offset - check_block_size, 0)
+        f.seek(start)
+        return hashlib.sha256(f.read(self.offset - start)).hexdigest()
+
+    # Return the SHA-256 hash of aggregate_data.txt, only reading the file again when it has changed
+    def file_hash(self):
+        st = os.stat(self.path)
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self.source_hash[0] != signature:
+            with open(self.path, 'rb') as f:
+                self.source_hash = (signature, hashlib.sha256(f.read()).hexdigest())
+        return self.source_hash[1]
+
+    # Return True if there is a snapshot of aggregate_data.txt as it is now, or a snapshot and no file
+    def snapshot_current(self):
+        if self.snapshot is None or not os.path.exists(self.snapshot):
+            return False
+        if not os.path.exists(self.path):
+            return True
+        try:
+            with open(self.summary) as f:
+                summary = json.load(f)
+        except (TypeError, OSError, ValueError): # No summary to tell which file the snapshot was made from
+            return False
+        # A file of another size is not the one the snapshot was made from, so it is not hashed
+        if summary.get('source_bytes', os.path.getsize(self.path)) != os.path.getsize(self.path):
+            return False
+        return summary.get('source_sha256') == self.file_hash()
+
+    # Load the snapshot if it changed since the last call. Returns True if the data changed.
+    def refresh_snapshot(self):
+        st = os.stat(self.snapshot)
+        signature = (self.snapshot, st.st_mtime_ns, st.st_size)
+        if signature == self.signature:
+            return False
+        self.update_rollups(read_snapshot(self.snapshot))
+        self.settled = None # Parse the whole file if it is used again
+        self.signature = signature
+        self.version += 1
+        return True
+
+    # Load the snapshot or parse the file if it changed since the last call. Returns True if the data changed.
+    def refresh(self):
+        if self.snapshot_current():
+            return self.refresh_snapshot()
+        st = os.stat(self.path)
+        signature = (self.path, st.st_mtime_ns, st.st_size)
+        if signature == self.signature:
+            return False
+        pd = load_pandas()
+        with open(self.path, 'rb') as f:
+            # First refresh, or the file was replaced, shortened or rewritten just before the offset
+            if (self.settled is None or st.st_ino != self.inode or st.st_size < self.offset or
+                    self.hash_before_offset(f) != self.block_hash):
+                self.reset()
+            self.inode = st.st_ino
+
+            f.seek(self.offset)
+            data = f.read()
+            # Split off the last two lines, which may still be rewritten
+            cut = data.rfind(b'\n', 0, max(data.rfind(b'\n'), 0))
+            if cut > 0:
+                self.settled = pd.concat([self.settled, parse_aggregates(data[:cut].decode())])
+                self.offset += cut
+                self.block_hash = self.hash_before_offset(f)
+                data = data[cut:]
+        self.update_rollups(pd.concat([self.settled, parse_aggregates(data.decode())]))
+
+        self.signature = signature
+        self.version += 1
+        return True
+
+    # Return the daily totals, one row per day
+    def daily(self):
+        return self.rollups['daily']
+
+    # Return the average of the daily totals for each month
+    def monthly(self):
+        return self.rollups['monthly']
+
+    # Return the first and last dates of the last few months of the daily totals, or None and None if there
+    # are no daily totals. Parameters:
+    #      -months - number of months
+    def last_months(self, months):
+        if not len(self.daily()):
+            return None, None
+        end = self.daily().index[-1]
+        return end - load_pandas().DateOffset(months=months), end
+
+    # Return the rows of a rollup between two dates, inclusive. Parameters:
+    #      -granularity - one of daily, weekly or monthly
+    #      -start - first date to include, or None to start from the first row
+    #      -end - last date to include, or None to end at the last row
+    def window(self, granularity, start=None, end=None):
+        return self.rollups[granularity].loc[start:end]
+
+# Return the day of a date and time sent by the browser, ex. the end of a zoomed range. Parameters:
+#      -text - the date and time, ex. 2022-08-14 06:30:00.123
+def to_day(text):
+    return load_pandas().Timestamp(text).normalize()
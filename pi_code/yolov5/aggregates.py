@@ -0,0 +1,174 @@
+# Description: Maintains aggregate_data.txt, the total number of minutes the cat spent outside per day,
+#   which is pushed to the repository and plotted by run_webapp.py. Each line is in the form of
+#   YYYYMMDD,minutes, with lines separated by a newline at the start of each new line.
+#     -add_minutes() - add minutes to the current day's total
+#     -rebuild() - recalculate the daily totals from the events in the event store
+#   The current day's total, and the byte offset where its line starts, are kept in a small sidecar file
+#   (aggregate_state.json), so an update only rewrites the last line instead of rereading the whole file.
+#   The sidecar is replaced atomically before the line is rewritten, so if the Pi loses power part way
+#   through an update, the next update rewrites the line from the sidecar instead of leaving half a line.
+#   Rebuild the totals from the event store by running: python3 yolov5/aggregates.py --rebuild
+# Date: Oct 17 2026
+
+import argparse
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+from event_store import get_store, to_epoch, to_timestamp
+
+cwd = os.getcwd() # Current working directory
+
+aggr_path = cwd+'/data/logs/aggregate_data.txt' # Daily totals
+state_path = cwd+'/data/logs/aggregate_state.json' # Current day's total and the offset of its line
+lock_path = cwd+'/data/logs/aggregate_data.lock' # Lock shared by the processes that update the totals
+
+# Hold an exclusive lock on the aggregate files, as both the detector and run_mqtt.py update them
+@contextmanager
+def locked():
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# Write a file by writing a temporary file and renaming it over the original, so that the file holds
+# either its old or its new contents even if power is lost. Parameters:
+#      -path - the file to write
+#      -content - the text to write
+def write_atomic(path, content):
+    tmp_path = path+'.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # Sync the directory so that the rename itself is saved
+    fd = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Return the line for a day's total, including the newline that separates it from the previous line.
+# Parameters:
+#      -state - dict with the date, total and offset of the line
+def format_entry(state):
+    return ('\n' if state['offset'] > 0 else '')+state['date']+','+str(state['total'])
+
+# Create the state from the last line of aggregate_data.txt, reading only the end of the file. Used when
+# there is no sidecar yet. For lines holding several running totals, the last one is the day's total.
+def state_from_file(block_size=256):
+    if not os.path.exists(aggr_path) or os.path.getsize(aggr_path) == 0:
+        return {'date': None, 'total': 0, 'offset': 0}
+    with open(aggr_path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        data = b''
+        # Read blocks from the end until the newline before the last line is found, or the start is reached
+        while pos > 0 and data.rstrip(b'\n').count(b'\n') == 0:
+            pos = max(0, pos - block_size)
+            f.seek(pos)
+            data = f.read(end - pos)
+    data = data.rstrip(b'\n')
+    newline = data.rfind(b'\n')
+    line = data[newline+1:].decode()
+    return {'date': line.split(',')[0], 'total': int(line.split(',')[-1]),
+            'offset': pos + newline if newline >= 0 else 0}
+
+# Return the current day's state from the sidecar, or from aggregate_data.txt if there is no sidecar
+def read_state():
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return state_from_file()
+
+# Replace the end of aggregate_data.txt from an offset onwards, and sync it to disk. An offset past the end
+# of the file, ex. from a sidecar left by a crash, is taken as the end of the file, as truncating to it
+# would pad the file with NUL bytes. Parameters:
+#      -offset - byte offset to truncate the file at
+#      -content - the text to write after the offset
+def rewrite_tail(offset, content):
+    with open(aggr_path, 'a') as f: # Create the file if it does not exist; writes go to the end
+        f.truncate(min(offset, os.path.getsize(aggr_path)))
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+# Add minutes spent outside to the day's total in aggregate_data.txt. Returns the new total for the day.
+# Parameters:
+#   -timestamp - current time and should be in the form of YYYYMMDD-HHMMSS
+#   -minutes - number of minutes to add
+def add_minutes(timestamp, minutes):
+    date = timestamp[0:8] # Get current date, which is the first 8 characters of timestamp
+    with locked():
+        state = read_state()
+        start = state['offset'] # Everything from here on is rewritten
+        if state['date'] == date: # Same day, so add to its total
+            state['total'] += int(minutes)
+            content = format_entry(state)
+        else: # New day. Also rewrite the previous day's line in case it was only partly written.
+            content = format_entry(state) if state['date'] else ''
+            state = {'date': date, 'total': int(minutes), 'offset': start+len(content.encode())}
+            content += format_entry(state)
+        write_atomic(state_path, json.dumps(state))
+        rewrite_tail(start, content)
+    return state['total']
+
+# Calculate the minutes spent outside per day from a list of events, by adding up the time between
+# each OUT event and the IN event that follows it. Minutes are counted on the day the cat came back in.
+# Gaps longer than max_minutes are skipped, as they mean the system was not running rather than a trip
+# outside. Returns a dict of date (YYYYMMDD) to minutes. Parameters:
+#      -events - list of (ts, label, location, source) tuples sorted by time, as returned by EventStore.query()
+#      -max_minutes - longest time between an OUT and IN event that is counted
+def daily_totals(events, max_minutes=720):
+    totals = {}
+    prev = None
+    for event in events:
+        if (event[2] == 'IN' and prev is not None and prev[2] == 'OUT' and
+                event[0] - prev[0] <= max_minutes*60):
+            date = to_timestamp(event[0])[0:8]
+            totals[date] = totals.get(date, 0) + round((event[0] - prev[0])/60)
+        prev = event
+    return totals
+
+# Recalculate aggregate_data.txt from the events in the event store. Lines for days before start_date are
+# kept as they are, since the event store may not go back as far as the aggregates. Returns the number
+# of days recalculated. Parameters:
+#      -start_date - first day (YYYYMMDD) to recalculate, or None to start from the first event in the store
+def rebuild(start_date=None):
+    store = get_store()
+    if start_date is None:
+        first = store.query()[:1]
+        if not first:
+            return 0
+        start_date = to_timestamp(first[0][0])[0:8]
+    totals = daily_totals(store.query(to_epoch(start_date+'-000000')))
+
+    with locked():
+        kept = []
+        if os.path.exists(aggr_path):
+            with open(aggr_path) as f:
+                kept = [line for line in f.read().splitlines() if line and line.split(',')[0] < start_date]
+        lines = kept+[date+','+str(total) for date, total in sorted(totals.items())]
+        content = '\n'.join(lines)
+        # The last line's offset is where the newline before it starts
+        last_offset = len(content.encode()) - len(lines[-1].encode()) - 1 if len(lines) > 1 else 0
+        state = {'date': lines[-1].split(',')[0], 'total': int(lines[-1].split(',')[-1]),
+                 'offset': last_offset} if lines else {'date': None, 'total': 0, 'offset': 0}
+        write_atomic(aggr_path, content)
+        write_atomic(state_path, json.dumps(state))
+    return len(totals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rebuild', action='store_true', help='recalculate the totals from the event store')
+    parser.add_argument('--start', default=None, help='first day to recalculate, YYYYMMDD')
+    opt = parser.parse_args()
+    if opt.rebuild:
+        print('Recalculated '+str(rebuild(opt.start))+' days')
+    print('Current day: '+json.dumps(read_state()))
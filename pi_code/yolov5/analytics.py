@@ -0,0 +1,175 @@
+# Description: Time outside calculated from the raw IN/OUT events, with NumPy over whole arrays rather than
+#   with running totals updated event by event:
+#     -read_logs() - load the monthly YYYYMM_log.txt text logs, including the archived months (log_archive.py)
+#     -read_store() - load the events from the event store (which also holds the imported text logs)
+#     -find_trips() - pair each OUT event with the IN event that follows it
+#     -outside_per_hour() - seconds spent outside in every hour, splitting trips at hour, and so midnight
+#        and month, boundaries
+#     -analyze() - per-day totals, per-hour-of-day averages and departures, and the distribution of trip
+#        lengths, in one pass
+#   Times are kept as int64 seconds since 1970-01-01 in local time, so that a day or an hour of the day is
+#   simply a whole division of the time. Gaps between an OUT and the next IN longer than max_minutes are
+#   not counted as trips, as they mean the system was not running, like in aggregates.py. Print the
+#   analytics as JSON by running: python3 yolov5/analytics.py [--logs]
+# Date: Oct 17 2026
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from log_archive import read_log_lines
+
+cwd = os.getcwd() # Current working directory
+
+# Upper bounds of the trip length bins, in minutes. The last bin holds the longer trips.
+trip_bins = (5, 15, 30, 60, 120, 240, 480, 720)
+
+# Return the number in a range of columns of a digit array as an int64 array. Parameters:
+#      -digits - 2D array of digit values, one row per timestamp
+#      -start, end - the columns of the number
+def number(digits, start, end):
+    return digits[:, start:end] @ (10**np.arange(end-start-1, -1, -1))
+
+# Convert timestamps in the form of YYYYMMDD-HHMMSS to local seconds since the epoch, all at once.
+# Returns the seconds and a mask of the timestamps that were well formed. Parameters:
+#      -timestamps - list of the timestamps
+def parse_timestamps(timestamps):
+    if not timestamps:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    digits = np.frombuffer(''.join(t[:15].ljust(15) for t in timestamps).encode('ascii', 'replace'),
+                           dtype=np.uint8).reshape(-1, 15).astype(np.int64)-ord('0')
+    valid = (np.delete(digits, 8, axis=1) <= 9).all(axis=1) & (np.delete(digits, 8, axis=1) >= 0).all(axis=1)
+    valid &= digits[:, 8] == ord('-')-ord('0')
+    digits = np.where(valid[:, None], digits, 0)
+    month = np.clip(number(digits, 4, 6), 1, 12)
+    day = np.clip(number(digits, 6, 8), 1, 31)
+    dates = ((number(digits, 0, 4)-1970).astype('datetime64[Y]')+(month-1).astype('timedelta64[M]')
+             ).astype('datetime64[D]')+(day-1).astype('timedelta64[D]')
+    seconds = dates.astype(np.int64)*86400+number(digits, 9, 11)*3600+number(digits, 11, 13)*60+number(digits, 13, 15)
+    return seconds, valid
+
+# Return the times of the events, sorted, and whether each event is an OUT event. Parameters:
+#      -times - local seconds since the epoch
+#      -is_out - True for OUT events and False for IN events
+def sorted_events(times, is_out):
+    order = np.argsort(times, kind='stable')
+    return times[order], is_out[order]
+
+# Load the events of the monthly text logs, in the form of YYYYMMDD-HHMMSS-label-location. Returns the
+# local times of the events in seconds since the epoch, sorted, and whether each is an OUT event.
+# Parameters:
+#      -log_directory - directory containing the text logs
+def read_logs(log_directory=cwd+'/data/logs/'):
+    lines = [line.strip() for line in read_log_lines(log_directory)]
+    lines = [line for line in lines if line.endswith(('-IN', '-OUT'))]
+    times, valid = parse_timestamps(lines)
+    is_out = np.array([line.endswith('OUT') for line in lines], dtype=bool)
+    return sorted_events(times[valid], is_out[valid])
+
+# Load the events of the event store. Returns the same as read_logs(). Parameters:
+#      -store - the EventStore, or None for the store shared by the process
+#      -start, end - seconds since the epoch of the events to load, see EventStore.query()
+def read_store(store=None, start=None, end=None):
+    if store is None:
+        from event_store import get_store
+        store = get_store()
+    rows = store.query(start, end)
+    epochs = np.array([row[0] for row in rows], dtype=np.int64)
+    is_out = np.array([row[2] == 'OUT' for row in rows], dtype=bool)
+    # Shift each event by the UTC offset of its hour, looked up once per distinct hour, so that summer
+    # time is taken into account
+    hours, inverse = np.unique(epochs//3600, return_inverse=True)
+    offsets = np.array([time.localtime(int(hour)*3600).tm_gmtoff for hour in hours], dtype=np.int64)
+    return sorted_events(epochs+offsets[inverse].reshape(-1), is_out)
+
+# Pair each OUT event with the IN event straight after it. Repeated OUT events count from the last one,
+# and repeated IN events are ignored. Returns the start and end times of the trips. Parameters:
+#      -times, is_out - the sorted events, as returned by read_logs() or read_store()
+#      -max_minutes - longest time between an OUT and IN event that is counted as a trip
+def find_trips(times, is_out, max_minutes=720):
+    pairs = np.flatnonzero(is_out[:-1] & ~is_out[1:])
+    start, end = times[pairs], times[pairs+1]
+    keep = end-start <= max_minutes*60
+    return start[keep], end[keep]
+
+# Return the seconds spent outside in every hour from the first trip to the last. Trips are split at
+# every hour they cross: the first and last hours get their part of the trip, and the hours fully
+# covered are added with a running sum. Returns the index of the first hour (local hours since the
+# epoch) and the seconds of each hour. Parameters:
+#      -start, end - the start and end times of the trips
+def outside_per_hour(start, end):
+    if not len(start):
+        return 0, np.zeros(0)
+    first, last = start//3600, end//3600
+    base = first.min()
+    n = int(last.max()-base+1)
+    same = first == last
+    seconds = np.zeros(n)
+    seconds += np.bincount(first[same]-base, weights=end[same]-start[same], minlength=n)
+    crossing = ~same
+    first, last, start, end = first[crossing], last[crossing], start[crossing], end[crossing]
+    seconds += np.bincount(first-base, weights=(first+1)*3600-start, minlength=n)
+    seconds += np.bincount(last-base, weights=end-last*3600, minlength=n)
+    covered = np.bincount(first+1-base, minlength=n+1)-np.bincount(last-base, minlength=n+1)
+    seconds += np.cumsum(covered)[:n]*3600
+    return int(base), seconds
+
+# Calculate the analytics of the events. Returns a dict of:
+#      -days - the dates (datetime64[D]) from the first trip to the last, and minutes outside on each
+#      -hour_of_day - average minutes outside in each hour of the day, and trips started in each hour
+#      -trips - number of trips, their mean and percentile lengths in minutes, and counts per trip_bins
+# Parameters:
+#      -times, is_out - the sorted events, as returned by read_logs() or read_store()
+#      -max_minutes - longest time between an OUT and IN event that is counted as a trip
+def analyze(times, is_out, max_minutes=720):
+    start, end = find_trips(times, is_out, max_minutes)
+    base, seconds = outside_per_hour(start, end)
+    # Line the hours up with whole days, so that they can be summed per day and per hour of the day
+    pad = base % 24
+    seconds = np.concatenate([np.zeros(pad), seconds, np.zeros(-(pad+len(seconds)) % 24)]).reshape(-1, 24)
+    first_day = (base-pad)//24
+    lengths = (end-start)/60
+    return {
+        'days': {
+            'dates': np.arange(first_day, first_day+len(seconds)).astype('datetime64[D]'),
+            'minutes': seconds.sum(axis=1)/60,
+        },
+        'hour_of_day': {
+            'minutes': seconds.mean(axis=0)/60 if len(seconds) else np.zeros(24),
+            'departures': np.bincount((start//3600) % 24, minlength=24),
+        },
+        'trips': {
+            'count': len(lengths),
+            'mean_minutes': float(lengths.mean()) if len(lengths) else None,
+            'percentiles': {f'p{q}': float(np.percentile(lengths, q)) if len(lengths) else None for q in (50, 90, 99)},
+            'bins': dict(zip([f'<={b}' for b in trip_bins]+[f'>{trip_bins[-1]}'],
+                             np.bincount(np.searchsorted(trip_bins, lengths), minlength=len(trip_bins)+1).tolist())),
+        },
+    }
+
+# Return the analytics in a form that can be written as JSON. Parameters:
+#      -result - the dict returned by analyze()
+def to_json(result):
+    days = result['days']
+    return {
+        'days': {str(date).replace('-', ''): round(float(minutes), 1) for date, minutes in zip(days['dates'], days['minutes'])},
+        'hour_of_day': {'minutes': np.round(result['hour_of_day']['minutes'], 2).tolist(),
+                        'departures': result['hour_of_day']['departures'].tolist()},
+        'trips': result['trips'],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logs', action='store_true', help='read the monthly text logs instead of the event store')
+    parser.add_argument('--max-minutes', type=int, default=720, help='longest OUT to IN gap counted as a trip')
+    opt = parser.parse_args()
+    t = time.perf_counter()
+    times, is_out = read_logs() if opt.logs else read_store()
+    report = to_json(analyze(times, is_out, opt.max_minutes))
+    report['events'] = len(times)
+    report['seconds'] = round(time.perf_counter()-t, 3)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,246 @@
+# Description: Export the cat detection weights to the CPU-friendly backends supported by DetectMultiBackend,
+#   benchmark each one on a recorded clip from the door camera, and write a profile that detect.py and
+#   detector_service.py read at startup to pick the fastest backend. The backends tried are:
+#     -pytorch - the fp32 best.pt weights, used as the accuracy baseline
+#     -torchscript - TorchScript export of the weights
+#     -onnx - ONNX export run with ONNX Runtime
+#     -onnx_dnn - the same ONNX export run with OpenCV DNN
+#     -onnx_int8 - the ONNX export statically quantized to int8, calibrated on frames from the clip
+#   Accuracy is the F1 score of a backend's detections against the baseline's on the same frames, and a
+#   backend is only selected if its F1 score is within the tolerance of 1.0. Run on the Raspberry Pi, ex:
+#     python3 yolov5/backend_profile.py --weights yolov5/best.pt --clip data/clips/door.mp4 --conf-thres 0.8
+# Date: Oct 17 2026
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from models.common import DetectMultiBackend
+from utils.dataloaders import LoadImages
+from utils.general import LOGGER, box_iou, check_img_size, check_requirements, non_max_suppression
+from utils.torch_utils import select_device, time_sync
+
+cwd = os.getcwd()
+profile_path = cwd+'/data/backend_profile.json' # Profile read by the detector at startup
+tolerance = 0.02 # Largest drop in F1 score against the fp32 baseline for a backend to be selected
+
+# Return the frames of a clip, letterboxed to the inference size, as a list of uint8 arrays of shape
+# (3, height, width). Parameters:
+#      -clip - path of the video file or image directory
+#      -imgsz - inference size (height, width)
+#      -max_frames - most frames to read
+#      -every - only every n-th frame is used, so the frames cover more of the clip
+def load_frames(clip, imgsz, max_frames=200, every=5):
+    frames = []
+    # auto=False so every frame has the same shape, which exported models with a fixed input shape need
+    for i, (_, im, _, _, _) in enumerate(LoadImages(clip, img_size=imgsz, stride=32, auto=False)):
+        if i % every == 0:
+            frames.append(im)
+            if len(frames) >= max_frames:
+                break
+    if not frames:
+        raise ValueError('No frames read from '+str(clip))
+    return frames
+
+# Quantize an ONNX model to int8 with ONNX Runtime, using frames from the clip to calibrate the
+# activation ranges. Returns the path of the quantized model. Parameters:
+#      -onnx_path - path of the fp32 ONNX model
+#      -frames - calibration frames, see load_frames()
+def quantize_onnx(onnx_path, frames):
+    check_requirements(('onnxruntime',))
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    # Feeds the calibration frames to ONNX Runtime one at a time
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            im = next(self.frames, None)
+            return None if im is None else {input_name: (im[None] / 255).astype(np.float32)}
+
+    int8_path = Path(onnx_path).with_name(Path(onnx_path).stem+'-int8.onnx')
+    quantize_static(str(onnx_path), str(int8_path), FrameReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    return int8_path
+
+# Export the weights to every backend. Returns a dict of backend name to (weights path, use OpenCV DNN).
+# Parameters:
+#      -weights - path of the PyTorch weights
+#      -imgsz - inference size (height, width)
+#      -frames - calibration frames for the int8 model, see load_frames()
+def export_backends(weights, imgsz, frames):
+    import export # YOLOv5 export.py, imported here so that detect.py does not load it with select_backend()
+    weights = Path(weights)
+    # Export with dynamic axes so the ONNX model takes batches of any size, ex. the crops from roi.py
+    export.run(weights=weights, imgsz=imgsz, include=('torchscript',), device='cpu')
+    export.run(weights=weights, imgsz=imgsz, include=('onnx',), device='cpu', dynamic=True, simplify=True)
+    onnx_path = weights.with_suffix('.onnx')
+    backends = {
+        'pytorch': (weights, False),
+        'torchscript': (weights.with_suffix('.torchscript'), False),
+        'onnx': (onnx_path, False),
+        'onnx_dnn': (onnx_path, True),
+    }
+    try:
+        backends['onnx_int8'] = (quantize_onnx(onnx_path, frames), False)
+    except Exception as e: # Quantization is optional, the other backends can still be compared
+        LOGGER.warning(f'int8 quantization failed: {e}')
+    return backends
+
+# Run a model over the frames. Returns the detections per frame and the time per frame in ms, including
+# preprocessing and NMS like detect.py. Parameters:
+#      -model - the loaded DetectMultiBackend model
+#      -frames - see load_frames()
+#      -conf_thres, iou_thres - see non_max_suppression()
+def run_frames(model, frames, conf_thres, iou_thres):
+    dets, times = [], []
+    for frame in frames:
+        t1 = time_sync()
+        im = torch.from_numpy(frame).to(model.device).float()[None] / 255
+        pred = non_max_suppression(model(im), conf_thres, iou_thres)[0]
+        times.append((time_sync()-t1)*1E3)
+        dets.append(pred.cpu())
+    return dets, times
+
+# Return the F1 score of detections against the baseline detections over all frames. A detection matches
+# a baseline detection of the same class with an IoU of at least iou. Parameters:
+#      -dets - detections per frame of the backend
+#      -baseline - detections per frame of the baseline
+#      -iou - smallest IoU for two boxes to match
+def f1_score(dets, baseline, iou=0.5):
+    matched = total_dets = total_base = 0
+    for det, base in zip(dets, baseline):
+        total_dets += len(det)
+        total_base += len(base)
+        if len(det) and len(base):
+            ious = box_iou(det[:, :4], base[:, :4])
+            ious[det[:, 5:6] != base[:, 5]] = 0 # Only boxes of the same class match
+            # Greedily match each baseline box to its best unmatched detection
+            for j in ious.max(0).values.argsort(descending=True):
+                i = int(ious[:, j].argmax())
+                if ious[i, j] >= iou:
+                    matched += 1
+                    ious[i, :] = 0
+    if total_dets + total_base == 0:
+        return 1.0 # Neither found anything, so they agree
+    return 2*matched/(total_dets+total_base)
+
+# Export and benchmark every backend, and return the profile. Parameters:
+#      -weights - path of the PyTorch weights
+#      -clip - path of the recorded clip
+#      -imgsz - inference size (height, width)
+#      -conf_thres, iou_thres - see non_max_suppression()
+#      -tolerance - largest drop in F1 score for a backend to be selected
+#      -max_frames - most frames of the clip to use
+def build_profile(weights, clip, imgsz=(640, 640), conf_thres=0.25, iou_thres=0.45, tolerance=tolerance,
+                  max_frames=200):
+    device = select_device('cpu')
+    imgsz = check_img_size(imgsz, s=32)
+    frames = load_frames(clip, imgsz, max_frames)
+    backends = export_backends(weights, imgsz, frames)
+
+    results, baseline = [], None
+    for name, (path, dnn) in backends.items():
+        try:
+            model = DetectMultiBackend(path, device=device, dnn=dnn)
+            model.warmup(imgsz=(1, 3, *imgsz))
+            dets, times = run_frames(model, frames, conf_thres, iou_thres)
+        except Exception as e: # Skip a backend that cannot run here, ex. a missing runtime
+            if name == 'pytorch': # Nothing to compare the other backends against
+                raise RuntimeError('The pytorch baseline failed, no profile written') from e
+            LOGGER.warning(f'{name} benchmark failed: {e}')
+            continue
+        if name == 'pytorch':
+            baseline = dets # The PyTorch weights are benchmarked first
+        result = {
+            'name': name,
+            'weights': str(Path(path).resolve()),
+            'dnn': dnn,
+            'median_ms': round(float(np.median(times)), 2),
+            'p90_ms': round(float(np.percentile(times, 90)), 2),
+            'f1': round(f1_score(dets, baseline), 4),
+        }
+        result['within_tolerance'] = result['f1'] >= 1-tolerance
+        LOGGER.info(f"{name}: {result['median_ms']}ms median, {result['p90_ms']}ms p90, F1 {result['f1']}")
+        results.append(result)
+
+    candidates = [r for r in results if r['within_tolerance']]
+    selected = min(candidates, key=lambda r: r['median_ms']) if candidates else None
+    weights = Path(weights).resolve()
+    return {
+        'created': time.strftime("%Y%m%d-%H%M%S"),
+        'source_weights': str(weights),
+        'source_mtime': weights.stat().st_mtime,
+        'clip': str(clip),
+        'frames': len(frames),
+        'imgsz': list(imgsz),
+        'conf_thres': conf_thres,
+        'tolerance': tolerance,
+        'results': results,
+        'selected': selected['name'] if selected else None,
+    }
+
+# Write a profile to a file, replacing it in one step. Parameters:
+#      -profile - the profile, see build_profile()
+#      -path - path of the profile file
+def write_profile(profile, path=profile_path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path+'.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+# Return the (weights, dnn) of the backend selected by the profile for the given weights, or the given
+# weights unchanged if there is no profile, or if the weights changed since the profile was made.
+# Parameters:
+#      -weights - path of the PyTorch weights, or a list of paths as given by detect.py's --weights
+#      -dnn - the current value of detect.py's --dnn, returned when the profile is not used
+#      -path - path of the profile file
+def select_backend(weights, dnn=False, path=profile_path):
+    source = Path(weights[0] if isinstance(weights, (list, tuple)) else weights).resolve()
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+        source_mtime = source.stat().st_mtime
+    except (OSError, ValueError): # No profile, or no weights for DetectMultiBackend to report
+        return weights, dnn
+    if profile.get('source_weights') != str(source) or profile.get('source_mtime') != source_mtime:
+        LOGGER.warning(f'Backend profile {path} was made for other weights, run backend_profile.py again')
+        return weights, dnn
+    for result in profile['results']:
+        if result['name'] == profile['selected'] and os.path.exists(result['weights']):
+            LOGGER.info(f"Using the {result['name']} backend from {path}")
+            return result['weights'], result['dnn']
+    return weights, dnn
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', type=str, default='best.pt', help='PyTorch weights to export')
+    parser.add_argument('--clip', type=str, required=True, help='recorded clip from the door camera')
+    parser.add_argument('--imgsz', '--img', '--img-size', nargs='+', type=int, default=[640], help='inference size h,w')
+    parser.add_argument('--conf-thres', type=float, default=0.25, help='confidence threshold')
+    parser.add_argument('--iou-thres', type=float, default=0.45, help='NMS IoU threshold')
+    parser.add_argument('--tolerance', type=float, default=tolerance, help='largest drop in F1 score vs. fp32')
+    parser.add_argument('--max-frames', type=int, default=200, help='most frames of the clip to use')
+    parser.add_argument('--profile', type=str, default=profile_path, help='profile file to write')
+    opt = parser.parse_args()
+    opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
+    return opt
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    profile = build_profile(opt.weights, opt.clip, opt.imgsz, opt.conf_thres, opt.iou_thres, opt.tolerance,
+                            opt.max_frames)
+    write_profile(profile, opt.profile)
+    print('Selected backend: '+str(profile['selected'])+', profile written to '+opt.profile)
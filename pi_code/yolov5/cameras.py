@@ -0,0 +1,31 @@
+# Description: Configuration of the cameras used by detect.py --cameras, to watch the door from inside and
+#   outside at the same time. The cameras are captured concurrently by LoadStreams and their frames are
+#   stacked into one batch, so each inference runs the model once for all the views. Each camera has its
+#   own way of deciding where the cat is, see the cameras list below.
+# Date: Oct 17 2026
+
+import os
+from pathlib import Path
+
+cwd = os.getcwd()
+streams_path = cwd+'/data/streams.txt' # File listing the camera sources, read by LoadStreams
+
+# Cameras to run detection on together. Each camera has a source, as given to detect.py --source, and
+# one of the following to decide the cat's location:
+#     -location - the location of the cat anywhere in view, ex. a camera inside only ever sees the cat IN
+#     -zones - regions of interest with their own location, see roi.py
+#     -boundary_pixel - x-axis pixel splitting the view into IN and OUT, see cat_detection.py
+cameras = [
+    {'name': 'inside', 'source': '0', 'location': 'IN'},
+    {'name': 'outside', 'source': '1', 'location': 'OUT'},
+]
+
+# Write the camera sources to the streams file, one per line in the order of the cameras, and return its
+# path to use as the detect.py source. Parameters:
+#      -cameras - the cameras, see above
+#      -path - path of the streams file
+def write_streams(cameras=cameras, path=streams_path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('\n'.join(str(camera['source']) for camera in cameras)+'\n')
+    return path
@@ -2,22 +2,36 @@
 # Author: Vanessa Pesch
 # Description: Handle instances of positive object detection by executing the following functions:
 #     -notify() - send message and image to Telegram channel
-#     -update_log() - update monthly log file
-#     -find_cat() - identify if cat is 'IN' or 'OUT', take a screenshot, and call notify(),
-#        update_log() and update_aggr_log() functions
+#     -update_log() - add the detection to the event store and the monthly log file
+#     -find_cat() - identify if cat is 'IN' or 'OUT', and if it is a new event call report_detection() and
+#        log_detection(), or send the event to event_sink if it is set (see supervisor.py)
+#     -report_detection() - save the frame of the detection and call notify()
+#     -log_detection() - call update_log() and update_aggr_log()
 #     -get_prev_detection() - get time of last detection, and return a calculated time interval between detections
-#     -update_aggr_log() - update aggregate log by appending new running total of mins cat spent outside
+#     -read_last_line() and find_last_log() - read the last detection from the log files without reading
+#        the whole file, used when the event store cannot be read
+#     -update_aggr_log() - update aggregate log with the new total of mins cat spent outside that day
 
 import os
-import torch
+import sqlite3
 import time
 from pathlib import Path
-import subprocess
 from datetime import datetime, timedelta
-import telegram
 import numpy as np
-# Import variables from credentials.py
-from credentials import TELEGRAM_BOT, TELEGRAM_CHAT
+# Import get_notifier() from notifier.py
+from notifier import get_notifier
+# Import save_frame() from frame_capture.py
+from frame_capture import save_frame
+# Import the event store functions from event_store.py
+from event_store import get_store, log_event, parse_log_line, to_epoch
+# Import add_minutes() from aggregates.py
+from aggregates import add_minutes
+# Import retry() from ingest_pipeline.py
+from ingest_pipeline import retry
+# Import the archived log readers from log_archive.py
+from log_archive import read_index, read_log_lines
+# Import metrics.py to count the detections
+import metrics
 
 # The x-axis pixel that delineates the 'inside' from the 'outside' boundary line
 boundary_pixel = 250
@@ -27,49 +41,43 @@ object_label = "sylvester_face" # Object label
 
 cwd = os.getcwd() # Current working directory
 
-# Notify user on the Telegram channel by sending a text and screenshot. Uses the Python Telegram Bot.
+# Function called with (timestamp, location, frame, log_interval) for each new event instead of handling
+# it here, or None. Set by supervisor.py to publish detections on its event bus.
+event_sink = None
+
+# Detections that were new events, and that were ignored as the same event, see metrics.py
+new_total = metrics.counter('detections_total', 'Cat detections passed to find_cat()', {'result': 'new'})
+ignored_total = metrics.counter('detections_total', 'Cat detections passed to find_cat()', {'result': 'ignored'})
+
+# Notify user on the Telegram channel by sending a text and screenshot, as a single photo with the text as
+# its caption. Uses the shared notifier, which sends the message in the background (see notifier.py).
 # Parameters:
 #        -location - the detected object's location, i.e. IN or OUT
-#        -image - the screenshot taken of the detected object
-#
-# Modified from Python Telegram Bot API:
-# https://github.com/python-telegram-bot/python-telegram-bot/wiki/Introduction-to-the-API
+#        -image - the encoded image of the detected object, or None to send text only
 def notify(location,image):
-    bot = telegram.Bot(TELEGRAM_BOT) # Create new bot instance
     if location=='IN':
-        bot.send_message(text=cat_name+' is waiting. Please let him OUT', chat_id = TELEGRAM_CHAT)
+        get_notifier().send(cat_name+' is waiting. Please let him OUT', image, 'camera')
     elif location=='OUT':
-        bot.send_message(text=cat_name+' is waiting. Please let him IN', chat_id = TELEGRAM_CHAT)
-    bot.send_photo(photo=open(image, 'rb'), chat_id = TELEGRAM_CHAT)
+        get_notifier().send(cat_name+' is waiting. Please let him IN', image, 'camera')
 
-# Update the log file with the timestamp, cat's label, and its location. Entries should be in the 
-# form of YYYYMMDD-HHMMSS-label-location, such as 20220729-172611-sylvester_face-IN
+# Add the detection to the event store and the monthly log file with the timestamp, cat's label, and its
+# location, retrying each on its own. Returns False if the detection was already in the event store.
 # Parameters:
-#        -timestamp - date and time of the detection
+#        -timestamp - date and time of the detection, in the form of YYYYMMDD-HHMMSS
 #        -obj_label - detected object's label name, ex. sylvester_face
 #        -location - the detected object's location, i.e. either IN or OUT
 def update_log(timestamp,obj_label,location):
-    # Construct filename of log by using year and month, in the format of YYYYMM_log.txt
-    filename = time.strftime('%Y%m')+'_log.txt'
-   
-    log_directory = cwd+'/data/logs/'  # Get log directory
-    
-    if not os.path.exists(log_directory): # Create directory if it does not exist
-        os.makedirs(log_directory)
-    os.chdir(log_directory)
-    
-    # Create the file if it does not exist, and on a new line, append timestamp, cat label and cat location
-    f = open(filename, 'a+') 
-    content = timestamp+'-'+obj_label+'-'+location+'\n'
-    f.write(content)
-    f.close()
+    return log_event(timestamp,obj_label,location,'camera',retries=3)
 
 # Find the cat's location to determine if the cat is outside or inside based on where the x_center and/or
 # y_center point falls in relation to the boundary_pixel. Parameters:
 #       -x_center - integer representing the midpoint between the x-min and x-max values of the detected object
 #       -y_center - integer representing the midpoint between the y-min and y-max values of the detected object
-# Take a screenshot, call notify() and update_log()
-def find_cat(x_center, y_center):   
+#       -frame - the annotated frame the object was detected in (im0 in detect.py), or None to send text only
+#       -location - IN or OUT if given by the zone the object was detected in, or None to use boundary_pixel
+# If it is a new event, save the frame, notify user and update the logs. Returns the timestamp of the
+# detection if it was a new event, or None if it was ignored.
+def find_cat(x_center, y_center, frame=None, location=None):   
 
     # Get date and time of the detection
     timestamp = time.strftime("%Y%m%d-%H%M%S")
@@ -78,91 +86,149 @@ def find_cat(x_center, y_center):
     log_location = log[0] # Either OUT or IN
     log_interval = log[1] # Number of minutes between now and previous detection
     
-    # Determine whether the cat is IN or OUT by the x-axis boundary_pixel 
-    if x_center < boundary_pixel: 
-        location = 'IN'
-    else:
-        location = 'OUT'
+    # Determine whether the cat is IN or OUT by the x-axis boundary_pixel, unless the location
+    # was already given by the zone the cat was detected in (see roi.py)
+    if location is None:
+        if x_center < boundary_pixel: 
+            location = 'IN'
+        else:
+            location = 'OUT'
     print('location: ',location) # Print cat's location to console
         
     # If the correct object is detected, and the object is either in a different location or
-    # >10min has passed indicating this is a new instance, then take screenshot, notify user and update logs.
+    # >10min has passed indicating this is a new instance, then save the frame, notify user and update logs.
     if (log_location != location or log_interval >= 10):       
-        filename = str(timestamp) + '.jpg' # Create filename
-        subprocess.run('/usr/bin/scrot -u '+cwd+'/data/images/'+filename,shell=True) # Take screenshot
-        notify(location,cwd+'/data/images/'+filename) # Notify user
-        
-        # Log the opposite location, i.e. if cat is detected inside waiting to go outside,
-        # log that the cat has moved outside, under the assumption that upon detection, the cat was
-        # let in or out. Reason being that the framerate is too low to capture the cat's movemnet across
-        # the in/out threshold of the door so to keep logs accurate, must record the sighting as
-        # though the cat was immediately moved in or out.
-        if location == 'IN':
-            update_log(timestamp,object_label,'OUT') # Update log
-            # Aggregate log is only updated when cat has moved inside, as its purpose is to log
-            # the total time spent outside (which cannot be calculated if the cat just moved outside).
-            update_aggr_log(timestamp,log_interval)
+        if event_sink is not None:
+            event_sink(timestamp, location, frame, log_interval)
         else:
-            update_log(timestamp,object_label,'IN') # Update log
+            report_detection(timestamp, location, frame)
+            log_detection(timestamp, location, log_interval)
+        new_total.inc()
+        return timestamp
+    ignored_total.inc()
+    return None
+
+# Save the frame of a new event and notify user. Parameters:
+#       -timestamp - date and time of the detection, in the form of YYYYMMDD-HHMMSS
+#       -location - the cat's location, i.e. IN or OUT
+#       -frame - the annotated frame the object was detected in, or None to send text only
+def report_detection(timestamp, location, frame):
+    if frame is not None:
+        filename = str(timestamp) + '.jpg' # Create filename
+        # Encode the frame in the background, notify user with the image, and save it
+        save_frame(frame, cwd+'/data/images/'+filename, lambda image: notify(location, image))
+    else:
+        notify(location, None) # Notify user
+
+# Update the logs for a new event. The previous event is read by find_cat() beforehand, and the aggregate
+# log is only updated if the event was not already logged, so calling it again for the same event, ex. from
+# the supervisor's log consumer, does not count the time outside twice. Parameters:
+#       -timestamp - date and time of the detection, in the form of YYYYMMDD-HHMMSS
+#       -location - the cat's location, i.e. IN or OUT
+#       -log_interval - number of minutes between the previous event and this one
+def log_detection(timestamp, location, log_interval):
+    # Log the opposite location, i.e. if cat is detected inside waiting to go outside,
+    # log that the cat has moved outside, under the assumption that upon detection, the cat was
+    # let in or out. Reason being that the framerate is too low to capture the cat's movemnet across
+    # the in/out threshold of the door so to keep logs accurate, must record the sighting as
+    # though the cat was immediately moved in or out.
+    if location == 'IN':
+        # Aggregate log is only updated when cat has moved inside, as its purpose is to log
+        # the total time spent outside (which cannot be calculated if the cat just moved outside).
+        if update_log(timestamp,object_label,'OUT'): # Update log
+            retry(update_aggr_log, timestamp, log_interval)
+    else:
+        update_log(timestamp,object_label,'IN') # Update log
             
 
-# Retrieve last line in log file, calculate the time interval between current time and the timestamp
-# of the last line. Return location and the calculated time interval in minutes. Parameters:
+# Read the last line of a file by seeking backwards from the end of the file in blocks, so that the
+# time taken does not grow with the size of the file. Returns an empty string if the file is empty.
+# Parameters:
+#      -file_path - path of the file to read
+#      -block_size - number of bytes to read at a time
+def read_last_line(file_path, block_size=256):
+    with open(file_path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        data = b''
+        pos = end
+        # Read blocks from the end until a newline is found before the last line, or the start is reached
+        while pos > 0 and data.rstrip(b'\n').count(b'\n') == 0:
+            pos = max(0, pos - block_size)
+            f.seek(pos)
+            data = f.read(end - pos)
+    lines = data.decode().splitlines()
+    return lines[-1] if lines else ''
+
+# Return the months (YYYYMM) from the month of the timestamp back through the previous months, newest
+# first. Parameters:
+#      -curr_timestamp - current timestamp in the form of YYYYMMDD-HHMMSS
+#      -max_months - number of months to return
+def months_before(curr_timestamp, max_months=12):
+    year, month = int(curr_timestamp[0:4]), int(curr_timestamp[4:6])
+    months = []
+    for _ in range(max_months):
+        months.append('%04d%02d' % (year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12) # Previous month
+    return months
+
+# Find the most recent text log file at or before the month of the timestamp. On the first day of a month
+# the current month's log does not exist yet, so look back through previous months. Returns None if no log
+# file was found. Parameters:
+#      -curr_timestamp - current timestamp in the form of YYYYMMDD-HHMMSS
+#      -max_months - number of months to look back
+def find_last_log(curr_timestamp, max_months=12):
+    for month in months_before(curr_timestamp, max_months):
+        file_path = cwd+'/data/logs/'+month+'_log.txt'
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            return file_path
+    return None
+
+# Return the most recent event in the log files as (ts, label, location, source), like
+# EventStore.last_event(), or None if no event was logged. Closed months are compacted into archives
+# (see log_archive.py), so if the newest month with events was archived, it is read from its archive;
+# otherwise only the last line of the newest text log is read. Parameters:
+#      -curr_timestamp - current timestamp in the form of YYYYMMDD-HHMMSS
+#      -max_months - number of months to look back
+def last_logged_event(curr_timestamp, max_months=12):
+    months = months_before(curr_timestamp, max_months)
+    file_path = find_last_log(curr_timestamp, max_months) # Get the most recent text log file
+    archived = [month for month in read_index(cwd+'/data/logs/') if month in months]
+    event = None
+    if archived and (file_path is None or max(archived) >= Path(file_path).name[:6]):
+        events = [e for e in map(parse_log_line, read_log_lines(cwd+'/data/logs/', max(archived))) if e]
+        event = max(events, key=lambda e: e[0]) if events else None
+    if event is None and file_path:
+        event = parse_log_line(read_last_line(file_path))
+    return (to_epoch(event[0]), event[1], event[2], '') if event else None
+
+# Get the most recent event from the event store, calculate the time interval between current time and
+# the time of that event. If the store cannot be read, the event is read from the log files instead.
+# Return location and the calculated time interval in minutes. Parameters:
 #      -curr_timestamp - current timestamp 
 def get_prev_detection(curr_timestamp):
     
-    file_date = (curr_timestamp[0:6]) # Get year and month
-    file_path = cwd+'/data/logs/'+file_date+'_log.txt' # Get log directory
+    try:
+        event = get_store().last_event() # Get the most recent event, which may be from a previous month
+    except sqlite3.Error as e: # ex. the database is locked or damaged
+        print('Event store not available, reading the log files: '+repr(e))
+        event = last_logged_event(curr_timestamp)
     
-    if os.path.exists(file_path): # If the file exists
-        last_line = Path(file_path).read_text().splitlines()[-1] # Get last line
-        s = last_line.split("-") # Split the line to separate timestamp and location
-        # Hold the line's timestamp and store in the format of YYYYMMDD-HHMMSS
-        log_timestamp = s[0]+'-'+s[1] 
-        log_location = s[3] # Hold the line's location; should be either IN or OUT
-        
-        # Calculate the time interval between log timestamp and current timestamp
-        # Source code: https://www.programiz.com/python-programming/datetime/strptime
-        log_timestamp = datetime.strptime(log_timestamp, "%Y%m%d-%H%M%S")
-        curr_timestamp = datetime.strptime(curr_timestamp,"%Y%m%d-%H%M%S")
-        interval = (curr_timestamp - log_timestamp)
-        # Get total seconds of the time interval and convert to minutes
-        interval_mins = round(interval.total_seconds()/60) 
+    if event: # If a previous detection was logged
+        log_location = event[2] # Location of the event; should be either IN or OUT
+        # Calculate the time interval between the event and current timestamp in seconds,
+        # and convert to minutes
+        interval_mins = round((to_epoch(curr_timestamp) - event[0])/60)
         
-    else: # If file doesn't exist, assume last location was cat going inside the previous evening
+    else: # If no event exists, assume last location was cat going inside the previous evening
         log_location = 'IN'
         interval_mins = 0
         
     return log_location, interval_mins
 
-# Update the aggregate_data.txt log that contains the running total of minutes the cat has spent outside per day
+# Update the aggregate_data.txt log that contains the total of minutes the cat has spent outside per day.
+# Only the current day's line is rewritten, see aggregates.py.
 # Parameters:
 #   -timestamp - current time and should be in the form of YYYYMMDD-HHMMSS
 #   -prev_time - number of minutes that have passed since previous detection
 def update_aggr_log(timestamp,prev_time):
-
-    # Get current date, which is the first 8 characters of timestamp
-    date = timestamp[0:8]     
-    # Create the file if it does not exist, and append content
-    f = open(cwd+'/data/logs/aggregate_data.txt','a+')
-    
-    # Try to open the aggregate log file, and write the new time intervals to it.
-    # File extraction source code: https://stackoverflow.com/a/55595682
-    try:
-        file = Path(cwd+'/data/logs/aggregate_data.txt').read_text().splitlines()[-1]         
-        aggr_prev_date = file.split(',')[0] # Get the date from the log line
-        aggr_prev_interval = file.split(',')[-1] # Get the time interval from the log line
-        
-        if aggr_prev_date == date: # If line has same date as current date
-            time_interval = int(aggr_prev_interval)+int(prev_time) # Add the two numbers together
-            f.write(','+str(time_interval)) # Append the new time interval to the line
-        else: # Add new entry  
-            date_time_interval = date+','+str(prev_time)
-            f.write('\n'+date_time_interval) # Write date and time interval on new line
-            
-    except IndexError: # Exception that occurs when file is empty
-        # Add new entry
-        time_interval = date+','+str(prev_time)
-        f.write('\n'+time_interval)
-    f.close()
-    
+    add_minutes(timestamp,prev_time)
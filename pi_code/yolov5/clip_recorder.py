@@ -0,0 +1,142 @@
+# Description: Keep the most recent camera frames in a ring buffer, and on a detection save a short video
+#   clip of the seconds before and after it to data/images/, next to the detection's image. The buffer is
+#   a single NumPy array allocated once and sized to a memory budget, frames are copied into its slots, and
+#   the clip is encoded from views of those slots in a background thread. Slots being encoded are not
+#   written to until the clip is saved; frames that would overwrite them are dropped and counted.
+# Date: Oct 17 2026
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+cwd = os.getcwd()
+clip_directory = cwd+'/data/images' # Directory the clips are saved to
+
+# Records clips around detections from one camera. Parameters:
+#      -pre_seconds - seconds of video kept from before the detection
+#      -post_seconds - seconds of video recorded after the detection
+#      -max_fps - most frames per second kept, frames arriving faster are skipped
+#      -memory_budget - most megabytes used by the ring buffer. If the buffer cannot hold two clips at
+#         max_fps, it holds as many frames as fit and the clips cover less time.
+#      -directory - directory the clips are saved to
+class ClipRecorder:
+    def __init__(self, pre_seconds=3.0, post_seconds=3.0, max_fps=10, memory_budget=64, directory=clip_directory):
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.min_interval = 1/max_fps
+        self.max_frames = 2*int(np.ceil((pre_seconds+post_seconds)*max_fps)) # Room for a clip being saved and the next
+        self.memory_budget = memory_budget
+        self.directory = directory
+
+        self.lock = threading.Lock()
+        self.buffer = None # Array of shape (capacity, height, width, 3), allocated on the first frame
+        self.times = None # Monotonic time of the frame in each slot, or NaN if empty
+        self.next_slot = 0
+        self.held = set() # Slots of the clip being saved
+        self.trigger_time = None # Monotonic time of the detection being recorded, or None
+        self.clip_path = None
+        self.stats = {'clips': 0, 'frames_written': 0, 'dropped_frames': 0, 'skipped_triggers': 0,
+                      'encode_fps': 0.0, 'memory_mb': 0.0}
+
+    # True while recording the frames after a detection
+    @property
+    def recording(self):
+        return self.trigger_time is not None
+
+    # Allocate the ring buffer for frames of the given shape, as many frames as fit in the memory budget
+    def allocate(self, shape):
+        frame_bytes = int(np.prod(shape))
+        capacity = max(2, min(self.max_frames, int(self.memory_budget*2**20 // frame_bytes)))
+        self.buffer = np.empty((capacity, *shape), dtype=np.uint8)
+        self.times = np.full(capacity, np.nan)
+        self.next_slot = 0
+        self.stats['memory_mb'] = round(self.buffer.nbytes/2**20, 1)
+
+    # Add a frame to the ring buffer, and save the clip once the seconds after a detection are recorded.
+    # Parameters:
+    #      -frame - the BGR frame as a NumPy array (im0s in detect.py), copied into the buffer
+    #      -now - monotonic time of the frame, or None for the current time
+    def push(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.buffer is None or self.buffer.shape[1:] != frame.shape:
+                if self.held:
+                    self.stats['dropped_frames'] += 1
+                    return # The camera changed while a clip is being saved
+                self.allocate(frame.shape)
+            last = self.times[self.next_slot-1]
+            if now-last < self.min_interval:
+                return # Faster than max_fps
+            if self.next_slot in self.held:
+                self.stats['dropped_frames'] += 1
+                return
+            np.copyto(self.buffer[self.next_slot], frame)
+            self.times[self.next_slot] = now
+            self.next_slot = (self.next_slot+1) % len(self.buffer)
+            if self.trigger_time is not None and now-self.trigger_time >= self.post_seconds:
+                self.save()
+
+    # Start recording the seconds after a detection. Parameters:
+    #      -name - file name of the clip without extension, ex. the detection's timestamp
+    #      -now - monotonic time of the detection, or None for the current time
+    def trigger(self, name, now=None):
+        with self.lock:
+            if self.trigger_time is not None or self.held:
+                self.stats['skipped_triggers'] += 1 # Already recording or saving a clip
+                return
+            self.trigger_time = time.monotonic() if now is None else now
+            self.clip_path = self.directory+'/'+name+'.mp4'
+
+    # Hold the slots of the clip and encode them in a background thread. Called with the lock held.
+    def save(self):
+        start = self.trigger_time-self.pre_seconds
+        slots = [int(k) for k in np.argsort(self.times) if self.times[k] >= start] # NaN sorts last and fails >=
+        self.held = set(slots)
+        frames = [self.buffer[k] for k in slots] # Views into the buffer, no copy
+        times = self.times[slots]
+        path = self.clip_path
+        self.trigger_time = None
+        # Not a daemon thread, so the process waits for the clip to be saved before exiting
+        threading.Thread(target=self.write, args=(frames, times, path), name='clip_recorder').start()
+
+    # Encode frames as an MP4 video and write it to a file, then release the held slots. Parameters:
+    #      -frames - the BGR frames
+    #      -times - monotonic time of each frame, used to set the video's framerate
+    #      -path - path of the video file
+    def write(self, frames, times, path):
+        try:
+            t1 = time.monotonic()
+            fps = (len(times)-1)/(times[-1]-times[0]) if len(times) > 1 and times[-1] > times[0] else 1
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path[:-4]+'.tmp.mp4' # OpenCV picks the container from the extension
+            h, w = frames[0].shape[:2]
+            writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+            for frame in frames:
+                writer.write(frame)
+            writer.release()
+            os.replace(tmp_path, path) # Never leave a half written clip behind
+            elapsed = time.monotonic()-t1
+            with self.lock:
+                self.stats['clips'] += 1
+                self.stats['frames_written'] += len(frames)
+                self.stats['encode_fps'] = round(len(frames)/max(elapsed, 1E-9), 1)
+        except Exception as e:
+            print('Saving clip failed: '+repr(e))
+        finally:
+            with self.lock:
+                self.held = set()
+
+    # Return a copy of the counters
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    # Return the counters as a string, ex. for logging at the end of a detection
+    def summary(self):
+        stats = self.get_stats()
+        return (f"{stats['clips']} clips, {stats['frames_written']} frames at {stats['encode_fps']} frames/s "
+                f"encoding, {stats['dropped_frames']} frames dropped, {stats['memory_mb']}MB buffer")
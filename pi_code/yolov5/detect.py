@@ -48,7 +48,24 @@ from utils.general import (LOGGER, check_file, check_img_size, check_imshow, che
                            increment_path, non_max_suppression, print_args, scale_coords, strip_optimizer, xyxy2xywh)
 from utils.plots import Annotator, colors, save_one_box
 from utils.torch_utils import select_device, time_sync
-from cat_detection import find_cat # Import find_cat() from cat detection file
+from cat_detection import boundary_pixel, find_cat # Import find_cat() from cat detection file
+from motion_gate import MotionGate # Import MotionGate from motion gate file
+from roi import RegionDetector, zone_location # Import RegionDetector from region of interest file
+from backend_profile import profile_path, select_backend # Import select_backend() from backend profile file
+from tracker import Tracker # Import Tracker from tracker file
+from cameras import cameras as camera_config, write_streams # Import the cameras from cameras file
+from clip_recorder import ClipRecorder # Import ClipRecorder from clip recorder file
+from frame_pipeline import FramePipeline, InputBuffers, StopPipeline # Import FramePipeline from frame pipeline file
+from duty_cycle import get_duty_cycle # Import get_duty_cycle() from duty cycle file
+import metrics # Import metrics file to record the time of each stage
+
+# MODIFICATION
+# Metrics of the detection loop, see metrics.py
+stage_seconds = [metrics.histogram('detect_stage_seconds', 'Time per batch of each stage of the detection', {'stage': stage})
+                 for stage in ('preprocess', 'inference', 'nms')]
+frames_total = metrics.counter('detect_frames_total', 'Frames run through the model')
+fps_gauge = metrics.gauge('detect_fps', 'Frames per second run through the model, smoothed')
+
 
 @torch.no_grad()
 def run(
@@ -78,6 +95,28 @@ def run(
         hide_conf=False,  # hide confidences
         half=False,  # use FP16 half-precision inference
         dnn=False,  # use OpenCV DNN for ONNX inference
+        model=None,  # MODIFICATION: already loaded and warmed up model, see detector_service.py
+        dataset=None,  # MODIFICATION: already opened dataset, see detector_service.py
+        stop_event=None,  # MODIFICATION: threading.Event that ends the detection when set
+        on_inference=None,  # MODIFICATION: callback called after each inference
+        motion_gate=False,  # MODIFICATION: skip inference on frames where nothing moved
+        max_infer_rate=0.0,  # MODIFICATION: maximum inferences per second, 0 for no limit
+        gate=None,  # MODIFICATION: MotionGate to use instead of creating one, see detector_service.py
+        roi=False,  # MODIFICATION: only run the model on the zones around the door, see roi.py
+        adaptive=False,  # MODIFICATION: run a low resolution pass first, see roi.py
+        low_imgsz=(320, 320),  # MODIFICATION: inference size (height, width) of the low resolution pass
+        track=False,  # MODIFICATION: decide the location from several frames, see tracker.py
+        confirm_frames=3,  # MODIFICATION: frames in a row the cat must be in a location before it is reported
+        tracker=None,  # MODIFICATION: Tracker to use instead of creating one, see detector_service.py
+        cameras=False,  # MODIFICATION: the source is the cameras in cameras.py, each with its own location config
+        clip=False,  # MODIFICATION: save a video clip around each detection, see clip_recorder.py
+        clip_pre=3.0,  # MODIFICATION: seconds of the clip before the detection
+        clip_post=3.0,  # MODIFICATION: seconds of the clip after the detection
+        clip_budget=64,  # MODIFICATION: most megabytes of frames kept per camera for the clips
+        recorders=None,  # MODIFICATION: dict of ClipRecorder per stream to use, see detector_service.py
+        pipeline=False,  # MODIFICATION: run capture, inference and postprocessing on their own threads, see frame_pipeline.py
+        timeout=1200,  # MODIFICATION: seconds to look for the cat before giving up
+        duty_cycle=False,  # MODIFICATION: take max_infer_rate and timeout from the mode for the time of day, see duty_cycle.py
 ):
     source = str(source)
     save_img = not nosave and not source.endswith('.txt')  # save inference images
@@ -92,77 +131,221 @@ def run(
     (save_dir / 'labels' if save_txt else save_dir).mkdir(parents=True, exist_ok=True)  # make dir
 
     # Load model
-    device = select_device(device)
-    model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
+    # MODIFICATION
+    # Skip loading and warmup if a long-running process passed in its model and dataset
+    preloaded = model is not None
+    if not preloaded:
+        model, imgsz = load_model(weights, device, dnn, data, half, imgsz)
+    device = model.device
     stride, names, pt = model.stride, model.names, model.pt
     imgsz = check_img_size(imgsz, s=stride)  # check image size
 
     # Dataloader
-    if webcam:
-        view_img = check_imshow()
-        cudnn.benchmark = True  # set True to speed up constant image size inference
-        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt)
-        bs = len(dataset)  # batch_size
-    else:
-        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt)
-        bs = 1  # batch_size
+    if dataset is None:
+        dataset, view_img = load_dataset(source, imgsz, stride, pt, webcam, view_img)
+    bs = len(dataset) if webcam else 1  # batch_size
     vid_path, vid_writer = [None] * bs, [None] * bs
 
     # Run inference
-    model.warmup(imgsz=(1 if pt else bs, 3, *imgsz))  # warmup
+    if not preloaded:
+        model.warmup(imgsz=(1 if pt else bs, 3, *imgsz))  # warmup
     seen, windows, dt = 0, [], [0.0, 0.0, 0.0]
     
     # MODIFICATION
     # Variables to hold pixel points of x and y axis, record the
     #   start time of object detection, and boolean variable to
-    #   determine if object was detected.
+    #   determine if object was detected. The start time is taken from
+    #   the monotonic clock, so the timeout holds across midnight and
+    #   clock changes.
     x_center = 0
     y_center = 0
-    start_time = time.strftime("%H%M")
+    start_time = time.monotonic()
     obj_detected = False
+    # Inference rate and timeout of the duty cycle mode for the time of day
+    if duty_cycle:
+        mode, settings = get_duty_cycle().settings()
+        max_infer_rate, timeout = settings['max_infer_rate'], settings['timeout']
+        LOGGER.info(f'Duty cycle: {mode} mode, {max_infer_rate or "unlimited"} inferences/s, {timeout}s timeout')
+    # Motion gate that skips inference on unchanged frames and limits the inference rate
+    if gate is None and (motion_gate or max_infer_rate):
+        gate = MotionGate(enabled=motion_gate, max_rate=max_infer_rate)
+    if gate is not None:
+        gate.reset()
+        if duty_cycle:
+            gate.set_rate(max_infer_rate)
+    # Region of interest cropping and/or adaptive resolution
+    # With several cameras, each stream has its own zones (see cameras.py), else all frames use the zones in roi.py
+    stream_cameras = camera_config if cameras else None
+    region_detector = None
+    if roi or adaptive:
+        region_detector = RegionDetector(model, imgsz, low_imgsz=check_img_size(low_imgsz, s=stride) if adaptive else None,
+                                         **({} if roi else {'zones': None}),
+                                         stream_zones=[c.get('zones') for c in stream_cameras] if cameras and roi else None)
+
+    # Tracker following the cat across frames
+    if track and tracker is None:
+        tracker = Tracker(confirm_frames)
+
+    # Return the location of a point in a stream, from the zone it is in, or else from the camera's location,
+    # or else from the boundary_pixel
+    def locate(x, y, stream=0):
+        if stream_cameras is not None:
+            camera = stream_cameras[stream]
+            location = zone_location(camera.get('zones'), x, y) or camera.get('location')
+            return location or ('IN' if x < camera.get('boundary_pixel', boundary_pixel) else 'OUT')
+        location = region_detector.location_of(x, y) if region_detector is not None else None
+        return location or ('IN' if x < boundary_pixel else 'OUT')
+
+    # Ring buffers of recent frames, one per stream, filled as the frames are read
+    if clip and recorders is None:
+        recorders = {}
+
+    # Add the frames read from the camera(s) to the ring buffers
+    def push_frames(frames):
+        for i, frame in enumerate(frames if webcam else [frames]):
+            if i not in recorders:
+                recorders[i] = ClipRecorder(clip_pre, clip_post, memory_budget=clip_budget)
+            recorders[i].push(frame)
+
+    # Keep reading frames until the clips being recorded have their seconds after the detection
+    def finish_clips():
+        while any(recorder.recording for recorder in recorders.values()):
+            if stop_event is not None and stop_event.is_set():
+                break
+            item = next(dataset, None) # Carries on from the frame the detection loop stopped at
+            if item is None:
+                break
+            push_frames(item[2])
+
+    # Log the counters of the motion gate, region detector and tracker, called when the detection ends
+    def log_stages():
+        if gate is not None:
+            LOGGER.info(f'Motion gate: {gate.summary()}')
+        if region_detector is not None:
+            LOGGER.info(f'Regions: {region_detector.summary()}')
+        if tracker is not None:
+            LOGGER.info(f'Tracker: {tracker.summary()}')
+        for i, recorder in (recorders or {}).items():
+            LOGGER.info(f'Clips {i}: {recorder.summary()}')
+        if pipeline:
+            LOGGER.info(f'Pipeline: {frame_pipeline.summary()}')
     
-    for path, im, im0s, vid_cap, s in dataset:
-        t1 = time_sync()
-        im = torch.from_numpy(im).to(device)
-        im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-        im /= 255  # 0 - 255 to 0.0 - 1.0
-        if len(im.shape) == 3:
-            im = im[None]  # expand for batch dim
-        t2 = time_sync()
-        dt[0] += t2 - t1
-
-        # Inference
-        visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-        pred = model(im, augment=augment, visualize=visualize)
-        t3 = time_sync()
-        dt[1] += t3 - t2
-
-        # NMS
-        pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
-        dt[2] += time_sync() - t3
+    # MODIFICATION
+    # The detection loop is split into three stages, run one after the other on each frame, or with
+    # --pipeline each on its own thread so that they overlap, see frame_pipeline.py:
+    #   prepare() - reads a frame, skips it through the motion gate and converts it into an input tensor
+    #   infer() - runs the model and NMS
+    #   finish() - draws the boxes, tracks the cat and calls find_cat(), and ends the detection
+    # Input tensors are preallocated and reused from frame to frame (the region detector makes its own)
+    buffers = InputBuffers(device, model.fp16) if region_detector is None else None
+    last_frame_time = None # Monotonic time of the last frame run through the model, for the frame rate
+
+    # Read a frame. Returns the frame with its input tensor, or None to skip the frame. Parameters:
+    #      -item - path, im, im0s, vid_cap and s from the dataset
+    def prepare(item):
+        path, im, im0s, vid_cap, s = item
+        # Stop the detection if asked to by the detector service
+        if stop_event is not None and stop_event.is_set():
+            raise StopPipeline(False)
+        # Keep the frames for the clips, including the frames skipped below
+        if recorders is not None:
+            push_frames(im0s)
+        # Skip the frame if nothing moved, still giving up once the timeout has passed
+        if gate is not None and not gate.should_infer(im):
+            if time.monotonic() - start_time >= timeout:
+                raise StopPipeline(False)
+            return None
+        frame = dataset.count if webcam else getattr(dataset, 'frame', 0)
+        if buffers is not None:
+            t1 = time_sync()
+            im = buffers.fill(im)  # uint8 to fp16/32, 0 - 255 to 0.0 - 1.0, with batch dim
+            t2 = time_sync()
+            dt[0] += t2 - t1
+            stage_seconds[0].observe(t2 - t1)
+        return path, im, im0s, vid_cap, s, frame
+
+    # Run the model and NMS on a frame returned by prepare(). Returns the frame with its detections, the
+    # shape of the input and the inference time. Parameters:
+    #      -prepared - the frame returned by prepare()
+    def infer(prepared):
+        nonlocal last_frame_time
+        path, im, im0s, vid_cap, s, frame = prepared
+        if region_detector is not None:
+            # MODIFICATION
+            # Run the model on the zones cropped out of the frames instead of on the whole frames
+            before = dict(region_detector.dt)
+            pred, im_shape = region_detector.detect(im0s if webcam else [im0s], conf_thres, iou_thres, classes,
+                                                    agnostic_nms, max_det)
+            delta = {k: region_detector.dt[k] - before[k] for k in before}
+            dt[0] += delta['crop']
+            stage_seconds[0].observe(delta['crop'])
+            inference_time, nms_time = delta['low_inference'] + delta['inference'], delta['nms']
+            if on_inference is not None:
+                on_inference()
+        else:
+            # Inference
+            t2 = time_sync()
+            visualize_path = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
+            pred = model(im, augment=augment, visualize=visualize_path)
+            t3 = time_sync()
+            im_shape = im.shape
+            buffers.release(im)  # The model is done with the input
+            # MODIFICATION
+            # Report the inference to the caller, used to measure trigger to first inference latency
+            if on_inference is not None:
+                on_inference()
+
+            # NMS
+            pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+            inference_time, nms_time = t3 - t2, time_sync() - t3
+        dt[1] += inference_time
+        dt[2] += nms_time
+
+        # MODIFICATION
+        # Record the time of each stage and the frame rate
+        if metrics.enabled:
+            stage_seconds[1].observe(inference_time)
+            stage_seconds[2].observe(nms_time)
+            frames_total.inc(len(pred))
+            now = time.monotonic()
+            if last_frame_time is not None and now > last_frame_time:
+                fps = len(pred) / (now - last_frame_time)
+                fps_gauge.set(fps if fps_gauge.value == 0 else 0.9 * fps_gauge.value + 0.1 * fps)
+            last_frame_time = now
+        return path, pred, im_shape, im0s, vid_cap, s, frame, inference_time
+
+    # Draw and save the detections of a frame returned by infer(), and look for the cat. Returns whether
+    # the cat was detected to end the detection, or None to carry on. Parameters:
+    #      -result - the frame and detections returned by infer()
+    def finish(result):
+        nonlocal seen, x_center, y_center, obj_detected
+        path, pred, im_shape, im0s, vid_cap, s, frame, inference_time = result
 
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
 
         # Process predictions
+        found = False # Whether the cat was detected in any stream of the batch
         for i, det in enumerate(pred):  # per image
             seen += 1
+            obj_detected = False # Whether the cat was detected in this stream
             if webcam:  # batch_size >= 1
-                p, im0, frame = path[i], im0s[i].copy(), dataset.count
+                p, im0 = path[i], im0s[i].copy()
                 s += f'{i}: '
             else:
-                p, im0, frame = path, im0s.copy(), getattr(dataset, 'frame', 0)
+                p, im0 = path, im0s.copy()
             
             p = Path(p)  # to Path
             save_path = str(save_dir / p.name)  # im.jpg
             txt_path = str(save_dir / 'labels' / p.stem) + ('' if dataset.mode == 'image' else f'_{frame}')  # im.txt
-            s += '%gx%g ' % im.shape[2:]  # print string
+            s += '%gx%g ' % im_shape[2:]  # print string
             gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
             imc = im0.copy() if save_crop else im0  # for save_crop
             annotator = Annotator(im0, line_width=line_thickness, example=str(names))
             if len(det):
-                # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_coords(im.shape[2:], det[:, :4], im0.shape).round()
+                # Rescale boxes from img_size to im0 size (already done for regions of interest)
+                if region_detector is None:
+                    det[:, :4] = scale_coords(im_shape[2:], det[:, :4], im0.shape).round()
                 # Print results
                 for c in det[:, -1].unique():
                     n = (det[:, -1] == c).sum()  # detections per class
@@ -183,6 +366,11 @@ def run(
                     if label == 1:
                         obj_detected = True
                         
+                # MODIFICATION
+                # The frame is sent by find_cat() when the cat is in it, so it needs the boxes drawn too,
+                # even when images are not saved, ex. for the camera streams of a .txt source
+                send_img = bool((det[:, 5] == 1).any())
+
                 # Write results
                 for *xyxy, conf, cls in reversed(det):
                     if save_txt:  # Write to file
@@ -191,7 +379,7 @@ def run(
                         with open(f'{txt_path}.txt', 'a') as f:
                             f.write(('%g ' * len(line)).rstrip() % line + '\n')
 
-                    if save_img or save_crop or view_img:  # Add bbox to image
+                    if save_img or save_crop or view_img or send_img:  # Add bbox to image
                         c = int(cls)  # integer class
                         label = None if hide_labels else (names[c] if hide_conf else f'{names[c]} {conf:.2f}')
                         annotator.box_label(xyxy, label, color=colors(c, True))
@@ -228,19 +416,46 @@ def run(
                     vid_writer[i].write(im0)
             
             # MODIFICATION
-            # If object is detected, call find_cat()
+            # With tracking, the cat only counts as detected once its track has been in the same location
+            # for confirm_frames frames, and then its smoothed center and location are used
+            if tracker is not None:
+                confirmed = tracker.update(det[det[:, 5] == 1, :4].tolist(), lambda x, y: locate(x, y, i), stream=i)
+                obj_detected = bool(confirmed)
+                if confirmed:
+                    (x_center, y_center), location = confirmed[0].center, confirmed[0].reported
+            elif obj_detected:
+                location = locate(x_center, y_center, i)
+            # If object is detected, call find_cat() with the annotated frame and the cat's location, and
+            # record a clip of a new event under the same name as its image
             if obj_detected:
-                find_cat(x_center, y_center)
-            time_now = time.strftime("%H%M") # Get current time
-            time_interval = int(time_now) - int(start_time) # Calculate time passed
-            print('start time:', start_time,' time now:',time_now,' interval:',time_interval)
-            # If the object is detected or if 20 mins has passed and no object was detected, then shut
-            # down this detect.py script.
-            if (time_interval >= 20 and obj_detected == False) or obj_detected == True:
-                sys.exit(0)
+                event_timestamp = find_cat(x_center, y_center, im0, location)
+                if event_timestamp is not None and recorders is not None:
+                    recorders[i].trigger(event_timestamp)
+            found = found or obj_detected
                 
         # Print time (inference-only)
-        LOGGER.info(f'{s}Done. ({t3 - t2:.3f}s)')
+        LOGGER.info(f'{s}Done. ({inference_time:.3f}s)')
+
+        # MODIFICATION
+        # Once every stream of the batch is finished, end the detection if the object was detected in any of
+        # them, or if the timeout has passed and no object was detected
+        obj_detected = found
+        time_interval = time.monotonic() - start_time # Calculate seconds passed
+        print('interval: %.0fs of %ds' % (time_interval, timeout))
+        if (time_interval >= timeout and obj_detected == False) or obj_detected == True:
+            return obj_detected
+
+    frame_pipeline = FramePipeline(prepare, infer, finish, threaded=pipeline, drop=webcam,
+                                   on_drop=(lambda prepared: buffers.release(prepared[1])) if buffers is not None else None)
+    found = frame_pipeline.run(dataset)
+    # MODIFICATION
+    # End the detection once finish() found the cat or gave up, or prepare() was stopped. Returning (rather
+    # than exiting) lets detector_service.py keep the model loaded.
+    if found is not None:
+        if recorders is not None:
+            finish_clips()
+        log_stages()
+        return found
 
     # Print results
     t = tuple(x / seen * 1E3 for x in dt)  # speeds per image
@@ -251,7 +466,32 @@ def run(
     if update:
         strip_optimizer(weights)  # update model (to fix SourceChangeWarning)
 
-def parse_opt():
+# MODIFICATION
+# Load the model, split out of run() so that detector_service.py can load it once and reuse it.
+# Returns the model and the image size checked against the model stride.
+def load_model(weights, device='', dnn=False, data=ROOT / 'data/coco128.yaml', half=False, imgsz=(640, 640)):
+    device = select_device(device)
+    model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
+    imgsz = check_img_size(imgsz, s=model.stride)  # check image size
+    return model, imgsz
+
+
+# MODIFICATION
+# Open the dataset, split out of run() so that detector_service.py can keep the camera stream open
+# between detections. Returns the dataset and whether results can be shown on screen.
+def load_dataset(source, imgsz, stride, pt, webcam, view_img=False):
+    if webcam:
+        view_img = check_imshow()
+        cudnn.benchmark = True  # set True to speed up constant image size inference
+        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt)
+    else:
+        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt)
+    return dataset, view_img
+
+
+# MODIFICATION
+# args is the list of arguments to parse instead of the command line, used by supervisor.py
+def parse_opt(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--weights', nargs='+', type=str, default=ROOT / 'yolov5s.pt', help='model path(s)')
     parser.add_argument('--source', type=str, default=ROOT / 'data/images', help='file/dir/URL/glob, 0 for webcam')
@@ -279,8 +519,36 @@ def parse_opt():
     parser.add_argument('--hide-conf', default=False, action='store_true', help='hide confidences')
     parser.add_argument('--half', action='store_true', help='use FP16 half-precision inference')
     parser.add_argument('--dnn', action='store_true', help='use OpenCV DNN for ONNX inference')
-    opt = parser.parse_args()
+    parser.add_argument('--motion-gate', action='store_true', help='skip inference on frames where nothing moved')
+    parser.add_argument('--max-infer-rate', type=float, default=0.0, help='maximum inferences per second, 0 for no limit')
+    parser.add_argument('--roi', action='store_true', help='only run the model on the zones around the door')
+    parser.add_argument('--adaptive', action='store_true', help='run a low resolution pass before full resolution')
+    parser.add_argument('--low-imgsz', nargs='+', type=int, default=[320], help='low resolution inference size h,w')
+    parser.add_argument('--track', action='store_true', help='decide the location from several frames')
+    parser.add_argument('--confirm-frames', type=int, default=3, help='frames in a row before a location counts')
+    parser.add_argument('--cameras', action='store_true', help='run on all the cameras in cameras.py as one batch')
+    parser.add_argument('--clip', action='store_true', help='save a video clip around each detection')
+    parser.add_argument('--clip-pre', type=float, default=3.0, help='seconds of the clip before the detection')
+    parser.add_argument('--clip-post', type=float, default=3.0, help='seconds of the clip after the detection')
+    parser.add_argument('--clip-budget', type=int, default=64, help='most MB of frames kept per camera for clips')
+    parser.add_argument('--pipeline', action='store_true', help='overlap capture, inference and postprocessing on threads')
+    parser.add_argument('--timeout', type=int, default=1200, help='seconds to look for the cat before giving up')
+    parser.add_argument('--duty-cycle', action='store_true', help='set inference rate and timeout from when the cat is active')
+    metrics.add_arguments(parser)
+    parser.add_argument('--backend-profile', type=str, default=profile_path, help='backend profile, empty to not use')
+    opt = parser.parse_args(args)
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
+    opt.low_imgsz *= 2 if len(opt.low_imgsz) == 1 else 1  # expand
+    # MODIFICATION
+    # Read all the cameras in cameras.py together, as a streams file for LoadStreams
+    if opt.cameras:
+        opt.source = write_streams()
+    # Start recording metrics if asked to, see metrics.py
+    metrics.enable_from(opt)
+    # Use the fastest backend measured by backend_profile.py for these weights, if there is a profile
+    if opt.backend_profile:
+        opt.weights, opt.dnn = select_backend(opt.weights, opt.dnn, opt.backend_profile)
+    del opt.backend_profile
     print_args(vars(opt))
     return opt
 
@@ -0,0 +1,45 @@
+# Description: Client side of the local socket used to talk to detector_service.py. Kept separate from
+#   the service so that run_radar.py can arm the detector without importing torch or YOLOv5.
+# Date: Oct 17 2026
+
+import os
+import socket
+import time
+
+cwd = os.getcwd() # Current working directory
+
+# Path of the Unix socket that the detector service listens on
+socket_path = cwd+'/data/detector.sock'
+
+# Send a single command to the detector service and return its reply. Raises OSError (for example
+# FileNotFoundError or ConnectionRefusedError) if the service is not running. Parameters:
+#      -command - one of ARM, DISARM or STATS
+#      -timeout - number of seconds to wait for the reply
+def send_command(command, timeout=2.0):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((command+'\n').encode())
+        reply = sock.makefile('r').readline()
+    return reply.strip()
+
+# Return True if a detector service is answering on the socket. A socket file left behind by a service
+# that has exited refuses the connection, so it does not count as running.
+def is_running():
+    try:
+        send_command('STATS')
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    except OSError: # Connected, but the reply did not arrive in time
+        pass
+    return True
+
+# Ask the detector service to start looking for the cat. The trigger time is sent along with the
+# command so the service can measure the latency from trigger to first inference. time.monotonic()
+# uses the system-wide monotonic clock on Linux, so it can be compared between processes.
+def arm():
+    return send_command('ARM '+str(time.monotonic()))
+
+# Ask the detector service to stop the current detection
+def disarm():
+    return send_command('DISARM')
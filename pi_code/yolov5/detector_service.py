@@ -0,0 +1,165 @@
+# Description: Long-running detection service. Loads the YOLOv5 model and opens the camera stream once,
+#   then waits for commands on a local Unix socket (see detector_client.py):
+#     -ARM - start looking for the cat with detect.run(), reusing the warm model and open stream
+#     -DISARM - stop the current detection
+#     -STATS - return the service counters as JSON, including the trigger to first inference latency
+#   Takes the same arguments as detect.py, for example:
+#     libcamerify python3 yolov5/detector_service.py --weights yolov5/best.pt --source 0 --conf-thres 0.8
+# Date: Oct 17 2026
+
+import json
+import os
+import socketserver
+import threading
+import time
+
+from detect import load_dataset, load_model, parse_opt, run
+from detector_client import is_running, socket_path
+from duty_cycle import get_duty_cycle
+from motion_gate import MotionGate
+from tracker import Tracker
+import metrics
+
+# Trigger to first inference latency, see metrics.py
+first_inference_seconds = metrics.histogram('detector_first_inference_seconds', 'Time from a trigger to the first inference')
+# Detection sessions that failed, see metrics.py
+session_errors_total = metrics.counter('detector_session_errors_total', 'Detection sessions that raised an error')
+
+# Handle a single command sent over the Unix socket, and write the reply back on one line
+class CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        words = self.rfile.readline().decode().split()
+        reply = self.server.service.handle_command(words)
+        self.wfile.write((reply+'\n').encode())
+
+# Holds the loaded model and camera stream, and runs one detection session per ARM command.
+# Parameters:
+#      -opt - the parsed detect.py arguments
+class DetectorService:
+    def __init__(self, opt):
+        self.opt = vars(opt)
+        # Load the model, open the camera stream and warm up the model once for the service lifetime
+        self.model, imgsz = load_model(opt.weights, opt.device, opt.dnn, opt.data, opt.half, opt.imgsz)
+        self.dataset, _ = load_dataset(str(opt.source), imgsz, self.model.stride, self.model.pt, webcam=True)
+        self.model.warmup(imgsz=(1 if self.model.pt else len(self.dataset), 3, *imgsz))
+        self.opt['imgsz'] = imgsz
+        # Motion gate kept for the service lifetime, so its counters cover every session
+        self.gate = None
+        if opt.motion_gate or opt.max_infer_rate or opt.duty_cycle:
+            self.gate = MotionGate(enabled=opt.motion_gate, max_rate=opt.max_infer_rate)
+        # Tracker kept for the service lifetime, so a cat still in view is not reported again by the next session
+        self.tracker = Tracker(opt.confirm_frames) if opt.track else None
+        # Clip recorders kept for the service lifetime, so their buffers are allocated once
+        self.recorders = {} if opt.clip else None
+
+        self.lock = threading.Lock()
+        self.armed = threading.Event() # Set when a detection session should start
+        self.stop_event = threading.Event() # Set to end the current detection session
+        self.session_running = False
+        self.trigger_time = None # Monotonic time of the trigger awaiting its first inference
+        self.latencies = [] # Trigger to first inference latencies in ms
+        self.stats = {'triggers': 0, 'coalesced_triggers': 0, 'sessions': 0, 'detections': 0, 'errors': 0}
+
+    # Act on a command received over the socket and return the reply. Parameters:
+    #      -words - the command split into words, ex. ['ARM', '12345.67']
+    def handle_command(self, words):
+        command = words[0].upper() if words else ''
+        with self.lock:
+            if command == 'ARM':
+                try:
+                    trigger_time = float(words[1]) if len(words) > 1 else time.monotonic()
+                except ValueError:
+                    return 'ERROR invalid trigger time'
+                self.stats['triggers'] += 1
+                if self.session_running or self.armed.is_set():
+                    # Already looking for the cat, so merge this trigger into the current session
+                    self.stats['coalesced_triggers'] += 1
+                    return 'OK coalesced'
+                self.trigger_time = trigger_time
+                self.armed.set()
+                return 'OK armed'
+            if command == 'DISARM':
+                self.armed.clear()
+                self.stop_event.set()
+                return 'OK disarmed'
+            if command == 'STATS':
+                return json.dumps(self.get_stats())
+        return 'ERROR unknown command'
+
+    # Return the counters and the trigger to first inference latency summary. Called with the lock held.
+    def get_stats(self):
+        stats = dict(self.stats, armed=self.session_running)
+        if self.gate is not None:
+            stats['motion_gate'] = dict(self.gate.stats)
+        if self.tracker is not None:
+            stats['tracker'] = dict(self.tracker.stats)
+        if self.opt['duty_cycle']:
+            stats['duty_cycle'] = get_duty_cycle().get_stats()
+        if self.recorders:
+            stats['clips'] = {i: recorder.get_stats() for i, recorder in self.recorders.items()}
+        if self.latencies:
+            stats['first_inference_ms'] = {
+                'last': round(self.latencies[-1], 1),
+                'mean': round(sum(self.latencies)/len(self.latencies), 1),
+                'max': round(max(self.latencies), 1),
+            }
+        return stats
+
+    # Called by detect.run() after every inference. Records the latency of the first inference after a trigger.
+    def on_inference(self):
+        with self.lock:
+            if self.trigger_time is not None:
+                self.latencies.append((time.monotonic()-self.trigger_time)*1E3)
+                first_inference_seconds.observe(self.latencies[-1]/1E3)
+                self.latencies = self.latencies[-100:] # Keep only the most recent latencies
+                self.trigger_time = None
+
+    # Wait for ARM commands and run a detection session for each one. A session that fails, ex. when a frame
+    # cannot be read, is printed and counted, and the service keeps waiting for the next ARM command.
+    def run_sessions(self):
+        while True:
+            self.armed.wait()
+            with self.lock:
+                self.armed.clear()
+                self.stop_event.clear()
+                self.session_running = True
+            try:
+                found = run(**self.opt, model=self.model, dataset=self.dataset, stop_event=self.stop_event,
+                            on_inference=self.on_inference, gate=self.gate, tracker=self.tracker,
+                            recorders=self.recorders)
+            except Exception as e:
+                print('Detection session failed: '+repr(e))
+                found = None
+                session_errors_total.inc()
+                with self.lock:
+                    self.stats['errors'] += 1
+            finally:
+                with self.lock:
+                    self.session_running = False
+                    self.trigger_time = None
+            with self.lock:
+                self.stats['sessions'] += 1
+                self.stats['detections'] += int(bool(found))
+
+    # Listen for commands on the Unix socket in a background thread and run detection sessions. Raises
+    # RuntimeError if another service is already listening on the socket.
+    def serve(self):
+        if is_running():
+            raise RuntimeError('Detector service already running on '+socket_path)
+        if os.path.exists(socket_path): # Remove socket left behind by a previous run that has exited
+            os.remove(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path, CommandHandler)
+        server.daemon_threads = True
+        server.service = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print('Detector service listening on '+socket_path)
+        try:
+            self.run_sessions()
+        finally:
+            server.shutdown()
+            server.server_close()
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    DetectorService(parse_opt()).serve()
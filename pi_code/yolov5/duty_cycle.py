@@ -0,0 +1,132 @@
+# Description: Duty cycle scheduler for the detector. Learns from the event store when the cat is usually
+#   active, and picks one of three modes for each detection, so that CPU is spent at the times of day when
+#   detections actually happen:
+#     -full - the cat is often active at this time: inference at the full rate, and a long timeout
+#     -low - the cat is sometimes active: a few inferences per second, and a shorter timeout
+#     -idle - the cat is rarely active: one inference every few seconds, and a short timeout
+#   The events of the last few weeks are counted per half hour of the day, recent days weighing more, and
+#   each half hour is scored against the busiest one. Right after an event the cat is likely to come back
+#   through the door, so the full mode is used for a while whatever the time. Until there is enough
+#   history, every detection uses the full mode. This replaces starting and stopping the system at fixed
+#   times with cron: the supervisor runs all the time and the detector does less when it is not needed.
+# Date: Oct 17 2026
+
+import threading
+import time
+from datetime import datetime
+
+from event_store import get_store
+
+# Inference rate (inferences per second, 0 for no limit) and timeout (seconds without finding the cat
+# before the detection ends) of each mode
+modes = {
+    'full': {'max_infer_rate': 0.0, 'timeout': 1200},
+    'low': {'max_infer_rate': 2.0, 'timeout': 300},
+    'idle': {'max_infer_rate': 0.5, 'timeout': 120},
+}
+
+# Counts of the events at each time of day, each weighted by how recent it is. Parameters:
+#      -slot_minutes - length of the time slots the day is split into
+#      -half_life - days after which an event counts half as much
+class ActivityProfile:
+    def __init__(self, slot_minutes=30, half_life=7.0):
+        self.slot_minutes = slot_minutes
+        self.half_life = half_life
+        self.weights = [0.0]*(24*60//slot_minutes)
+
+    # Return the slot of the day a time falls in. Parameters:
+    #      -epoch - seconds since the epoch
+    def slot(self, epoch):
+        t = datetime.fromtimestamp(epoch)
+        return (t.hour*60+t.minute)//self.slot_minutes
+
+    # Count events, replacing what was learned before. Parameters:
+    #      -epochs - times of the events in seconds since the epoch
+    #      -now - seconds since the epoch to weigh the events from
+    def learn(self, epochs, now):
+        self.weights = [0.0]*len(self.weights)
+        for epoch in epochs:
+            self.weights[self.slot(epoch)] += 0.5**(max(now-epoch, 0)/86400/self.half_life)
+
+    # Return the total weight of the events counted
+    def total(self):
+        return sum(self.weights)
+
+    # Return how active the cat is at a time of day, from 0 to 1 for the busiest slot. Each slot is
+    # averaged with its neighbours, so that a visit at 7:55 also counts for 8:00. Parameters:
+    #      -epoch - seconds since the epoch
+    def level(self, epoch):
+        n = len(self.weights)
+        smoothed = [0.25*self.weights[i-1]+0.5*self.weights[i]+0.25*self.weights[(i+1) % n] for i in range(n)]
+        busiest = max(smoothed)
+        return smoothed[self.slot(epoch)]/busiest if busiest else 0.0
+
+# Picks the mode of each detection from the activity profile. Parameters:
+#      -store - the EventStore to learn from, or None for the store shared by the process
+#      -days - days of events to learn from
+#      -min_events - weighted number of events needed before the profile is used
+#      -low_level - activity level from which the low mode is used
+#      -full_level - activity level from which the full mode is used
+#      -boost - seconds after an event during which the full mode is used
+#      -relearn_interval - seconds between reading the events again
+class DutyCycle:
+    def __init__(self, store=None, days=28, min_events=10, low_level=0.1, full_level=0.4, boost=1800,
+                 relearn_interval=3600):
+        self.store = store
+        self.days = days
+        self.min_events = min_events
+        self.low_level = low_level
+        self.full_level = full_level
+        self.boost = boost
+        self.relearn_interval = relearn_interval
+        self.profile = ActivityProfile()
+        self.learned = None # Monotonic time the profile was last learned
+        self.lock = threading.Lock()
+        self.stats = {mode: 0 for mode in modes}
+
+    # Read the events of the last days again if relearn_interval seconds have passed. Parameters:
+    #      -now - seconds since the epoch
+    def refresh(self, now):
+        if self.learned is not None and time.monotonic()-self.learned < self.relearn_interval:
+            return
+        store = self.store or get_store()
+        events = store.query(start=int(now)-self.days*86400)
+        self.profile.learn([event[0] for event in events], now)
+        self.learned = time.monotonic()
+
+    # Return the mode to use at a time. Parameters:
+    #      -now - seconds since the epoch, or None for now
+    def mode(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.refresh(now)
+            if self.profile.total() < self.min_events:
+                return 'full' # Not enough history to tell
+            last = (self.store or get_store()).last_event()
+            if last is not None and 0 <= now-last[0] < self.boost:
+                return 'full'
+            level = self.profile.level(now)
+        if level >= self.full_level:
+            return 'full'
+        return 'low' if level >= self.low_level else 'idle'
+
+    # Return the mode to use now and its settings, see modes, and count it
+    def settings(self):
+        mode = self.mode()
+        with self.lock:
+            self.stats[mode] += 1
+        return mode, dict(modes[mode])
+
+    # Return the number of detections run in each mode
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+_duty_cycle = None # Duty cycle shared by the current process, created by get_duty_cycle()
+
+# Return the duty cycle shared by the current process, creating it on first use
+def get_duty_cycle():
+    global _duty_cycle
+    if _duty_cycle is None:
+        _duty_cycle = DutyCycle()
+    return _duty_cycle
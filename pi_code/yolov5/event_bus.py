@@ -0,0 +1,88 @@
+# Description: Event bus used by supervisor.py, so that the radar, the MQTT touch pins and the camera
+#   detections all go through one pipeline. Producers publish events from any thread, and each subscriber
+#   is a Worker of ingest_pipeline.py, with its own bounded queue and thread, so a slow consumer (ex. a
+#   Telegram request) only holds up its own queue. Publishing never blocks: if a queue is full the event is
+#   dropped for that subscriber and counted. The workers keep the counters and the latency of each stage
+#   per subscriber, measured from the event being published:
+#     -queue_ms - from the event being published to its handler starting
+#     -handler_ms - time spent in the handler
+#     -total_ms - from the event being published to its handler finishing
+# Date: Oct 17 2026
+
+import threading
+import time
+
+from ingest_pipeline import Worker
+
+# Something that happened, published on the bus. Parameters:
+#      -kind - type of the event, ex. radar, location or detection
+#      -source - what produced it, ex. radar, button or camera
+#      -timestamp - date and time of the event, in the form of YYYYMMDD-HHMMSS, or None for now
+#      -data - the rest of the event, ex. location='IN'
+class Event:
+    def __init__(self, kind, source, timestamp=None, **data):
+        self.kind = kind
+        self.source = source
+        self.timestamp = timestamp or time.strftime("%Y%m%d-%H%M%S")
+        self.data = data
+        self.created = time.monotonic() # Monotonic time the event was published
+
+# Hands every published event to the subscribers of its kind
+class EventBus:
+    def __init__(self):
+        self.subscribers = {} # List of subscribers of each kind of event
+        self.published = {} # Number of events published of each kind
+        self.lock = threading.Lock()
+        self.started = False
+        self.stopping = False
+
+    # Add a subscriber to one or more kinds of event. Must be called before start(). Returns the subscriber's
+    # Worker. Parameters:
+    #      -kinds - the kinds of event to receive, ex. ('location', 'detection')
+    #      -name - name of the subscriber
+    #      -handler - function called with each event
+    #      -kwargs - maxsize, retries and retry_delay, see ingest_pipeline.Worker
+    def subscribe(self, kinds, name, handler, **kwargs):
+        subscriber = Worker(name, handler, **kwargs)
+        for kind in kinds:
+            self.subscribers.setdefault(kind, []).append(subscriber)
+        return subscriber
+
+    # Return each subscriber once
+    def all_subscribers(self):
+        return list({id(s): s for subscribers in self.subscribers.values() for s in subscribers}.values())
+
+    # Start the thread of every subscriber
+    def start(self):
+        for subscriber in self.all_subscribers():
+            subscriber.start()
+        self.started = True
+
+    # Publish an event from any thread. Never blocks; events published before start() or after stop() are
+    # ignored. Parameters:
+    #      -event - the Event
+    def publish(self, event):
+        if not self.started or self.stopping:
+            return
+        with self.lock:
+            self.published[event.kind] = self.published.get(event.kind, 0)+1
+        for subscriber in self.subscribers.get(event.kind, []):
+            subscriber.put((event,), created=event.created)
+
+    # Stop taking new events, and stop the subscribers once their queued events are handled. Returns False
+    # if the queues were not emptied within the timeout. Parameters:
+    #      -timeout - seconds to wait for the queued events of all subscribers
+    def stop(self, timeout=10.0):
+        self.stopping = True
+        deadline = time.monotonic()+timeout
+        drained = True
+        for subscriber in self.all_subscribers():
+            drained = subscriber.stop(max(deadline-time.monotonic(), 0)) and drained
+        return drained
+
+    # Return the number of events published of each kind and the counters of every subscriber
+    def get_stats(self):
+        with self.lock:
+            published = dict(self.published)
+        return {'published': published,
+                'subscribers': {s.name: s.get_stats() for s in self.all_subscribers()}}
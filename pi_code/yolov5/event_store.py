@@ -0,0 +1,230 @@
+# Description: Append-only store of the cat's IN/OUT events, kept in an SQLite database in WAL mode
+#   (data/logs/events.db). The store is what the code queries, ex. for the last event. Every event is also
+#   still appended to the monthly YYYYMM_log.txt text log, as before the store, so the logs stay readable
+#   and usable without SQLite, and are archived once their month is over (see log_archive.py):
+#     -EventStore - append events (optionally in batches committed together), and query them by time
+#     -get_store() - the store shared by all code in the current process
+#     -log_event() - add a single event to the store and, if it was new, to the text log, used by
+#        cat_detection.py and run_mqtt.py
+#     -append_text_log() - append a single event to the text log of its month
+#     -import_text_logs() - one-shot import of the existing monthly text logs, run by get_store() when the
+#        store is empty
+#   Event times are stored as Unix timestamps in seconds. The rest of the code uses timestamps in the
+#   form of YYYYMMDD-HHMMSS (local time), which to_epoch() and to_timestamp() convert between.
+#   The text logs can also be imported again by running: python3 yolov5/event_store.py --import-logs
+# Date: Oct 17 2026
+
+import argparse
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import metrics
+from ingest_pipeline import retry
+from log_archive import read_log_lines
+
+cwd = os.getcwd() # Current working directory
+
+# Location of the event database
+db_path = cwd+'/data/logs/events.db'
+# Directory of the monthly text logs
+log_directory = cwd+'/data/logs/'
+
+# Time to commit events, see metrics.py
+write_seconds = metrics.histogram('event_store_write_seconds', 'Time to commit a batch of events')
+
+# Convert a timestamp in the form of YYYYMMDD-HHMMSS to seconds since the epoch. Parameters:
+#      -timestamp - the timestamp, ex. 20220729-172611
+def to_epoch(timestamp):
+    return int(datetime.strptime(timestamp, "%Y%m%d-%H%M%S").timestamp())
+
+# Convert seconds since the epoch to a timestamp in the form of YYYYMMDD-HHMMSS. Parameters:
+#      -epoch - seconds since the epoch
+def to_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime("%Y%m%d-%H%M%S")
+
+# Split a text log line in the form of YYYYMMDD-HHMMSS-label-location, ex. 20220729-172611-sylvester_face-IN,
+# into (timestamp, label, location). Returns None for lines that are not in this form. Parameters:
+#      -line - the log line
+def parse_log_line(line):
+    s = line.strip().split('-')
+    if len(s) < 4 or s[-1] not in ('IN', 'OUT'):
+        return None
+    return s[0]+'-'+s[1], '-'.join(s[2:-1]), s[-1]
+
+# Store of IN/OUT events. Events are added to a pending batch that is committed in a single transaction
+# once it holds batch_size events or flush_interval seconds have passed since the first pending event.
+# With the defaults every event is committed straight away. Reads commit any pending events first.
+# Parameters:
+#      -path - location of the SQLite database file
+#      -batch_size - number of pending events that triggers a commit
+#      -flush_interval - number of seconds after which pending events are committed
+class EventStore:
+    def __init__(self, path=db_path, batch_size=1, flush_interval=0.0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.pending_since = 0.0
+        self.lock = threading.RLock()
+        # The connection is shared between threads, with access serialised by the lock
+        self.conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=FULL')
+        # The unique constraint also indexes ts, and makes re-importing the same events harmless
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS events (
+                                 id INTEGER PRIMARY KEY,
+                                 ts INTEGER NOT NULL,
+                                 label TEXT NOT NULL,
+                                 location TEXT NOT NULL,
+                                 source TEXT NOT NULL DEFAULT '',
+                                 UNIQUE (ts, label, location))''')
+        self.conn.commit()
+
+    # Add an event to the store. Parameters:
+    #      -timestamp - time of the event in the form of YYYYMMDD-HHMMSS
+    #      -label - the object's label name, ex. sylvester_face
+    #      -location - the cat's location, either IN or OUT
+    #      -source - what produced the event, ex. camera or button
+    def append(self, timestamp, label, location, source=''):
+        self.append_many([(timestamp, label, location, source)])
+
+    # Add several events to the store. Parameters:
+    #      -events - list of (timestamp, label, location, source) tuples
+    def append_many(self, events):
+        with self.lock:
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.extend((to_epoch(t), label, location, source) for t, label, location, source in events)
+            if (len(self.pending) >= self.batch_size or
+                    time.monotonic() - self.pending_since >= self.flush_interval):
+                self.flush()
+
+    # Add an event to the store and commit it straight away, along with any pending events. Returns False if
+    # the event was already in the store. Parameters:
+    #      -timestamp - time of the event in the form of YYYYMMDD-HHMMSS
+    #      -label - the object's label name, ex. sylvester_face
+    #      -location - the cat's location, either IN or OUT
+    #      -source - what produced the event, ex. camera or button
+    def insert(self, timestamp, label, location, source=''):
+        with self.lock:
+            self.flush()
+            start = time.monotonic()
+            with self.conn: # Commits, or rolls back on error
+                cursor = self.conn.execute('INSERT OR IGNORE INTO events (ts, label, location, source) '
+                                           'VALUES (?, ?, ?, ?)', (to_epoch(timestamp), label, location, source))
+            write_seconds.observe(time.monotonic()-start)
+            return cursor.rowcount == 1
+
+    # Commit all pending events in one transaction
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            start = time.monotonic()
+            with self.conn: # Commits, or rolls back on error
+                self.conn.executemany('INSERT OR IGNORE INTO events (ts, label, location, source) '
+                                      'VALUES (?, ?, ?, ?)', self.pending)
+            self.pending = []
+            write_seconds.observe(time.monotonic()-start)
+
+    # Return the most recent event as (ts, label, location, source), or None if the store is empty
+    def last_event(self):
+        with self.lock:
+            self.flush()
+            return self.conn.execute('SELECT ts, label, location, source FROM events '
+                                     'ORDER BY ts DESC, id DESC LIMIT 1').fetchone()
+
+    # Return the events between two times, oldest first, as a list of (ts, label, location, source).
+    # Parameters:
+    #      -start - seconds since the epoch of the first event to include, or None for no limit
+    #      -end - seconds since the epoch after which events are excluded, or None for no limit
+    def query(self, start=None, end=None):
+        with self.lock:
+            self.flush()
+            return self.conn.execute('SELECT ts, label, location, source FROM events '
+                                     'WHERE ts >= ? AND ts < ? ORDER BY ts, id',
+                                     (start if start is not None else -2**63,
+                                      end if end is not None else 2**63-1)).fetchall()
+
+    # Return the number of events in the store
+    def count(self):
+        with self.lock:
+            self.flush()
+            return self.conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    # Commit pending events and close the database
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
+
+_store = None # Store shared by the current process, created by get_store()
+
+# Return the store shared by the current process, creating it on first use. If the store is empty,
+# the existing monthly text logs are imported into it. Pending events are committed when the process exits.
+def get_store():
+    global _store
+    if _store is None:
+        _store = EventStore()
+        if _store.count() == 0:
+            import_text_logs(_store)
+        atexit.register(_store.close)
+    return _store
+
+# Append an event to the text log of its month, ex. 202207_log.txt, in the form of
+# YYYYMMDD-HHMMSS-label-location, such as 20220729-172611-sylvester_face-IN. Parameters:
+#      -timestamp - time of the event in the form of YYYYMMDD-HHMMSS
+#      -label - the object's label name, ex. sylvester_face
+#      -location - the cat's location, either IN or OUT
+#      -directory - directory of the text logs
+def append_text_log(timestamp, label, location, directory=log_directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, timestamp[:6]+'_log.txt'), 'a') as f:
+        f.write(timestamp+'-'+label+'-'+location+'\n')
+
+# Add a single event to the shared store and, if it was not already there, to the text log. Each of the two
+# steps is retried on its own, and logging an event that is already in the store writes nothing, so
+# calling it again for the same event, ex. when the caller is retried, does not log the event twice.
+# Returns False if the event was already in the store. Parameters:
+#      -timestamp - time of the event in the form of YYYYMMDD-HHMMSS
+#      -label - the object's label name, ex. sylvester_face
+#      -location - the cat's location, either IN or OUT
+#      -source - what produced the event, ex. camera or button
+#      -retries - number of times a failed step is tried again, see ingest_pipeline.retry()
+def log_event(timestamp, label, location, source='', retries=0):
+    if not retry(get_store().insert, timestamp, label, location, source, retries=retries):
+        return False
+    retry(append_text_log, timestamp, label, location, retries=retries)
+    return True
+
+# Import the monthly YYYYMM_log.txt text logs, including the archived months (see log_archive.py), into the
+# store in a single transaction. Events that are already in the store are skipped, so running the import twice is harmless. Returns the number
+# of events read from the logs. Parameters:
+#      -store - the store to import into
+#      -log_directory - directory containing the text logs
+def import_text_logs(store, log_directory=log_directory):
+    events = []
+    for line in read_log_lines(log_directory):
+        event = parse_log_line(line)
+        if event:
+            events.append(event+('import',))
+    with store.lock:
+        store.pending.extend((to_epoch(t), label, location, source) for t, label, location, source in events)
+        store.flush()
+    return len(events)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--import-logs', action='store_true', help='import the monthly text logs')
+    parser.add_argument('--log-dir', default=log_directory, help='directory containing the text logs')
+    opt = parser.parse_args()
+    store = get_store()
+    if opt.import_logs:
+        print('Read '+str(import_text_logs(store, opt.log_dir))+' events from text logs')
+    print('Events in store: '+str(store.count()))
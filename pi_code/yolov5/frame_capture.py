@@ -0,0 +1,52 @@
+# Description: Save the frame that triggered a detection as a JPEG image, in-process, instead of taking a
+#   screenshot of the window with scrot. The frame is encoded with OpenCV, optionally downscaled, and
+#   the encoding, notification and writing to disk happen in a background thread so that the detection
+#   loop carries on straight away.
+# Date: Oct 17 2026
+
+import os
+import threading
+from pathlib import Path
+
+import cv2
+
+jpeg_quality = 85 # JPEG quality of saved frames, from 0 to 100
+max_width = 960 # Frames wider than this are downscaled before encoding, or None to keep the full size
+async_capture = True # Encode and write frames in a background thread
+
+# Encode a frame as JPEG, downscaling it first if it is wider than max_width. Returns the encoded bytes.
+# Parameters:
+#      -frame - the BGR image as a NumPy array, ex. the annotated im0 from detect.py
+#      -quality - JPEG quality, from 0 to 100
+#      -width - largest width of the encoded image, or None to keep the full size
+def encode_frame(frame, quality=jpeg_quality, width=max_width):
+    if width and frame.shape[1] > width:
+        height = round(frame.shape[0]*width/frame.shape[1])
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ok, data = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise ValueError('Could not encode frame')
+    return data.tobytes()
+
+# Encode a frame, pass the encoded image to a callback (ex. to notify the user) and write it to a file.
+# Parameters:
+#      -frame - the BGR image as a NumPy array. It must not be changed afterwards when run asynchronously.
+#      -file_path - path of the JPEG file to write
+#      -on_encoded - optional function called with the encoded bytes before they are written to disk
+#      -run_async - run in a background thread. The thread is not a daemon thread, so the process waits
+#         for it to finish before exiting and running its exit handlers.
+def save_frame(frame, file_path, on_encoded=None, run_async=async_capture):
+    def job():
+        data = encode_frame(frame)
+        if on_encoded is not None:
+            on_encoded(data)
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path+'.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path) # Never leave a half written image behind
+
+    if run_async:
+        threading.Thread(target=job, name='frame_capture').start()
+    else:
+        job()
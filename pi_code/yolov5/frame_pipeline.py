@@ -0,0 +1,277 @@
+# Description: Runs the stages of the detection loop in detect.py, either one after the other on each frame,
+#   or each on its own thread so that they overlap and the Pi's cores are used at the same time:
+#     -prepare - reads a frame from the dataset, skips it through the motion gate and converts it into an
+#        input tensor (InputBuffers), on the capture thread
+#     -infer - runs the model and NMS, on the thread that called run()
+#     -finish - draws the boxes, tracks the cat and calls find_cat(), on the postprocess thread
+#   Frames go from capture to inference through a one slot LatestQueue. For a live camera a frame that
+#   inference has not taken by the time the next one is ready is dropped, so inference always works on
+#   the newest frame instead of falling behind. Results go from inference to postprocess through a short
+#   queue that never drops, so no detection is lost; if postprocess falls behind, inference waits for it.
+# Date: Oct 17 2026
+
+import threading
+import time
+from collections import deque
+
+import torch
+
+# Raised by a stage to end the pipeline, ex. when the detector service asks the detection to stop.
+# Parameters:
+#      -result - value returned by FramePipeline.run()
+class StopPipeline(Exception):
+    def __init__(self, result=None):
+        super().__init__(result)
+        self.result = result
+
+# Raised by LatestQueue.get() once the queue is closed and empty
+class QueueClosed(Exception):
+    pass
+
+# Queue handing items from one thread to another. Parameters:
+#      -maxsize - number of items the queue holds
+#      -drop - when full, drop the oldest item to make room (latest wins), or else make put() wait
+class LatestQueue:
+    def __init__(self, maxsize=1, drop=True):
+        self.maxsize = maxsize
+        self.drop = drop
+        self.items = deque()
+        self.closed = False
+        self.condition = threading.Condition()
+
+    # Add an item. Returns the item dropped to make room for it, the item itself if the queue is closed,
+    # or None. Parameters:
+    #      -item - the item
+    def put(self, item):
+        with self.condition:
+            while not self.drop and len(self.items) >= self.maxsize and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return item
+            dropped = self.items.popleft() if len(self.items) >= self.maxsize else None
+            self.items.append(item)
+            self.condition.notify_all()
+            return dropped
+
+    # Return the oldest item, waiting for one if the queue is empty. Raises QueueClosed once the queue is
+    # closed and empty.
+    def get(self):
+        with self.condition:
+            while not self.items:
+                if self.closed:
+                    raise QueueClosed()
+                self.condition.wait()
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    # Stop taking items. Items already queued can still be read unless discarded. Returns the discarded
+    # items. Parameters:
+    #      -discard - remove the queued items
+    def close(self, discard=False):
+        with self.condition:
+            self.closed = True
+            discarded = list(self.items) if discard else []
+            if discard:
+                self.items.clear()
+            self.condition.notify_all()
+            return discarded
+
+# Pool of preallocated input tensors, reused from frame to frame instead of creating new ones. A tensor
+# taken by fill() goes back to the pool with release(). Parameters:
+#      -device - device of the model
+#      -half - use FP16 tensors instead of FP32
+class InputBuffers:
+    def __init__(self, device, half=False):
+        self.device = device
+        self.dtype = torch.float16 if half else torch.float32
+        self.free = {} # List of free tensors of each shape
+        self.lock = threading.Lock()
+        self.allocated = 0
+
+    # Return a tensor holding a frame scaled from 0 - 255 to 0.0 - 1.0, with a batch dimension.
+    # Parameters:
+    #      -im - the frame(s) as a uint8 NumPy array, CHW or BCHW
+    def fill(self, im):
+        shape = im.shape if im.ndim == 4 else (1, *im.shape)
+        with self.lock:
+            free = self.free.get(shape)
+            buffer = free.pop() if free else None
+        if buffer is None:
+            buffer = torch.empty(shape, dtype=self.dtype, device=self.device)
+            self.allocated += 1
+        buffer.copy_(torch.from_numpy(im).reshape(shape)) # uint8 to fp16/32
+        return buffer.div_(255) # 0 - 255 to 0.0 - 1.0
+
+    # Give a tensor back to the pool once the model is done with it. Parameters:
+    #      -buffer - a tensor returned by fill()
+    def release(self, buffer):
+        with self.lock:
+            self.free.setdefault(tuple(buffer.shape), []).append(buffer)
+
+# Runs frames through the prepare, infer and finish stages. Parameters:
+#      -prepare - function called with each item of the dataset, returning the prepared frame, or None to
+#         skip the frame
+#      -infer - function called with each prepared frame, returning its result
+#      -finish - function called with each result, returning None to carry on, or a value to end with
+#      -threaded - run prepare and finish on their own threads, overlapping with infer
+#      -drop - when threaded, drop frames that infer has not taken by the time the next one is ready.
+#         Should be True for live cameras and False for files, where every frame counts.
+#      -depth - number of results that can wait for finish before infer waits
+#      -on_drop - function called with each prepared frame that is dropped, ex. to release its tensor
+class FramePipeline:
+    def __init__(self, prepare, infer, finish, threaded=False, drop=True, depth=2, on_drop=None):
+        self.prepare = prepare
+        self.infer = infer
+        self.finish = finish
+        self.threaded = threaded
+        self.drop = drop
+        self.depth = depth
+        self.on_drop = on_drop
+        self.stats = {'frames': 0, 'skipped': 0, 'dropped': 0, 'inferred': 0, 'finished': 0}
+        self.busy = {'prepare': 0.0, 'infer': 0.0, 'finish': 0.0} # Seconds spent in each stage
+        self.elapsed = 0.0
+
+    # Call a stage and add the time it took to its busy time. Returns what the stage returned. Parameters:
+    #      -stage - name of the stage
+    #      -item - argument of the stage
+    def call(self, stage, item):
+        start = time.perf_counter()
+        try:
+            return getattr(self, stage)(item)
+        finally:
+            self.busy[stage] += time.perf_counter() - start
+
+    # Run the frames through the stages until they run out or a stage ends the pipeline. Returns the value
+    # the pipeline ended with, or None if the frames ran out. Parameters:
+    #      -frames - iterable of dataset items
+    def run(self, frames):
+        start = time.perf_counter()
+        try:
+            return self.run_threaded(frames) if self.threaded else self.run_inline(frames)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    # Run each frame through all the stages before reading the next
+    def run_inline(self, frames):
+        try:
+            for item in frames:
+                self.stats['frames'] += 1
+                prepared = self.call('prepare', item)
+                if prepared is None:
+                    self.stats['skipped'] += 1
+                    continue
+                result = self.call('infer', prepared)
+                self.stats['inferred'] += 1
+                value = self.call('finish', result)
+                self.stats['finished'] += 1
+                if value is not None:
+                    return value
+        except StopPipeline as e:
+            return e.result
+        return None
+
+    # Run prepare and finish on their own threads, and infer on this one
+    def run_threaded(self, frames):
+        self.result, self.error = None, None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.prepared = LatestQueue(1, drop=self.drop)
+        self.results = LatestQueue(self.depth, drop=False)
+        capture = threading.Thread(target=self.capture, args=(frames,), name='capture', daemon=True)
+        postprocess = threading.Thread(target=self.postprocess, name='postprocess', daemon=True)
+        capture.start()
+        postprocess.start()
+        try:
+            while True:
+                try:
+                    prepared = self.prepared.get()
+                except QueueClosed:
+                    break
+                result = self.call('infer', prepared)
+                self.stats['inferred'] += 1
+                self.results.put(result)
+        except BaseException as e:
+            self.end(error=e)
+        finally:
+            self.results.close() # postprocess finishes the results already queued, unless ended
+            postprocess.join()
+            self.end()
+            capture.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    # Read and prepare frames until they run out or the pipeline ends. Runs on the capture thread.
+    def capture(self, frames):
+        try:
+            for item in frames:
+                if self.stopping.is_set():
+                    break
+                self.stats['frames'] += 1
+                prepared = self.call('prepare', item)
+                if prepared is None:
+                    self.stats['skipped'] += 1
+                    continue
+                dropped = self.prepared.put(prepared)
+                if dropped is not None:
+                    if dropped is not prepared:
+                        self.stats['dropped'] += 1
+                    self.release(dropped)
+        except StopPipeline as e:
+            self.end(e.result)
+        except BaseException as e:
+            self.end(error=e)
+        finally:
+            self.prepared.close() # infer finishes the frame already queued, unless ended
+
+    # Finish results until they run out or the pipeline ends. Runs on the postprocess thread.
+    def postprocess(self):
+        try:
+            while True:
+                try:
+                    result = self.results.get()
+                except QueueClosed:
+                    break
+                value = self.call('finish', result)
+                self.stats['finished'] += 1
+                if value is not None:
+                    self.end(value)
+                    break
+        except StopPipeline as e:
+            self.end(e.result)
+        except BaseException as e:
+            self.end(error=e)
+
+    # End the pipeline: stop reading frames and discard the frames and results still queued. Only the
+    # first result or error is kept. Parameters:
+    #      -result - value for run() to return
+    #      -error - exception for run() to raise
+    def end(self, result=None, error=None):
+        with self.lock:
+            if not self.stopping.is_set():
+                self.result, self.error = result, error
+                self.stopping.set()
+        for prepared in self.prepared.close(discard=True):
+            self.release(prepared)
+        self.results.close(discard=True)
+
+    # Hand a prepared frame that will not be inferred to on_drop
+    def release(self, prepared):
+        if self.on_drop is not None:
+            self.on_drop(prepared)
+
+    # Return a copy of the counters, with the frames per second and the time spent in each stage
+    def get_stats(self):
+        stats = dict(self.stats)
+        if self.elapsed:
+            stats['fps'] = round(self.stats['inferred']/self.elapsed, 2)
+            stats['busy'] = {stage: round(seconds/self.elapsed, 2) for stage, seconds in self.busy.items()}
+        return stats
+
+    # Return the counters as a string for logging
+    def summary(self):
+        stats = self.get_stats()
+        busy = ', '.join(f'{stage} {share:.0%}' for stage, share in stats.get('busy', {}).items())
+        return (f"{stats['inferred']}/{stats['frames']} frames inferred ({stats['skipped']} skipped, "
+                f"{stats['dropped']} dropped), {stats.get('fps', 0)} fps, busy: {busy or 'n/a'}")
@@ -0,0 +1,197 @@
+# Description: Queue based pipeline for handling incoming events off the thread that received them, so
+#   that a slow consumer (such as a Telegram request) cannot hold up the MQTT network loop.
+#     -retry() - call a function, trying again with a growing delay if it raises
+#     -Worker - a thread that takes items from a bounded queue and passes them to a handler, retrying
+#        failed items with retry()
+#     -IngestPipeline - hands every submitted event to each of its workers, and keeps counters of what
+#        was queued, processed, retried, failed and dropped, the queue depths, the latency of each stage
+#        and the callback latency
+#   The callback only puts events on the queues, which never blocks: if a queue is full the event is
+#   dropped for that worker and counted, rather than stalling the caller.
+# Date: Oct 17 2026
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# Time taken by the callbacks that submit events, see metrics.py
+callback_seconds = metrics.histogram('pipeline_callback_seconds', 'Time taken by the callback that submitted an event')
+
+# Call a function, trying it again if it raises. Only the call that failed is repeated, so a handler made of
+# several steps can retry each step on its own rather than be retried as a whole, which would repeat the
+# steps that had already succeeded. Returns the function's result, or raises the last error once all
+# retries have failed. Parameters:
+#      -fn - the function to call
+#      -args - arguments for the function
+#      -retries - number of times the call is tried again
+#      -retry_delay - seconds to wait before the first retry, doubled for each further retry
+#      -on_retry - optional function called with the error before each retry
+def retry(fn, *args, retries=3, retry_delay=1.0, on_retry=None):
+    for attempt in range(retries+1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(retry_delay*2**attempt)
+
+# Thread that passes the items in its queue to a handler, used by IngestPipeline and by the supervisor's
+# event bus (see event_bus.py). Besides its counters, it keeps the latency of each stage of an item:
+#      -queue - from the item being queued to its handler starting
+#      -handler - time spent in the handler, including retries
+#      -total - from the item being queued to its handler finishing
+# Parameters:
+#      -name - name of the worker, used in the counters
+#      -handler - function called with the parts of each item
+#      -maxsize - number of items the queue can hold before new items are dropped
+#      -retries - number of times a failed item is tried again. Handlers that write in several steps should
+#         retry each step with retry() instead, and be given 0
+#      -retry_delay - seconds to wait before the first retry, doubled for each further retry
+class Worker:
+    def __init__(self, name, handler, maxsize=100, retries=3, retry_delay=2.0):
+        self.name = name
+        self.handler = handler
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'processed': 0, 'retries': 0, 'failed': 0, 'dropped': 0, 'max_depth': 0}
+        self.latencies = {stage: deque(maxlen=1000) for stage in ('queue', 'handler', 'total')}
+        self.histograms = {stage: metrics.histogram('pipeline_stage_seconds', 'Latency of each stage of a worker',
+                                                    {'worker': name, 'stage': stage}) for stage in self.latencies}
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        metrics.gauge('pipeline_queue_depth', 'Events waiting in a worker queue', {'worker': name}, fn=self.queue.qsize)
+
+    def start(self):
+        self.thread.start()
+
+    # Add an item to the queue without blocking. Returns False if the queue was full and the item was
+    # dropped. Parameters:
+    #      -item - tuple of arguments for the handler
+    #      -created - monotonic time the item's latency is measured from, or None for now
+    def put(self, item, created=None):
+        try:
+            self.queue.put_nowait((created if created is not None else time.monotonic(), item))
+        except queue.Full:
+            self.count('dropped')
+            return False
+        with self.lock:
+            self.stats['enqueued'] += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], self.queue.qsize())
+        return True
+
+    # Pass items to the handler until stop() is called
+    def run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None: # Sentinel put on the queue by stop()
+                break
+            created, item = entry
+            start = time.monotonic()
+            try:
+                retry(self.handler, *item, retries=self.retries, retry_delay=self.retry_delay,
+                      on_retry=lambda e: self.count('retries'))
+                self.count('processed')
+            except Exception as e:
+                self.count('failed')
+                print(self.name+' failed: '+repr(e))
+            end = time.monotonic()
+            self.record('queue', start-created)
+            self.record('handler', end-start)
+            self.record('total', end-created)
+
+    # Add one to a counter. Parameters:
+    #      -name - the counter, ex. processed
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    # Record the latency of a stage. Parameters:
+    #      -stage - queue, handler or total
+    #      -seconds - the latency
+    def record(self, stage, seconds):
+        with self.lock:
+            self.latencies[stage].append(seconds)
+        self.histograms[stage].observe(seconds)
+
+    # Stop the worker once the items already queued are handled. Returns False if it did not finish
+    # within the timeout. Parameters:
+    #      -timeout - seconds to wait for the worker to finish
+    def stop(self, timeout=None):
+        self.queue.put(None)
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    # Return a copy of the counters, with the current queue depth and the latency percentiles of each stage
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, depth=self.queue.qsize())
+            latencies = {stage: list(seconds) for stage, seconds in self.latencies.items()}
+        for stage, seconds in latencies.items():
+            summary = metrics.percentiles(seconds)
+            if summary:
+                stats[stage+'_ms'] = summary
+        return stats
+
+# Hands every submitted event to each of its workers
+class IngestPipeline:
+    def __init__(self):
+        self.workers = []
+        self.latencies = deque(maxlen=1000) # Most recent callback latencies in seconds
+        self.lock = threading.Lock()
+
+    # Add a worker that handles every event. Returns the worker. Parameters:
+    #      -name - name of the worker
+    #      -handler - function called with the parts of each event
+    #      -kwargs - maxsize, retries and retry_delay, see Worker
+    def add_worker(self, name, handler, **kwargs):
+        worker = Worker(name, handler, **kwargs)
+        self.workers.append(worker)
+        return worker
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    # Stop all workers once their queued events are handled. Parameters:
+    #      -timeout - seconds to wait for each worker to finish
+    def stop(self, timeout=None):
+        for worker in self.workers:
+            worker.stop(timeout)
+
+    # Queue an event for every worker. Never blocks. Parameters:
+    #      -event - the parts of the event, passed to each worker's handler
+    def submit(self, *event):
+        for worker in self.workers:
+            worker.put(event)
+
+    # Record how long the callback that submitted an event took. Parameters:
+    #      -seconds - the callback's duration
+    def record_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+        callback_seconds.observe(seconds)
+
+    # Return the counters of every worker, and the callback latency percentiles in milliseconds
+    def get_stats(self):
+        stats = {'workers': {worker.name: worker.get_stats() for worker in self.workers}}
+        with self.lock:
+            latencies = list(self.latencies)
+        if latencies:
+            stats['callback_ms'] = metrics.percentiles(latencies)
+        return stats
+
+    # Print the counters as JSON every interval seconds, from a background thread. Parameters:
+    #      -interval - seconds between reports
+    def report_every(self, interval):
+        def report():
+            while True:
+                time.sleep(interval)
+                print(json.dumps(self.get_stats()))
+        threading.Thread(target=report, name='report', daemon=True).start()
@@ -0,0 +1,108 @@
+# Description: Compressed archives of the monthly YYYYMM_log.txt text logs. Once a month is over, its log
+#   is compacted (blank and repeated lines removed, lines sorted by time) into a gzip file in
+#   data/logs/archive/, and an index (archive/index.json) records each archive's month, first and last
+#   timestamps and number of lines, so that readers can pick the months they need without opening every
+#   file. read_log_lines() returns the lines of the plain and the archived logs alike, so the readers of
+#   the logs (event_store.py and analytics.py) do not need to know which months were archived. The text
+#   logs are written next to the event store by event_store.log_event(), so a new month is closed and
+#   compacted every month; events.db itself is left whole, as it is what the code queries. Compacting is
+#   run by the maintenance job in retention.py. Uses only the standard library.
+# Date: Oct 17 2026
+
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+
+cwd = os.getcwd() # Current working directory
+
+log_directory = cwd+'/data/logs/' # Directory of the monthly text logs
+index_name = 'index.json' # Index of the archives, in the archive directory
+
+# Return the archive directory of a log directory
+def archive_directory_of(directory):
+    return os.path.join(directory, 'archive')
+
+# Write bytes to a file by writing a temporary file and renaming it over the original, so that the file
+# holds either its old or its new contents even if power is lost. Parameters:
+#      -path - the file to write
+#      -data - the bytes to write
+def write_atomic(path, data):
+    tmp_path = path+'.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# Return the index of the archives in a log directory, as a dict of month (YYYYMM) to its entry
+def read_index(directory=log_directory):
+    try:
+        with open(os.path.join(archive_directory_of(directory), index_name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# Return the lines of an archive. Parameters:
+#      -path - the archive's path
+def read_archive(path):
+    with gzip.open(path, 'rt') as f:
+        return f.read().splitlines()
+
+# Compact a month's text log into its archive, merged with the archive if the month was already archived,
+# and delete the text log once the archive is written and read back. Returns the index entry of the
+# archive, or None if the log was empty. Parameters:
+#      -path - the month's text log, ex. data/logs/202208_log.txt
+def compact_month(path):
+    path = Path(path)
+    month = path.name[:6]
+    archive_directory = archive_directory_of(path.parent)
+    os.makedirs(archive_directory, exist_ok=True)
+    archive_path = os.path.join(archive_directory, path.name+'.gz')
+    lines = {line.strip() for line in path.read_text().splitlines() if line.strip()}
+    if os.path.exists(archive_path):
+        lines.update(read_archive(archive_path))
+    if not lines: # Nothing to keep
+        path.unlink()
+        return None
+    lines = sorted(lines) # Lines start with YYYYMMDD-HHMMSS, so this is by time
+    text = '\n'.join(lines)+'\n'
+    data = gzip.compress(text.encode(), 9)
+    write_atomic(archive_path, data)
+    if '\n'.join(read_archive(archive_path))+'\n' != text:
+        raise IOError('Archive of '+path.name+' did not read back the same')
+
+    entry = {'file': path.name+'.gz', 'first': lines[0][:15], 'last': lines[-1][:15], 'lines': len(lines),
+             'bytes': len(data), 'source_bytes': path.stat().st_size, 'compacted': time.strftime("%Y%m%d-%H%M%S")}
+    index = read_index(path.parent)
+    index[month] = entry
+    write_atomic(os.path.join(archive_directory, index_name), json.dumps(index, indent=1, sort_keys=True).encode())
+    path.unlink()
+    return entry
+
+# Compact the text logs of the months before the current one. Returns the index entries of the archives
+# written. Parameters:
+#      -directory - directory of the text logs
+#      -now - seconds since the epoch, or None for now
+def compact_closed_months(directory=log_directory, now=None):
+    current = time.strftime("%Y%m", time.localtime(now))
+    entries = [compact_month(path) for path in sorted(Path(directory).glob('*_log.txt')) if path.name[:6] < current]
+    return [entry for entry in entries if entry is not None]
+
+# Return the lines of the monthly logs, from the archives and the text logs, oldest month first. Archives
+# outside the months asked for are skipped using the index, without being opened, and archives in the
+# index that no longer exist are skipped. Parameters:
+#      -directory - directory of the text logs
+#      -first_month - first month (YYYYMM) to read, or None to start from the first
+#      -last_month - last month (YYYYMM) to read, or None to read up to the last
+def read_log_lines(directory=log_directory, first_month=None, last_month=None):
+    wanted = lambda month: (first_month is None or month >= first_month) and (last_month is None or month <= last_month)
+    sources = [(month, os.path.join(archive_directory_of(directory), entry['file']))
+               for month, entry in read_index(directory).items() if wanted(month)]
+    sources = [(month, path) for month, path in sources if os.path.exists(path)]
+    sources += [(path.name[:6], str(path)) for path in Path(directory).glob('*_log.txt') if wanted(path.name[:6])]
+    lines = []
+    for month, path in sorted(sources):
+        lines += read_archive(path) if path.endswith('.gz') else Path(path).read_text().splitlines()
+    return lines
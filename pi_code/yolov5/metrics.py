@@ -0,0 +1,240 @@
+# Description: Shared counters, gauges and histograms for the detector, the MQTT listener, the notifier and
+#   the supervisor. Modules create their metrics when imported and update them as they run. Nothing is
+#   recorded until enable() is called, so when metrics are off an update is a single flag check. Once
+#   enabled, the metrics can be read as:
+#     -Prometheus text format from a local HTTP endpoint, http://127.0.0.1:<port>/metrics, or as JSON
+#        from /metrics.json
+#     -a JSON snapshot written every interval seconds to a file, or printed if no file is given
+# Date: Oct 17 2026
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+enabled = False # Set by enable()
+lock = threading.Lock() # Held while updating or reading any metric
+registry = {} # Metrics by (name, labels)
+
+# Default histogram buckets, in seconds
+buckets_seconds = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Base of the metric types. Parameters:
+#      -name - metric name, ex. detect_inference_seconds
+#      -help - one line description
+#      -labels - dict of label names and values, ex. {'worker': 'log'}, or None
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+
+    # Return the labels in Prometheus format, with extra labels added
+    def label_text(self, **extra):
+        labels = dict(self.labels, **extra)
+        if not labels:
+            return ''
+        return '{'+','.join(f'{k}="{v}"' for k, v in labels.items())+'}'
+
+# Value that only goes up, ex. number of frames
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=None):
+        super().__init__(name, help, labels)
+        self.value = 0
+
+    def inc(self, amount=1):
+        if not enabled:
+            return
+        with lock:
+            self.value += amount
+
+    def lines(self):
+        return [f'{self.name}{self.label_text()} {self.value}']
+
+    def snapshot(self):
+        return self.value
+
+# Value that goes up and down, ex. frames per second. Parameters:
+#      -fn - optional function returning the current value when read, ex. a queue's depth
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=None, fn=None):
+        super().__init__(name, help, labels)
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        if not enabled:
+            return
+        with lock:
+            self.value = value
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def lines(self):
+        return [f'{self.name}{self.label_text()} {self.get()}']
+
+    def snapshot(self):
+        return self.get()
+
+# Distribution of values, ex. durations in seconds, counted in buckets. Parameters:
+#      -buckets - upper bounds of the buckets, in increasing order
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=None, buckets=buckets_seconds):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets)+1) # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        if not enabled:
+            return
+        with lock:
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    # Return the upper bound of the bucket holding the given fraction of the values, ex. 0.99 for p99
+    def quantile(self, fraction):
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets+(float('inf'),), self.counts):
+            seen += count
+            if seen >= fraction*self.count:
+                return bound
+        return float('inf')
+
+    def lines(self):
+        lines, total = [], 0
+        for bound, count in zip(self.buckets+(float('inf'),), self.counts):
+            total += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{self.name}_bucket{self.label_text(le=le)} {total}')
+        lines.append(f'{self.name}_sum{self.label_text()} {self.sum}')
+        lines.append(f'{self.name}_count{self.label_text()} {self.count}')
+        return lines
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': round(self.sum, 6),
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+# Return the p50, p99 and max of durations in milliseconds, or None if there are none. Used for the exact
+# percentiles of recent durations kept by the pipeline workers and the benchmarks. Parameters:
+#      -seconds - the durations in seconds
+def percentiles(seconds):
+    values = sorted(seconds)
+    if not values:
+        return None
+    return {
+        'p50': round(values[len(values)//2]*1E3, 3),
+        'p99': round(values[min(len(values)-1, int(len(values)*0.99))]*1E3, 3),
+        'max': round(values[-1]*1E3, 3),
+    }
+
+# Return the metric registered under a name and labels, creating it on first use
+def get_metric(cls, name, help, labels=None, **kwargs):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with lock:
+        if key not in registry:
+            registry[key] = cls(name, help, labels, **kwargs)
+        return registry[key]
+
+def counter(name, help, labels=None):
+    return get_metric(Counter, name, help, labels)
+
+def gauge(name, help, labels=None, fn=None):
+    metric = get_metric(Gauge, name, help, labels, fn=fn)
+    if fn is not None:
+        metric.fn = fn # Read the newest source, ex. the queue of a worker created again
+    return metric
+
+def histogram(name, help, labels=None, buckets=buckets_seconds):
+    return get_metric(Histogram, name, help, labels, buckets=buckets)
+
+# Return every metric in the Prometheus text format
+def render():
+    lines, described = [], set()
+    with lock:
+        for metric in sorted(registry.values(), key=lambda m: m.name):
+            if metric.name not in described:
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                described.add(metric.name)
+            lines.extend(metric.lines())
+    return '\n'.join(lines)+'\n'
+
+# Return every metric as a dict of name, with labels if any, to value
+def snapshot():
+    with lock:
+        return {m.name+m.label_text(): m.snapshot() for m in registry.values()}
+
+# Answers /metrics in the Prometheus text format, and /metrics.json as JSON
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            data, content_type = render().encode(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            data, content_type = json.dumps(snapshot()).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+# Start recording metrics, and optionally serve them and write snapshots. Parameters:
+#      -port - port of the local HTTP endpoint, or None for no endpoint
+#      -interval - seconds between JSON snapshots, or None for no snapshots
+#      -path - file the snapshots are written to, replacing the previous one, or None to print them
+def enable(port=None, interval=None, path=None):
+    global enabled
+    enabled = True
+    if port:
+        server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    if interval:
+        def report():
+            while True:
+                time.sleep(interval)
+                data = json.dumps(dict(snapshot(), time=time.strftime("%Y%m%d-%H%M%S")))
+                if path is None:
+                    print(data)
+                    continue
+                with open(path+'.tmp', 'w') as f:
+                    f.write(data+'\n')
+                os.replace(path+'.tmp', path)
+        threading.Thread(target=report, name='metrics_report', daemon=True).start()
+
+# Add the metrics arguments to a command line parser. Parameters:
+#      -parser - the argparse.ArgumentParser
+def add_arguments(parser):
+    parser.add_argument('--metrics-port', type=int, default=0, help='serve metrics on this local port, 0 for no')
+    parser.add_argument('--metrics-interval', type=float, default=0, help='seconds between metrics snapshots, 0 for never')
+    parser.add_argument('--metrics-file', default=None, help='file to write metrics snapshots to, default prints them')
+
+# Enable the metrics if asked to by the arguments added by add_arguments(), and remove those arguments
+# from the parsed options. Parameters:
+#      -opt - the parsed options
+def enable_from(opt):
+    if opt.metrics_port or opt.metrics_interval:
+        enable(opt.metrics_port, opt.metrics_interval, opt.metrics_file)
+    del opt.metrics_port, opt.metrics_interval, opt.metrics_file
@@ -0,0 +1,81 @@
+# Description: Cheap pre-filter that decides whether a frame is worth running through the YOLOv5 model.
+#   Frames are downscaled by taking every n-th pixel, converted to grayscale and compared against a running
+#   average of the background, all as whole-array NumPy operations. Inference is skipped when too few pixels
+#   changed, and is also limited to a maximum rate. So that a cat sitting still in front of the camera is
+#   not missed, a frame is still inferred every keepalive seconds even if nothing moved.
+# Date: Oct 17 2026
+
+import time
+
+import numpy as np
+
+# Decides which frames to run inference on, and counts frames seen vs. frames inferred. Parameters:
+#      -enabled - skip frames where nothing moved. If False, only the maximum rate applies.
+#      -max_rate - most inferences per second, or 0 for no limit
+#      -step - only every step-th pixel in each direction is compared
+#      -pixel_threshold - change in a pixel's gray level (0-255) that counts as movement
+#      -min_changed - fraction of pixels that must change for the frame to be inferred
+#      -alpha - how quickly the background follows the scene, from 0 to 1
+#      -keepalive - seconds after which a frame is inferred even if nothing moved, or 0 for never
+class MotionGate:
+    def __init__(self, enabled=True, max_rate=0.0, step=8, pixel_threshold=25, min_changed=0.01, alpha=0.1,
+                 keepalive=2.0):
+        self.enabled = enabled
+        self.min_interval = 1/max_rate if max_rate else 0.0
+        self.step = step
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.alpha = alpha
+        self.keepalive = keepalive
+        self.background = None # Running average of the downscaled grayscale frames
+        self.last_inference = None # Monotonic time of the last inferred frame
+        self.stats = {'frames_seen': 0, 'frames_inferred': 0, 'skipped_static': 0, 'skipped_rate': 0}
+
+    # Change the maximum rate, ex. for the duty cycle mode of a detection, see duty_cycle.py. Parameters:
+    #      -max_rate - most inferences per second, or 0 for no limit
+    def set_rate(self, max_rate):
+        self.min_interval = 1/max_rate if max_rate else 0.0
+
+    # Forget the background, ex. when the camera starts again after a pause
+    def reset(self):
+        self.background = None
+        self.last_inference = None
+
+    # Return the fraction of pixels that changed against the background, per image, and update the background.
+    # Parameters:
+    #      -im - batch of images as a uint8 NumPy array of shape (batch, 3, height, width), or a single
+    #         image of shape (3, height, width), as produced by the YOLOv5 dataloaders
+    def motion(self, im):
+        small = im[..., ::self.step, ::self.step] # View of every step-th pixel, no copy
+        gray = small.mean(axis=-3, dtype=np.float32) # Average of the color channels
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            return np.ones(gray.shape[:-2])
+        changed = np.abs(gray-self.background) > self.pixel_threshold
+        self.background += self.alpha*(gray-self.background)
+        return changed.mean(axis=(-2, -1))
+
+    # Return True if the model should be run on this frame. Parameters:
+    #      -im - the frame(s), see motion()
+    def should_infer(self, im):
+        self.stats['frames_seen'] += 1
+        now = time.monotonic()
+        since_last = now-self.last_inference if self.last_inference is not None else float('inf')
+        if since_last < self.min_interval:
+            self.stats['skipped_rate'] += 1
+            return False
+        if self.enabled:
+            moved = bool(np.any(self.motion(im) >= self.min_changed))
+            if not moved and not (self.keepalive and since_last >= self.keepalive):
+                self.stats['skipped_static'] += 1
+                return False
+        self.stats['frames_inferred'] += 1
+        self.last_inference = now
+        return True
+
+    # Return the counters as a string, ex. for logging at the end of a detection
+    def summary(self):
+        seen = self.stats['frames_seen']
+        inferred = self.stats['frames_inferred']
+        return (f"{seen} frames seen, {inferred} inferred ({100*inferred/max(seen, 1):.0f}%), "
+                f"{self.stats['skipped_static']} skipped as static, {self.stats['skipped_rate']} skipped by rate")
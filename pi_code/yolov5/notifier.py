@@ -0,0 +1,186 @@
+# Description: Shared Telegram notifier used by cat_detection.py and run_mqtt.py. Keeps a single bot, and
+#   so a single connection pool, for the life of the process, and sends messages from a background thread:
+#     -a message with an image is sent as one photo with the text as its caption
+#     -the first message from a source (ex. the door buttons or the camera) is sent straight away. Further
+#        messages from the same source within debounce seconds are coalesced and only the latest is sent
+#        once the debounce time has passed, so a burst of IN/OUT messages results in one more notification
+#        of where the cat ended up. Messages from different sources, and messages with and without an
+#        image, are never coalesced, so a detection photo is not replaced by a later text message.
+#     -sends are spaced at least min_interval seconds apart and limited to max_per_minute per minute,
+#        per Telegram's limits, and a RetryAfter reply from Telegram is waited out before retrying
+#   Set the TELEGRAM_BASE_URL environment variable, ex. http://127.0.0.1:8081/bot, to send requests to a
+#   local fake endpoint instead of the Telegram API for testing and benchmarks.
+#
+# Adapted from Python Telegram Bot API:
+# https://github.com/python-telegram-bot/python-telegram-bot/wiki/Introduction-to-the-API
+# Date: Oct 17 2026
+
+import atexit
+import io
+import os
+import threading
+import time
+from collections import deque
+
+import telegram
+from telegram.error import RetryAfter, TelegramError
+from telegram.utils.request import Request
+import metrics
+# Import variables from credentials.py
+from credentials import TELEGRAM_BOT, TELEGRAM_CHAT
+
+# Base URL of the Telegram API, or None for the default
+base_url = os.environ.get('TELEGRAM_BASE_URL')
+
+# Metrics of the sends, see metrics.py
+latency_seconds = metrics.histogram('notification_latency_seconds', 'Time from a message being queued to it being sent')
+sent_total = metrics.counter('notifications_total', 'Messages sent to Telegram', {'result': 'sent'})
+failed_total = metrics.counter('notifications_total', 'Messages sent to Telegram', {'result': 'failed'})
+
+# Sends messages to a Telegram chat from a background thread. Parameters:
+#      -token - the bot's access token
+#      -chat_id - the chat or channel to send to
+#      -base_url - base URL of the Telegram API, or None for the default
+#      -debounce - seconds after a message from a source during which further messages from it are
+#         coalesced, and only the latest is sent
+#      -min_interval - least number of seconds between two sends
+#      -max_per_minute - most sends in any minute
+#      -retries - number of times a failed send is tried again
+class Notifier:
+    def __init__(self, token=TELEGRAM_BOT, chat_id=TELEGRAM_CHAT, base_url=base_url, debounce=5.0,
+                 min_interval=1.0, max_per_minute=20, retries=3):
+        # One bot with a small connection pool, reused for every message
+        self.bot = telegram.Bot(token, base_url=base_url, request=Request(con_pool_size=2))
+        self.chat_id = chat_id
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.max_per_minute = max_per_minute
+        self.retries = retries
+
+        self.cond = threading.Condition()
+        # Latest [text, image, time queued, time to send, held back by the rate limit] waiting to be sent, by key
+        self.pending = {}
+        self.last_sent = {} # Monotonic time the last message of each key was sent
+        self.sending = False
+        self.send_times = deque() # Monotonic times of the sends in the last minute
+        self.stats = {'requested': 0, 'coalesced': 0, 'sent': 0, 'failed': 0, 'rate_limited': 0}
+        threading.Thread(target=self.run, name='notifier', daemon=True).start()
+
+    # Queue a message to be sent, replacing the message of the same source still waiting, if any. Does not
+    # block. Parameters:
+    #      -text - the message text
+    #      -image - optional image, either the path of an image file or the encoded image bytes
+    #      -source - what the message is about, ex. 'door' or 'camera'
+    def send(self, text, image=None, source=None):
+        key = (source, image is not None)
+        now = time.monotonic()
+        with self.cond:
+            self.stats['requested'] += 1
+            limited = False
+            if key in self.pending:
+                self.stats['coalesced'] += 1
+                deadline, limited = self.pending[key][3], self.pending[key][4]
+            else: # Straight away, unless one was sent within the debounce time
+                deadline = max(now, self.last_sent.get(key, now-self.debounce)+self.debounce)
+            self.pending[key] = [text, image, now, deadline, limited]
+            self.cond.notify_all()
+
+    # Send any waiting messages straight away and wait until they have been sent. Returns False if they were
+    # not sent within the timeout. Parameters:
+    #      -timeout - seconds to wait
+    def flush(self, timeout=10.0):
+        with self.cond:
+            for message in self.pending.values():
+                message[3] = 0.0
+            self.cond.notify_all()
+            return self.cond.wait_for(lambda: not self.pending and not self.sending, timeout)
+
+    # Return the number of seconds to wait before the next send is allowed. Called with the lock held.
+    def rate_wait(self):
+        now = time.monotonic()
+        while self.send_times and now - self.send_times[0] >= 60:
+            self.send_times.popleft()
+        if len(self.send_times) >= self.max_per_minute:
+            return self.send_times[0]+60-now
+        if self.send_times and now - self.send_times[-1] < self.min_interval:
+            return self.send_times[-1]+self.min_interval-now
+        return 0
+
+    # Wait for messages and send each one once its debounce time has passed, the earliest first. A message
+    # that the rate limit holds back for longer than its debounce time is counted as rate limited once,
+    # however many times the wait is woken early.
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending)
+                key = min(self.pending, key=lambda k: self.pending[k][3])
+                message = self.pending[key]
+                debounce_wait = message[3]-time.monotonic()
+                rate_wait = self.rate_wait()
+                if rate_wait > 0 and rate_wait > debounce_wait and not message[4]:
+                    message[4] = True
+                    self.stats['rate_limited'] += 1
+                wait = max(debounce_wait, rate_wait)
+                if wait > 0:
+                    self.cond.wait(wait) # Woken early by send() or flush(), so check again
+                    continue
+                text, image, requested, _, _ = self.pending.pop(key)
+                self.sending = True
+            try:
+                if self.deliver(text, image):
+                    latency_seconds.observe(time.monotonic()-requested)
+            except Exception as e: # Any other error, ex. a bad image path, must not stop later messages
+                print('Notification failed: '+repr(e))
+                with self.cond:
+                    self.stats['failed'] += 1
+                failed_total.inc()
+            finally:
+                with self.cond:
+                    self.sending = False
+                    self.last_sent[key] = time.monotonic()
+                    self.send_times.append(time.monotonic())
+                    self.cond.notify_all()
+
+    # Send a message, with its image as a single captioned photo, retrying on errors. Returns True if it was
+    # sent. Parameters:
+    #      -text - the message text
+    #      -image - optional image, either the path of an image file or the encoded image bytes
+    def deliver(self, text, image):
+        for attempt in range(self.retries+1):
+            try:
+                if image is None:
+                    self.bot.send_message(text=text, chat_id=self.chat_id)
+                else:
+                    with (io.BytesIO(image) if isinstance(image, bytes) else open(image, 'rb')) as photo:
+                        self.bot.send_photo(photo=photo, caption=text, chat_id=self.chat_id)
+                with self.cond:
+                    self.stats['sent'] += 1
+                sent_total.inc()
+                return True
+            except RetryAfter as e: # Telegram's rate limit was hit, so wait as long as it asks
+                with self.cond:
+                    self.stats['rate_limited'] += 1
+                time.sleep(e.retry_after)
+            except (TelegramError, OSError) as e:
+                print('Notification failed: '+repr(e))
+                time.sleep(2**attempt)
+        with self.cond:
+            self.stats['failed'] += 1
+        failed_total.inc()
+        return False
+
+    # Return a copy of the counters
+    def get_stats(self):
+        with self.cond:
+            return dict(self.stats)
+
+_notifier = None # Notifier shared by the current process, created by get_notifier()
+
+# Return the notifier shared by the current process, creating it on first use. Waiting messages are
+# sent before the process exits.
+def get_notifier():
+    global _notifier
+    if _notifier is None:
+        _notifier = Notifier()
+        atexit.register(_notifier.flush)
+    return _notifier
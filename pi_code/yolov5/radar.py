@@ -0,0 +1,158 @@
+# Description: Event-driven handling of the RCWL-0516 radar module. The pin's rising edges are received
+#   from an input backend, and the action (arming the detector) runs in a single worker thread, so the
+#   callback from the pin never blocks:
+#     -edges that arrive while the action is running are coalesced into it
+#     -edges within cooldown seconds of the last action starting are ignored. This is separate from the
+#        pin's bounce time, which only filters electrical noise.
+#   Input backends:
+#     -GpioPin - the radar on a GPIO pin, with gpiozero
+#     -SimulatedPin - edges fired by calling trigger(), for testing without the radar
+#     -ReplayPin - edges fired at recorded times, ex. to replay a day of radar activity
+# Date: Oct 17 2026
+
+import threading
+import time
+
+# Radar module on a GPIO pin. Parameters:
+#      -pin - the GPIO pin number
+#      -bounce_time - seconds to ignore changes after a change, to filter electrical noise, or None
+class GpioPin:
+    def __init__(self, pin=17, bounce_time=None):
+        self.pin = pin
+        self.bounce_time = bounce_time
+        self.device = None
+
+    # Call callback on every rising edge. Parameters:
+    #      -callback - function called with no arguments, from gpiozero's thread
+    def start(self, callback):
+        from gpiozero import DigitalInputDevice # Only available on the Raspberry Pi
+        # Pull-up set to false to set pin 'low' by default
+        self.device = DigitalInputDevice(self.pin, pull_up=False, bounce_time=self.bounce_time)
+        self.device.when_activated = callback
+
+    def close(self):
+        if self.device is not None:
+            self.device.close()
+
+# Pin whose edges are fired by calling trigger(), for testing
+class SimulatedPin:
+    def __init__(self):
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+
+    # Fire a rising edge
+    def trigger(self):
+        if self.callback is not None:
+            self.callback()
+
+    def close(self):
+        self.callback = None
+
+# Pin that fires edges at recorded times, from a background thread. Parameters:
+#      -offsets - seconds from the start at which to fire each edge, in order
+#      -speed - how many times faster than real time to replay
+class ReplayPin:
+    def __init__(self, offsets, speed=1.0):
+        self.offsets = list(offsets)
+        self.speed = speed
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self, callback):
+        def replay():
+            start = time.monotonic()
+            for offset in self.offsets:
+                if self.stopped.wait(max(0, start+offset/self.speed-time.monotonic())):
+                    return
+                callback()
+        self.thread = threading.Thread(target=replay, name='radar_replay', daemon=True)
+        self.thread.start()
+
+    # Wait until every edge has been fired. Parameters:
+    #      -timeout - seconds to wait, or None for no limit
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+
+    def close(self):
+        self.stopped.set()
+
+    # Return a ReplayPin with the offsets in a file, one number of seconds per line. Parameters:
+    #      -path - path of the file
+    #      -speed - see ReplayPin
+    @classmethod
+    def from_file(cls, path, speed=1.0):
+        with open(path) as f:
+            return cls([float(line) for line in f if line.strip()], speed)
+
+# Runs an action when the radar detects movement. Parameters:
+#      -pin - the input backend, ex. GpioPin()
+#      -action - function called with no arguments when movement is detected, ex. to arm the detector
+#      -cooldown - seconds after an action starts during which new edges are ignored
+class Radar:
+    def __init__(self, pin, action, cooldown=30.0):
+        self.pin = pin
+        self.action = action
+        self.cooldown = cooldown
+        self.cond = threading.Condition()
+        self.pending = False # An edge is waiting for the worker
+        self.running = False # The action is running
+        self.last_start = None # Monotonic time the last action started
+        self.closed = False
+        self.stats = {'triggers': 0, 'coalesced': 0, 'cooldown': 0, 'started': 0, 'failed': 0}
+        self.thread = threading.Thread(target=self.run, name='radar', daemon=True)
+
+    # Start receiving edges from the pin
+    def start(self):
+        self.thread.start()
+        self.pin.start(self.on_edge)
+
+    # Called by the pin on every rising edge. Only hands the edge to the worker, never blocks.
+    def on_edge(self):
+        with self.cond:
+            self.stats['triggers'] += 1
+            if self.running or self.pending:
+                self.stats['coalesced'] += 1 # Already handling movement
+                return
+            if self.last_start is not None and time.monotonic()-self.last_start < self.cooldown:
+                self.stats['cooldown'] += 1
+                return
+            self.pending = True
+            self.cond.notify_all()
+
+    # Run the action for each edge handed over by on_edge()
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if self.closed:
+                    return
+                self.pending = False
+                self.running = True
+                self.last_start = time.monotonic()
+                self.stats['started'] += 1
+            try:
+                self.action()
+            except Exception as e:
+                with self.cond:
+                    self.stats['failed'] += 1
+                print('Radar action failed: '+repr(e))
+            finally:
+                with self.cond:
+                    self.running = False
+                    self.cond.notify_all()
+
+    # Stop receiving edges, and wait for a running action to finish. Parameters:
+    #      -timeout - seconds to wait for the action
+    def close(self, timeout=None):
+        self.pin.close()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+    # Return a copy of the counters
+    def get_stats(self):
+        with self.cond:
+            return dict(self.stats)
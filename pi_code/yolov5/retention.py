@@ -0,0 +1,231 @@
+# Description: Background maintenance job that keeps the data on the Pi's SD card bounded on a long running
+#   deployment. Each run:
+#     -compacts the text logs of the months that are over into compressed archives (see log_archive.py)
+#     -downsizes the detection images (data/images/YYYYMMDD-HHMMSS.jpg) older than downsize_after_days
+#     -removes old images that are near duplicates of the image just before them, ex. several detections
+#        of the cat sitting in the same spot. Images are compared by a 64 bit difference hash, so a
+#        duplicate is found even after the images were re-encoded.
+#     -deletes the oldest images and clips while they take more than budget_mb, or the card has less than
+#        min_free_mb free. Free space is only recovered from the images and clips when deleting them can
+#        reach min_free_mb; if something else filled the card, a warning is printed and nothing is deleted
+#        for it. Clips still being written (*.tmp.mp4) are left alone. The logs and their archives are
+#        never deleted.
+#   The work of a run is limited to batch images, with a short pause after each, so that the job does not
+#   hold up the detector on the card. The hash of each old image is kept in data/images/retention.json,
+#   so each image is only read once. Started by supervisor.py, or run once with: python3 yolov5/retention.py
+# Date: Oct 17 2026
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import log_archive
+
+cwd = os.getcwd() # Current working directory
+
+image_directory = cwd+'/data/images' # Detection images and clips
+state_name = 'retention.json' # Hash of each image already looked at, in the image directory
+
+# Return the time of an image or clip from its name, in seconds since the epoch, or from the time it
+# was last changed if its name is not a timestamp. Parameters:
+#      -path - the file's Path
+def media_time(path):
+    try:
+        return datetime.strptime(path.name[:15], "%Y%m%d-%H%M%S").timestamp()
+    except ValueError:
+        return path.stat().st_mtime
+
+# Return the 64 bit difference hash of an image: whether each pixel of an 9x8 grayscale thumbnail is
+# brighter than the pixel to its right. Parameters:
+#      -image - the BGR image as a NumPy array
+def difference_hash(image):
+    import cv2
+    small = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+# Keeps the logs, images and clips within bounds. Parameters:
+#      -interval - seconds between runs when started as a background thread
+#      -log_directory - directory of the monthly text logs
+#      -directory - directory of the images and clips
+#      -downsize_after_days - age in days after which images are downsized and checked for duplicates
+#      -width - width images are downsized to
+#      -quality - JPEG quality of downsized images, from 0 to 100
+#      -duplicate_seconds - images at most this far apart are compared for duplicates
+#      -duplicate_bits - most differing hash bits for two images to count as duplicates
+#      -budget_mb - most megabytes the images and clips may take
+#      -min_free_mb - megabytes to keep free on the card
+#      -batch - most images read per run
+#      -pause - seconds to wait after each image read
+class Retention:
+    def __init__(self, interval=6*3600, log_directory=log_archive.log_directory, directory=image_directory,
+                 downsize_after_days=30, width=640, quality=70, duplicate_seconds=300, duplicate_bits=4,
+                 budget_mb=2048, min_free_mb=512, batch=200, pause=0.05):
+        self.interval = interval
+        self.log_directory = log_directory
+        self.directory = Path(directory)
+        self.downsize_after_days = downsize_after_days
+        self.width = width
+        self.quality = quality
+        self.duplicate_seconds = duplicate_seconds
+        self.duplicate_bits = duplicate_bits
+        self.budget_mb = budget_mb
+        self.min_free_mb = min_free_mb
+        self.batch = batch
+        self.pause = pause
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {'runs': 0, 'failed': 0, 'months_archived': 0, 'log_bytes_saved': 0, 'images_downsized': 0,
+                      'image_bytes_saved': 0, 'duplicates_removed': 0, 'budget_removed': 0, 'budget_bytes_removed': 0}
+
+    # Return the hashes of the images already looked at, by file name
+    def read_state(self):
+        try:
+            with open(self.directory/state_name) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def write_state(self, state):
+        log_archive.write_atomic(str(self.directory/state_name), json.dumps(state).encode())
+
+    # Compact the text logs of the months that are over. Parameters:
+    #      -now - seconds since the epoch
+    def archive_logs(self, now):
+        for entry in log_archive.compact_closed_months(self.log_directory, now):
+            self.stats['months_archived'] += 1
+            self.stats['log_bytes_saved'] += entry['source_bytes']-entry['bytes']
+
+    # Downsize the old images not looked at yet, and record their hashes. Parameters:
+    #      -state - the hashes of the images already looked at, updated in place
+    #      -now - seconds since the epoch
+    def downsize_images(self, state, now):
+        import cv2
+        cutoff = now-self.downsize_after_days*86400
+        new = [path for path in sorted(self.directory.glob('*.jpg'))
+               if path.name not in state and media_time(path) < cutoff]
+        for path in new[:self.batch]:
+            if self.stop_event.is_set():
+                break
+            image = cv2.imread(str(path))
+            if image is None: # Not an image, or only partly written
+                state[path.name] = None
+                continue
+            if image.shape[1] > self.width:
+                height = round(image.shape[0]*self.width/image.shape[1])
+                image = cv2.resize(image, (self.width, height), interpolation=cv2.INTER_AREA)
+                ok, data = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+                size = path.stat().st_size
+                if ok and len(data) < size:
+                    log_archive.write_atomic(str(path), data.tobytes())
+                    self.stats['images_downsized'] += 1
+                    self.stats['image_bytes_saved'] += size-len(data)
+            state[path.name] = difference_hash(image)
+            time.sleep(self.pause)
+
+    # Remove images that are near duplicates of the kept image before them. Images with a clip of the same
+    # name are always kept. Parameters:
+    #      -state - the hashes of the images already looked at, updated in place
+    def remove_duplicates(self, state):
+        kept_time, kept_hash = None, None
+        for path in sorted(self.directory.glob('*.jpg')):
+            image_hash = state.get(path.name)
+            if image_hash is None:
+                continue
+            t = media_time(path)
+            if (kept_hash is not None and t-kept_time <= self.duplicate_seconds and
+                    bin(image_hash ^ kept_hash).count('1') <= self.duplicate_bits and
+                    not path.with_suffix('.mp4').exists()):
+                path.unlink()
+                del state[path.name]
+                self.stats['duplicates_removed'] += 1
+                continue
+            kept_time, kept_hash = t, image_hash
+
+    # Delete the oldest images and clips while over the budget or short of free space. Parameters:
+    #      -state - the hashes of the images already looked at, updated in place
+    def enforce_budget(self, state):
+        files = sorted((media_time(path), path) for path in self.directory.iterdir()
+                       if path.suffix in ('.jpg', '.mp4') and not path.name.endswith('.tmp.mp4'))
+        sizes = {path: path.stat().st_size for _, path in files}
+        total = sum(sizes.values())
+        over_budget = max(total-self.budget_mb*2**20, 0)
+        short_of_free = max(self.min_free_mb*2**20-shutil.disk_usage(self.directory).free, 0)
+        if short_of_free > total: # Deleting every image and clip would not be enough
+            print(f'Retention: {short_of_free/2**20:.0f} MB short of free space, more than the '
+                  f'{total/2**20:.0f} MB of images and clips, not deleting them for it')
+            short_of_free = 0
+        to_remove = max(over_budget, short_of_free)
+        for _, path in files:
+            if to_remove <= 0:
+                break
+            path.unlink()
+            state.pop(path.name, None)
+            to_remove -= sizes[path]
+            self.stats['budget_removed'] += 1
+            self.stats['budget_bytes_removed'] += sizes[path]
+
+    # Run every step once. Parameters:
+    #      -now - seconds since the epoch, or None for now
+    def run_once(self, now=None):
+        now = time.time() if now is None else now
+        try:
+            self.archive_logs(now)
+            if self.directory.is_dir():
+                state = self.read_state()
+                self.downsize_images(state, now)
+                self.remove_duplicates(state)
+                self.enforce_budget(state)
+                # Forget images deleted by other means
+                state = {name: value for name, value in state.items() if (self.directory/name).exists()}
+                self.write_state(state)
+        except Exception as e:
+            self.stats['failed'] += 1
+            print('Retention failed: '+repr(e))
+        self.stats['runs'] += 1
+
+    # Run every interval seconds in a background thread, the first time straight away
+    def start(self):
+        def loop():
+            while not self.stop_event.is_set():
+                self.run_once()
+                self.stop_event.wait(self.interval)
+        self.thread = threading.Thread(target=loop, name='retention', daemon=True)
+        self.thread.start()
+
+    # Stop the background thread. Parameters:
+    #      -timeout - seconds to wait for the current run to finish
+    def close(self, timeout=None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    # Return a copy of the counters
+    def get_stats(self):
+        return dict(self.stats)
+
+    # Return the counters as a string for logging
+    def summary(self):
+        s = self.stats
+        return (f"{s['runs']} runs ({s['failed']} failed), {s['months_archived']} months archived "
+                f"({s['log_bytes_saved']/2**20:.1f} MB saved), {s['images_downsized']} images downsized "
+                f"({s['image_bytes_saved']/2**20:.1f} MB saved), {s['duplicates_removed']} duplicates and "
+                f"{s['budget_removed']} files over budget removed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-mb', type=int, default=2048, help='most MB the images and clips may take')
+    parser.add_argument('--min-free-mb', type=int, default=512, help='MB to keep free on the card')
+    parser.add_argument('--downsize-after', type=int, default=30, help='days after which images are downsized')
+    parser.add_argument('--batch', type=int, default=200, help='most images read per run')
+    opt = parser.parse_args()
+    retention = Retention(budget_mb=opt.budget_mb, min_free_mb=opt.min_free_mb,
+                          downsize_after_days=opt.downsize_after, batch=opt.batch)
+    retention.run_once()
+    print(retention.summary())
@@ -0,0 +1,154 @@
+# Description: Region of interest cropping and adaptive input resolution for detect.py.
+#   Instead of letterboxing the whole camera frame to the model's input size, only the regions around the
+#   door (the zones below) are cropped out and fed to the model as one batch, and the detections are mapped
+#   back to frame coordinates. The zone a detection falls in also gives the cat's location.
+#   In adaptive mode, the crops are first run at a low resolution with a lower confidence threshold, and
+#   only crops with a candidate detection are run again at full resolution.
+#   Note: the adaptive mode needs a model that accepts more than one input size, i.e. PyTorch weights.
+# Date: Oct 17 2026
+
+import numpy as np
+import torch
+
+from utils.augmentations import letterbox
+from utils.general import non_max_suppression, scale_coords
+from utils.torch_utils import time_sync
+
+# Regions of interest, as (x_min, y_min, x_max, y_max) in pixels of the camera frame, and the location of
+# the cat when the center of its face is inside each region. As with boundary_pixel in cat_detection.py,
+# find the points by opening a photograph from the camera in a pixel viewer.
+zones = [
+    {'name': 'inside', 'box': (90, 100, 250, 480), 'location': 'IN'},
+    {'name': 'outside', 'box': (250, 100, 410, 480), 'location': 'OUT'},
+]
+# Number of pixels added around each zone when cropping, so that a face on the edge of a zone is not cut off
+margin = 48
+
+# Return the location of the zone that contains a point, or None if no zone contains it. Parameters:
+#      -frame_zones - list of zones, see above, or None
+#      -x, y - the point in frame coordinates
+def zone_location(frame_zones, x, y):
+    for zone in frame_zones or []:
+        x1, y1, x2, y2 = zone['box']
+        if x1 <= x < x2 and y1 <= y < y2:
+            return zone['location']
+    return None
+
+# Crops the zones out of frames and runs the model on them. Parameters:
+#      -model - the loaded DetectMultiBackend model
+#      -imgsz - full inference size (height, width)
+#      -zones - list of zones, see above, or None to use the whole frame as a single zone
+#      -stream_zones - list with the zones of each stream when there are several cameras, used instead of zones
+#      -low_imgsz - inference size for the first, low resolution pass, or None to disable the adaptive mode
+#      -low_conf - confidence threshold for a low resolution detection to count as a candidate
+class RegionDetector:
+    def __init__(self, model, imgsz, zones=zones, low_imgsz=None, low_conf=0.25, stream_zones=None):
+        self.model = model
+        self.imgsz = imgsz
+        self.zones = zones
+        self.stream_zones = stream_zones
+        self.low_imgsz = low_imgsz
+        self.low_conf = low_conf
+        # Time spent per stage, in seconds, and number of frames and escalations to full resolution
+        self.dt = {'crop': 0.0, 'low_inference': 0.0, 'inference': 0.0, 'nms': 0.0}
+        self.counts = {'frames': 0, 'crops': 0, 'escalated': 0}
+
+    # Return the zones of a stream, or None to use the whole frame. Parameters:
+    #      -stream - index of the stream, i.e. of the frame in the batch
+    def zones_of(self, stream):
+        return self.stream_zones[stream] if self.stream_zones is not None else self.zones
+
+    # Return the crop boxes for a frame: each zone plus the margin, clipped to the frame. Parameters:
+    #      -shape - shape of the frame (height, width, channels)
+    #      -stream - index of the stream the frame is from
+    def crop_boxes(self, shape, stream=0):
+        h, w = shape[:2]
+        frame_zones = self.zones_of(stream)
+        if frame_zones is None:
+            return [(0, 0, w, h)]
+        return [(max(0, x1-margin), max(0, y1-margin), min(w, x2+margin), min(h, y2+margin))
+                for x1, y1, x2, y2 in (zone['box'] for zone in frame_zones)]
+
+    # Letterbox crops to one size and stack them into a normalized batch tensor. Parameters:
+    #      -crops - list of BGR crops as NumPy arrays
+    #      -size - inference size (height, width)
+    def to_batch(self, crops, size):
+        im = np.stack([letterbox(crop, size, stride=self.model.stride, auto=False)[0] for crop in crops])
+        im = np.ascontiguousarray(im[..., ::-1].transpose((0, 3, 1, 2))) # BGR to RGB, BHWC to BCHW
+        im = torch.from_numpy(im).to(self.model.device)
+        im = im.half() if self.model.fp16 else im.float() # uint8 to fp16/32
+        return im / 255 # 0 - 255 to 0.0 - 1.0
+
+    # Run the model on a batch of crops and return the detections per crop in crop coordinates.
+    # Parameters:
+    #      -crops - list of BGR crops as NumPy arrays
+    #      -size - inference size (height, width)
+    #      -conf_thres, iou_thres, classes, agnostic_nms, max_det - see non_max_suppression()
+    #      -stage - the key of self.dt to add the inference time to
+    def infer(self, crops, size, conf_thres, iou_thres, classes, agnostic_nms, max_det, stage):
+        t1 = time_sync()
+        im = self.to_batch(crops, size)
+        t2 = time_sync()
+        pred = self.model(im)
+        t3 = time_sync()
+        pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+        for det, crop in zip(pred, crops):
+            det[:, :4] = scale_coords(im.shape[2:], det[:, :4], crop.shape).round()
+        self.dt['crop'] += t2 - t1
+        self.dt[stage] += t3 - t2
+        self.dt['nms'] += time_sync() - t3
+        return pred, im.shape
+
+    # Detect objects in the zones of each frame. Returns a list with one tensor of detections per frame,
+    # in frame coordinates and sorted by confidence like the output of non_max_suppression(), and the
+    # shape of the last batch run through the model. Parameters:
+    #      -frames - list of BGR frames as NumPy arrays (im0s in detect.py)
+    #      -conf_thres, iou_thres, classes, agnostic_nms, max_det - see non_max_suppression()
+    def detect(self, frames, conf_thres, iou_thres, classes=None, agnostic_nms=False, max_det=1000):
+        t1 = time_sync()
+        crops, owners = [], [] # Crops, and the frame index and crop box each came from
+        for i, frame in enumerate(frames):
+            for x1, y1, x2, y2 in self.crop_boxes(frame.shape, i):
+                crops.append(frame[y1:y2, x1:x2]) # View into the frame, no copy
+                owners.append((i, x1, y1))
+        self.dt['crop'] += time_sync() - t1
+        self.counts['frames'] += len(frames)
+        self.counts['crops'] += len(crops)
+
+        shape = None
+        keep = list(range(len(crops)))
+        if self.low_imgsz is not None:
+            # Low resolution pass, and keep only the crops with a candidate detection
+            low_pred, shape = self.infer(crops, self.low_imgsz, self.low_conf, iou_thres, classes, agnostic_nms,
+                                         max_det, 'low_inference')
+            keep = [k for k, det in enumerate(low_pred) if len(det)]
+            self.counts['escalated'] += len(keep)
+
+        dets = [[] for _ in frames]
+        if keep:
+            pred, shape = self.infer([crops[k] for k in keep], self.imgsz, conf_thres, iou_thres, classes,
+                                     agnostic_nms, max_det, 'inference')
+            for k, det in zip(keep, pred):
+                i, x1, y1 = owners[k]
+                det[:, [0, 2]] += x1 # Crop to frame coordinates
+                det[:, [1, 3]] += y1
+                dets[i].append(det)
+
+        pred = []
+        for frame_dets in dets:
+            det = torch.cat(frame_dets) if frame_dets else torch.zeros((0, 6), device=self.model.device)
+            pred.append(det[det[:, 4].argsort(descending=True)])
+        return pred, shape or (len(crops), 3, *(self.low_imgsz or self.imgsz))
+
+    # Return the location of the zone that contains a point, or None if no zone contains it. Parameters:
+    #      -x, y - the point in frame coordinates
+    #      -stream - index of the stream the point is in
+    def location_of(self, x, y, stream=0):
+        return zone_location(self.zones_of(stream), x, y)
+
+    # Return the time per frame of each stage, in ms, and the counters as a string for logging
+    def summary(self):
+        n = max(self.counts['frames'], 1)
+        times = ', '.join(f'{v / n * 1E3:.1f}ms {k}' for k, v in self.dt.items())
+        return (f"{times} per frame; {self.counts['crops']} crops, "
+                f"{self.counts['escalated']} escalated to full resolution")
@@ -0,0 +1,126 @@
+# Description: Lightweight tracker that follows the detected cat across frames, so that the IN/OUT location
+#   is decided from several frames instead of the first frame the cat is detected in. Boxes are matched
+#   to tracks by IoU, falling back to the distance between centers for fast movement at a low framerate.
+#   Each track's center is smoothed, and a location is only reported once the track has been in it for
+#   confirm_frames frames in a row. A location is reported once per track, so a cat sitting in front of
+#   the camera is not reported again, and the tracker keeps its tracks between detection sessions.
+#   With several cameras, each camera's stream has its own tracks.
+# Date: Oct 17 2026
+
+import time
+
+import numpy as np
+
+# A cat followed across frames. Parameters:
+#      -track_id - number of the track, counting from 1
+#      -box - the first box, as (x_min, y_min, x_max, y_max)
+#      -now - monotonic time of the frame
+class Track:
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.center = ((box[0]+box[2])/2, (box[1]+box[3])/2) # Smoothed center
+        self.hits = 1 # Number of frames the track was matched in
+        self.last_seen = now
+        self.candidate = None # Location of the smoothed center in the latest frames
+        self.streak = 0 # Number of frames in a row the smoothed center was in the candidate location
+        self.reported = None # Location last reported for this track
+
+# Return the IoU of every pair of boxes as an array of shape (len(a), len(b)). Parameters:
+#      -a, b - arrays of boxes of shape (n, 4), as (x_min, y_min, x_max, y_max)
+def box_iou(a, b):
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right-top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:]-a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:]-b[:, :2], axis=1)
+    return inter/(area_a[:, None]+area_b[None, :]-inter+1E-9)
+
+# Follows boxes across frames and decides the location of each track. Parameters:
+#      -confirm_frames - frames in a row a track must be in a location before it is reported
+#      -iou_threshold - smallest IoU for a box to match a track
+#      -max_distance - largest distance in pixels between centers for a box to match a track by distance
+#      -max_age - seconds after which a track that was not seen is dropped
+#      -alpha - weight of the newest center in the smoothed center, from 0 to 1
+class Tracker:
+    def __init__(self, confirm_frames=3, iou_threshold=0.3, max_distance=80, max_age=2.0, alpha=0.5):
+        self.confirm_frames = confirm_frames
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.alpha = alpha
+        self.tracks = {} # List of tracks of each stream
+        self.next_id = 1
+        self.stats = {'frames': 0, 'tracks': 0, 'reported': 0}
+
+    # Return the (track index, box index) pairs matching tracks to boxes, best matches first. Parameters:
+    #      -tracks - the tracks of the stream
+    #      -boxes - array of boxes of shape (n, 4)
+    def match(self, tracks, boxes):
+        if not tracks or not len(boxes):
+            return []
+        ious = box_iou(np.array([t.box for t in tracks]), boxes)
+        centers = (boxes[:, :2]+boxes[:, 2:])/2
+        track_centers = np.array([t.center for t in tracks])
+        distances = np.linalg.norm(track_centers[:, None]-centers[None], axis=2)
+        # Order the pairs by IoU, then by distance for the pairs that do not overlap
+        score = np.where(ious >= self.iou_threshold, 1+ious, 1-distances/self.max_distance)
+        pairs, used_tracks, used_boxes = [], set(), set()
+        for flat in np.argsort(-score, axis=None):
+            i, j = np.unravel_index(flat, score.shape)
+            if score[i, j] < 0:
+                break # Too far apart, and so is every pair after it
+            if i not in used_tracks and j not in used_boxes:
+                pairs.append((i, j))
+                used_tracks.add(i)
+                used_boxes.add(j)
+        return pairs
+
+    # Update the tracks with the boxes detected in a frame. Returns the tracks whose location was confirmed
+    # in this frame, most seen first. Parameters:
+    #      -boxes - the cat's boxes in the frame, as (x_min, y_min, x_max, y_max, ...) rows
+    #      -locate - function returning the location, ex. IN or OUT, of a point (x, y)
+    #      -now - monotonic time of the frame, or None for the current time
+    #      -stream - index of the camera's stream the frame is from
+    def update(self, boxes, locate, now=None, stream=0):
+        now = time.monotonic() if now is None else now
+        self.stats['frames'] += 1
+        boxes = np.array([box[:4] for box in boxes], dtype=np.float64).reshape(-1, 4)
+        tracks = self.tracks.get(stream, [])
+
+        matched = set()
+        for i, j in self.match(tracks, boxes):
+            track = tracks[i]
+            box = tuple(boxes[j])
+            x, y = (box[0]+box[2])/2, (box[1]+box[3])/2
+            track.center = (self.alpha*x+(1-self.alpha)*track.center[0], self.alpha*y+(1-self.alpha)*track.center[1])
+            track.box = box
+            track.hits += 1
+            track.last_seen = now
+            matched.add(j)
+        for j in range(len(boxes)):
+            if j not in matched:
+                tracks.append(Track(self.next_id, tuple(boxes[j]), now))
+                self.next_id += 1
+                self.stats['tracks'] += 1
+        tracks = self.tracks[stream] = [t for t in tracks if now-t.last_seen <= self.max_age]
+
+        confirmed = []
+        for track in tracks:
+            if track.last_seen != now:
+                continue # Not in this frame
+            location = locate(*track.center)
+            if location == track.candidate:
+                track.streak += 1
+            else:
+                track.candidate, track.streak = location, 1
+            if track.streak >= self.confirm_frames and location != track.reported:
+                track.reported = location
+                confirmed.append(track)
+        self.stats['reported'] += len(confirmed)
+        return sorted(confirmed, key=lambda t: t.hits, reverse=True)
+
+    # Return the counters as a string, ex. for logging at the end of a detection
+    def summary(self):
+        return (f"{self.stats['frames']} frames, {self.stats['tracks']} tracks, "
+                f"{self.stats['reported']} locations reported, {sum(map(len, self.tracks.values()))} tracks active")